@@ -5,3 +5,7 @@ class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.accounts'
     verbose_name = 'Аккаунты'
+
+    def ready(self):
+        """Импортируем signals при загрузке приложения"""
+        import apps.accounts.signals
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_user_max_chat_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='URL уменьшенных копий в WebP/AVIF (создаются в фоне после загрузки)', verbose_name='Варианты аватарки'),
+        ),
+    ]
@@ -99,6 +99,13 @@ class User(AbstractUser):
         null=True,
         verbose_name='Аватарка'
     )
+    avatar_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Варианты аватарки',
+        help_text='URL уменьшенных копий в WebP/AVIF (создаются в фоне после загрузки)'
+    )
     
     class Meta:
         verbose_name = 'Пользователь'
@@ -2,6 +2,7 @@ from rest_framework import serializers
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from .models import User, UserVerification, VerificationDocument
+from apps.boats.services.image_variants import image_srcset
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -121,16 +122,21 @@ class UserSerializer(serializers.ModelSerializer):
     """Сериализатор для отображения пользователя"""
     verification_status_display = serializers.CharField(source='get_verification_status_display', read_only=True)
     avatar = serializers.ImageField(required=False, allow_null=True)
+    avatar_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = User
         fields = (
             'id', 'email', 'phone', 'first_name', 'last_name',
             'role', 'verification_status', 'verification_status_display',
-            'is_active', 'is_staff', 'created_at', 'avatar'
+            'is_active', 'is_staff', 'created_at', 'avatar', 'avatar_srcset'
         )
         read_only_fields = ('id', 'created_at', 'verification_status', 'role', 'is_active', 'is_staff')
     
+    def get_avatar_srcset(self, obj):
+        """Уменьшенные копии аватарки в WebP/AVIF для srcset"""
+        return image_srcset(obj, self.context.get('request'))
+    
     def to_representation(self, instance):
         """Переопределяем для возврата полного URL аватарки"""
         representation = super().to_representation(instance)
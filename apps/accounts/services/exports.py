@@ -0,0 +1,286 @@
+"""
+Потоковая выгрузка таблиц для админа в CSV и XLSX.
+
+Строки (рабочие таблицы и архив) читаются из БД через .iterator(chunk_size=...)
+и сразу отдаются клиенту (StreamingHttpResponse), поэтому память не растет
+с размером выгрузки, а заголовок файла уходит до выполнения запроса.
+XLSX собирается стандартным zipfile в не-seekable поток, без сторонних библиотек.
+"""
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.bookings.models import Booking
+from apps.bookings.services.reporting import reporting_booking_totals, reporting_bookings, reporting_payments
+from apps.site_settings.models import SiteSettings
+
+CHUNK_SIZE = 2000
+# Через сколько строк XLSX отдавать накопленные байты клиенту
+XLSX_FLUSH_ROWS = 500
+
+_ILLEGAL_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _format_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M')
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def _person_name(first_name, last_name, email):
+    return f"{first_name or ''} {last_name or ''}".strip() or email
+
+
+def _period_filter(field, period_start, period_end):
+    """Фильтр по локальной дате поля (даты - объекты date или None)"""
+    filters = {}
+    if period_start:
+        filters[f'{field}__date__gte'] = period_start
+    if period_end:
+        filters[f'{field}__date__lte'] = period_end
+    return filters
+
+
+# === Наборы строк (рабочие таблицы + архив, см. apps.bookings.services.reporting) ===
+
+BOOKING_FIELDS = (
+    'id', 'created_at', 'start_datetime', 'end_datetime', 'boat__name', 'boat__owner__email',
+    'trip_type', 'status', 'guest_name', 'guest_phone', 'number_of_people',
+    'total_price', 'deposit', 'remaining_amount', 'payment_method',
+    'customer__email', 'guide__email', 'hotel_admin__email', 'hotel_cashback_amount',
+)
+
+BOOKING_HEADER = [
+    'ID', 'Создано', 'Начало', 'Окончание', 'Судно', 'Владелец',
+    'Тип', 'Статус', 'Гость', 'Телефон', 'Людей',
+    'Стоимость', 'Предоплата', 'Остаток', 'Способ оплаты остатка',
+    'Клиент', 'Гид', 'Гостиница', 'Кешбэк гостиницы',
+]
+
+
+def booking_rows(period_start=None, period_end=None, queryset=None):
+    if queryset is not None:
+        rows = queryset.order_by('start_datetime', 'id').values(*BOOKING_FIELDS)
+    else:
+        rows = reporting_bookings(
+            BOOKING_FIELDS, **_period_filter('start_datetime', period_start, period_end)
+        ).order_by('start_datetime', 'id')
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield [_format_value(row[field]) for field in BOOKING_FIELDS]
+
+
+PAYMENT_FIELDS = (
+    'id', 'created_at', 'booking_id', 'booking__boat__name', 'payment_id', 'order_id',
+    'payment_type', 'status', 'amount',
+)
+
+PAYMENT_HEADER = ['ID', 'Создан', 'Бронирование', 'Судно', 'ID платежа', 'ID заказа', 'Тип', 'Статус', 'Сумма']
+
+
+def payment_rows(period_start=None, period_end=None):
+    rows = reporting_payments(
+        PAYMENT_FIELDS, **_period_filter('created_at', period_start, period_end)
+    ).order_by('created_at', 'id')
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield [_format_value(row[field]) for field in PAYMENT_FIELDS]
+
+
+def captain_payout_rows(period_start=None, period_end=None):
+    """Выплаты капитанам по дням: те же правила, что в AdminCaptainsFinancesTableView"""
+    commission_percent = Decimal(str(SiteSettings.load().platform_commission_percent))
+    rows = reporting_booking_totals(
+        ['day', 'boat__owner_id', 'boat__owner__first_name', 'boat__owner__last_name', 'boat__owner__email'],
+        {
+            'revenue': Sum('total_price'),
+            'people': Sum('number_of_people'),
+            'bookings_count': Count('id'),
+        },
+        ~Q(status=Booking.Status.CANCELLED),
+        annotations={'day': TruncDate('start_datetime')},
+        boat__is_active=True,
+        **_period_filter('start_datetime', period_start, period_end)
+    )
+
+    for row in rows:
+        revenue = row['revenue'] or Decimal('0')
+        commission = revenue * commission_percent / Decimal('100')
+        yield [
+            _format_value(row['day']),
+            row['boat__owner_id'],
+            _person_name(row['boat__owner__first_name'], row['boat__owner__last_name'], row['boat__owner__email']),
+            row['boat__owner__email'],
+            row['people'],
+            row['bookings_count'],
+            revenue,
+            commission.quantize(Decimal('0.01')),
+            (revenue - commission).quantize(Decimal('0.01')),
+        ]
+
+
+CAPTAIN_PAYOUT_HEADER = [
+    'Дата', 'ID капитана', 'Капитан', 'Email', 'Людей', 'Бронирований',
+    'Выручка', 'Комиссия платформы', 'К выплате',
+]
+
+
+def hotel_cashback_rows(period_start=None, period_end=None):
+    """Кешбэк гостиниц по дням: учитываются только подтвержденные и завершенные брони"""
+    rows = reporting_booking_totals(
+        ['day', 'hotel_admin_id', 'hotel_admin__first_name', 'hotel_admin__last_name', 'hotel_admin__email'],
+        {
+            'cashback': Sum('hotel_cashback_amount'),
+            'revenue': Sum('total_price'),
+            'people': Sum('number_of_people'),
+            'bookings_count': Count('id'),
+        },
+        annotations={'day': TruncDate('start_datetime')},
+        hotel_admin__isnull=False,
+        status__in=[Booking.Status.CONFIRMED, Booking.Status.COMPLETED],
+        **_period_filter('start_datetime', period_start, period_end)
+    )
+
+    for row in rows:
+        yield [
+            _format_value(row['day']),
+            row['hotel_admin_id'],
+            _person_name(row['hotel_admin__first_name'], row['hotel_admin__last_name'], row['hotel_admin__email']),
+            row['hotel_admin__email'],
+            row['people'],
+            row['bookings_count'],
+            row['revenue'],
+            row['cashback'],
+        ]
+
+
+HOTEL_CASHBACK_HEADER = ['Дата', 'ID гостиницы', 'Гостиница', 'Email', 'Людей', 'Бронирований', 'Выручка', 'Кешбэк']
+
+
+# kind -> (имя файла, заголовок, функция строк)
+EXPORTS = {
+    'bookings': ('bookings', BOOKING_HEADER, booking_rows),
+    'payments': ('payments', PAYMENT_HEADER, payment_rows),
+    'captain_payouts': ('captain_payouts', CAPTAIN_PAYOUT_HEADER, captain_payout_rows),
+    'hotel_cashback': ('hotel_cashback', HOTEL_CASHBACK_HEADER, hotel_cashback_rows),
+}
+
+
+# === Форматы ===
+
+class _Echo:
+    """Псевдо-файл для csv.writer: writerow возвращает готовую строку"""
+    def write(self, value):
+        return value
+
+
+def stream_csv(header, rows):
+    writer = csv.writer(_Echo(), delimiter=';')
+    # BOM - чтобы Excel открыл UTF-8 с кириллицей
+    yield '\ufeff' + writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Не-seekable приемник для zipfile: копит байты до очередной отдачи клиенту"""
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+_XLSX_STATIC_PARTS = (
+    ('[Content_Types].xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+     '<Default Extension="xml" ContentType="application/xml"/>'
+     '<Override PartName="/xl/workbook.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+     '<Override PartName="/xl/worksheets/sheet1.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+     '</Types>'),
+    ('_rels/.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+     'Target="xl/workbook.xml"/>'
+     '</Relationships>'),
+    ('xl/workbook.xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+     'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+     '<sheets><sheet name="Export" sheetId="1" r:id="rId1"/></sheets>'
+     '</workbook>'),
+    ('xl/_rels/workbook.xml.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+     'Target="worksheets/sheet1.xml"/>'
+     '</Relationships>'),
+)
+
+
+def _xlsx_row(row):
+    cells = []
+    for value in row:
+        if value is None or value == '':
+            cells.append('<c/>')
+        elif isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+            cells.append(f'<c><v>{value}</v></c>')
+        else:
+            text = _ILLEGAL_XML_CHARS.sub('', str(value))
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{escape(text)}</t></is></c>')
+    return f"<row>{''.join(cells)}</row>".encode('utf-8')
+
+
+def stream_xlsx(header, rows):
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_STATIC_PARTS:
+            archive.writestr(name, content)
+        yield buffer.pop()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row(header))
+            for index, row in enumerate(rows, start=1):
+                sheet.write(_xlsx_row(row))
+                if index % XLSX_FLUSH_ROWS == 0:
+                    data = buffer.pop()
+                    if data:
+                        yield data
+            sheet.write(b'</sheetData></worksheet>')
+    yield buffer.pop()
+
+
+FORMATS = {
+    'csv': (stream_csv, 'text/csv; charset=utf-8'),
+    'xlsx': (stream_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
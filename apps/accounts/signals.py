@@ -0,0 +1,11 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from apps.boats.services.image_variants import schedule_image_variants
+from .models import User
+
+
+@receiver(post_save, sender=User)
+def create_avatar_variants(sender, instance, **kwargs):
+    """Уменьшенные копии аватарки в фоне после загрузки"""
+    schedule_image_variants(instance)
@@ -153,4 +153,102 @@ class TestProfileDashboard:
         assert isinstance(response.data, dict)
         assert 'total_commission' in response.data
         assert 'bookings_count' in response.data
+    
+    def test_boat_owner_calendar_queries_do_not_grow(self, boat_owner_client, boat, booking):
+        """Количество запросов календаря не зависит от числа бронирований"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from apps.bookings.tests.test_views import _add_bookings_with_payments
+        
+        url = reverse('accounts:profile-calendar')
+        month = booking.start_datetime.strftime('%Y-%m')
+        _add_bookings_with_payments(booking, 1)
+        with CaptureQueriesContext(connection) as small:
+            response = boat_owner_client.get(url, {'month': month})
+        assert response.status_code == status.HTTP_200_OK
+        
+        _add_bookings_with_payments(booking, 5)
+        with CaptureQueriesContext(connection) as large:
+            response = boat_owner_client.get(url, {'month': month})
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['bookings']) == 7
+        assert len(large.captured_queries) == len(small.captured_queries)
+
+    def test_finances_include_archived_bookings(
+        self, api_client, boat_owner_user, guide_user, booking, guide_booking
+    ):
+        """Перенос старых бронирований в архив не меняет финансы владельца и комиссии гида"""
+        from datetime import timedelta
+        from io import StringIO
+        from django.core.management import call_command
+        from django.utils import timezone
+        from apps.bookings.models import ArchivedBooking, Booking
+
+        start = timezone.now() - timedelta(days=400)
+        Booking.objects.filter(pk__in=[booking.pk, guide_booking.pk]).update(
+            status=Booking.Status.COMPLETED,
+            start_datetime=start,
+            end_datetime=start + timedelta(hours=2),
+        )
+
+        def totals():
+            api_client.force_authenticate(user=boat_owner_user)
+            finances = api_client.get(reverse('accounts:profile-finances')).data
+            api_client.force_authenticate(user=guide_user)
+            guide_finances = api_client.get(reverse('accounts:profile-finances')).data
+            commissions = api_client.get(reverse('accounts:guide-commissions')).data
+            return finances, guide_finances, commissions
+
+        finances, guide_finances, commissions = totals()
+        assert finances['revenue'] == 28000
+        assert commissions['total_commission'] == 2500
+        assert len(commissions['commission_history']) == 1
+
+        call_command('archive_bookings', '--months', '12', stdout=StringIO())
+        assert not Booking.objects.filter(pk__in=[booking.pk, guide_booking.pk]).exists()
+        assert ArchivedBooking.objects.count() == 2
+
+        assert totals() == (finances, guide_finances, commissions)
 
+
+@pytest.mark.django_db
+class TestAdminExports:
+    """Тесты потоковых выгрузок для админа"""
+    
+    @pytest.fixture
+    def admin_client(self, api_client, customer_user):
+        customer_user.is_staff = True
+        customer_user.save(update_fields=['is_staff'])
+        api_client.force_authenticate(customer_user)
+        return api_client
+    
+    def test_bookings_csv(self, admin_client, booking):
+        """Бронирования выгружаются потоком в CSV"""
+        url = reverse('accounts:admin-export', kwargs={'kind': 'bookings'})
+        response = admin_client.get(url, {'file_format': 'csv'})
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.streaming
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        assert lines[0].startswith('ID;')
+        assert len(lines) == 2
+        assert booking.guest_name in lines[1]
+    
+    def test_captain_payouts_xlsx(self, admin_client, booking):
+        """Выплаты капитанам выгружаются в корректный XLSX"""
+        import io
+        import zipfile
+        
+        url = reverse('accounts:admin-export', kwargs={'kind': 'captain_payouts'})
+        response = admin_client.get(url, {'file_format': 'xlsx'})
+        
+        assert response.status_code == status.HTTP_200_OK
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        sheet = archive.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        assert sheet.count('<row>') == 2
+        assert booking.boat.owner.email in sheet
+    
+    def test_export_requires_staff(self, customer_client):
+        url = reverse('accounts:admin-export', kwargs={'kind': 'payments'})
+        response = customer_client.get(url)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
@@ -43,4 +43,5 @@ urlpatterns = [
     path('admin/captains/finances-table/', views.AdminCaptainsFinancesTableView.as_view(), name='admin-captains-finances-table'),
     path('admin/hotels/', views.AdminHotelsListView.as_view(), name='admin-hotels-list'),
     path('admin/hotels/finances-table/', views.AdminHotelsFinancesTableView.as_view(), name='admin-hotels-finances-table'),
+    path('admin/exports/<str:kind>/', views.AdminExportView.as_view(), name='admin-export'),
 ]
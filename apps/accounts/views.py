@@ -11,6 +11,7 @@ from django.core.mail import send_mail
 from django.conf import settings
 from django.db import transaction
 from django.db.models import Sum, Count, Q
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from datetime import datetime, timedelta
 from decimal import Decimal
@@ -20,6 +21,7 @@ from urllib.parse import urlencode
 from .models import User, UserVerification
 from apps.boats.models import Boat
 from apps.bookings.models import Booking
+from apps.bookings.services.reporting import reporting_booking_totals, reporting_bookings
 from apps.site_settings.models import SiteSettings
 from apps.bookings.serializers import BookingListSerializer
 from apps.boats.serializers import BoatListSerializer
@@ -46,6 +48,7 @@ from .schemas import (
     profile_legacy_get_schema,
     profile_legacy_update_schema,
 )
+from .services import exports
 
 
 def send_registration_email_async(user, token, client='web'):
@@ -125,6 +128,42 @@ def send_registration_email_async(user, token, client='web'):
             print(f"{'='*60}\n")
 
 
+# Комиссия гида за одного туриста (пока фиксированная)
+GUIDE_COMMISSION_PER_PERSON = 500
+
+
+def _period_filters(date_from, date_to):
+    """Фильтры по дате начала брони из параметров YYYY-MM-DD (некорректные значения игнорируются)"""
+    filters = {}
+    for value, lookup in ((date_from, 'start_datetime__date__gte'), (date_to, 'start_datetime__date__lte')):
+        if value:
+            try:
+                filters[lookup] = datetime.strptime(value, '%Y-%m-%d').date()
+            except ValueError:
+                pass
+    return filters
+
+
+def _guide_commissions(guide, *conditions, **filters):
+    """
+    Комиссии гида по броням рабочей таблицы и архива.
+
+    Returns:
+        dict: total_commission (завершенные), pending_commission (ожидающие и подтвержденные), bookings_count
+    """
+    rows = reporting_booking_totals(
+        ('status',), {'people': Sum('number_of_people'), 'bookings': Count('id')},
+        *conditions, guide=guide, **filters
+    )
+    people = {row['status']: row['people'] or 0 for row in rows}
+    pending_people = people.get(Booking.Status.PENDING, 0) + people.get(Booking.Status.CONFIRMED, 0)
+    return {
+        'total_commission': float(GUIDE_COMMISSION_PER_PERSON * people.get(Booking.Status.COMPLETED, 0)),
+        'pending_commission': float(GUIDE_COMMISSION_PER_PERSON * pending_people),
+        'bookings_count': sum(row['bookings'] for row in rows),
+    }
+
+
 class UserRegistrationView(generics.CreateAPIView):
     """Регистрация нового пользователя"""
     queryset = User.objects.all()
@@ -468,9 +507,9 @@ class ProfileViewSet(ViewSet):
         week_end = week_start + timedelta(days=6)
         
         # Получаем все суда владельца с оптимизацией запросов
-        boats = Boat.objects.filter(owner=user).prefetch_related(
-            'images', 'features', 'pricing'
-        ).order_by('-created_at')
+        boats = Boat.objects.filter(owner=user).select_related('owner', 'dock').prefetch_related(
+            'images', 'features'
+        ).with_min_price().order_by('-created_at')
         boat_ids = list(boats.values_list('id', flat=True))
         
         # Статистика на сегодня
@@ -502,14 +541,14 @@ class ProfileViewSet(ViewSet):
         # Последние бронирования
         recent_bookings = Booking.objects.filter(
             boat_id__in=boat_ids
-        ).exclude(status=Booking.Status.RESERVED).order_by('-created_at')[:5]
+        ).exclude(status=Booking.Status.RESERVED).for_listing().order_by('-created_at')[:5]
         
         # Ближайшие бронирования
         upcoming_bookings = Booking.objects.filter(
             boat_id__in=boat_ids,
             start_datetime__gt=timezone.now(),
             status__in=[Booking.Status.PENDING, Booking.Status.CONFIRMED]
-        ).order_by('start_datetime')[:5]
+        ).for_listing().order_by('start_datetime')[:5]
         
         context = {'request': request} if request else {}
         return {
@@ -523,13 +562,13 @@ class ProfileViewSet(ViewSet):
     def _get_guide_dashboard(self, user, request=None):
         """Дашборд для гида"""
         # Бронирования гида
-        bookings = Booking.objects.filter(guide=user).exclude(status=Booking.Status.RESERVED).select_related('boat', 'boat__owner')
+        bookings = Booking.objects.filter(guide=user).exclude(status=Booking.Status.RESERVED)
         
         # Ближайшие бронирования
         upcoming_bookings = bookings.filter(
             start_datetime__gt=timezone.now(),
             status__in=[Booking.Status.PENDING, Booking.Status.CONFIRMED]
-        ).order_by('start_datetime')[:5]
+        ).for_listing().order_by('start_datetime')[:5]
         
         context = {'request': request} if request else {}
         return {
@@ -539,13 +578,13 @@ class ProfileViewSet(ViewSet):
     
     def _get_hotel_dashboard(self, user, request=None):
         """Дашборд для гостиницы"""
-        bookings = Booking.objects.filter(hotel_admin=user).exclude(status=Booking.Status.RESERVED).select_related('boat', 'boat__owner')
+        bookings = Booking.objects.filter(hotel_admin=user).exclude(status=Booking.Status.RESERVED)
         
         # Ближайшие бронирования
         upcoming_bookings = bookings.filter(
             start_datetime__gt=timezone.now(),
             status__in=[Booking.Status.PENDING, Booking.Status.CONFIRMED]
-        ).order_by('start_datetime')[:5]
+        ).for_listing().order_by('start_datetime')[:5]
         
         # Рассчитываем общий кешбэк
         completed_bookings = bookings.filter(status=Booking.Status.CONFIRMED)
@@ -573,7 +612,7 @@ class ProfileViewSet(ViewSet):
         upcoming_bookings = bookings.filter(
             start_datetime__gt=timezone.now(),
             status__in=[Booking.Status.PENDING, Booking.Status.CONFIRMED]
-        ).order_by('start_datetime')[:5]
+        ).for_listing().order_by('start_datetime')[:5]
         
         context = {'request': request} if request else {}
         return {
@@ -624,7 +663,7 @@ class ProfileViewSet(ViewSet):
             boat_id__in=boat_ids,
             start_datetime__date__gte=date_from,
             start_datetime__date__lte=date_to
-        ).exclude(status=Booking.Status.RESERVED)
+        ).exclude(status=Booking.Status.RESERVED).for_listing()
         
         from apps.bookings.serializers import BookingListSerializer
         from apps.boats.models import BlockedDate, SeasonalPricing
@@ -668,30 +707,18 @@ class ProfileViewSet(ViewSet):
             boats = Boat.objects.filter(owner=user, is_active=True)
             boat_ids = list(boats.values_list('id', flat=True))
             
-            # Учитываем подтвержденные и завершенные бронирования
-            bookings = Booking.objects.filter(
+            # Учитываем подтвержденные и завершенные бронирования, включая перенесенные в архив
+            rows = reporting_booking_totals(
+                ('status',), {'revenue': Sum('total_price')},
                 boat_id__in=boat_ids,
-                status__in=[Booking.Status.CONFIRMED, Booking.Status.COMPLETED]
+                status__in=[Booking.Status.CONFIRMED, Booking.Status.COMPLETED],
+                **_period_filters(period_start, period_end)
             )
-            
-            if period_start:
-                try:
-                    bookings = bookings.filter(start_datetime__date__gte=datetime.strptime(period_start, '%Y-%m-%d').date())
-                except ValueError:
-                    pass
-            
-            if period_end:
-                try:
-                    bookings = bookings.filter(start_datetime__date__lte=datetime.strptime(period_end, '%Y-%m-%d').date())
-                except ValueError:
-                    pass
-            
-            revenue_sum = bookings.aggregate(Sum('total_price'))['total_price__sum']
-            revenue = Decimal(str(revenue_sum)) if revenue_sum else Decimal('0')
+            revenue = sum((row['revenue'] or Decimal('0') for row in rows), Decimal('0'))
             
             # Комиссия платформы из настроек сайта
             site_settings = SiteSettings.load()
-            commission_percent = site_settings.platform_commission_percent
+            commission_percent = Decimal(str(site_settings.platform_commission_percent))
             platform_commission = revenue * commission_percent / Decimal('100')
             to_payout = revenue - platform_commission
             
@@ -707,34 +734,12 @@ class ProfileViewSet(ViewSet):
             period_start = request.query_params.get('period_start')
             period_end = request.query_params.get('period_end')
             
-            bookings = Booking.objects.filter(guide=user).exclude(status=Booking.Status.RESERVED)
-            
-            if period_start:
-                try:
-                    bookings = bookings.filter(start_datetime__date__gte=datetime.strptime(period_start, '%Y-%m-%d').date())
-                except ValueError:
-                    pass
-            
-            if period_end:
-                try:
-                    bookings = bookings.filter(start_datetime__date__lte=datetime.strptime(period_end, '%Y-%m-%d').date())
-                except ValueError:
-                    pass
-            
-            # Комиссия за одного туриста (пока фиксированная)
-            commission_per_person = 500
-            
-            completed_bookings = bookings.filter(status=Booking.Status.COMPLETED)
-            total_commission = sum(
-                float(commission_per_person * booking.number_of_people)
-                for booking in completed_bookings
-            )
-            
-            pending_bookings = bookings.filter(status__in=[Booking.Status.PENDING, Booking.Status.CONFIRMED])
-            pending_commission = sum(
-                float(commission_per_person * booking.number_of_people)
-                for booking in pending_bookings
+            # Брони гида, включая перенесенные в архив
+            commissions = _guide_commissions(
+                user, ~Q(status=Booking.Status.RESERVED), **_period_filters(period_start, period_end)
             )
+            total_commission = commissions['total_commission']
+            pending_commission = commissions['pending_commission']
             
             # Следующая выплата (каждый понедельник)
             today = timezone.now().date()
@@ -800,49 +805,29 @@ class GuideCommissionsView(APIView):
         date_from = request.query_params.get('date_from')
         date_to = request.query_params.get('date_to')
         
-        bookings = Booking.objects.filter(guide=user).exclude(status=Booking.Status.RESERVED)
-        
-        if date_from:
-            try:
-                bookings = bookings.filter(start_datetime__date__gte=datetime.strptime(date_from, '%Y-%m-%d').date())
-            except ValueError:
-                pass
-        
-        if date_to:
-            try:
-                bookings = bookings.filter(start_datetime__date__lte=datetime.strptime(date_to, '%Y-%m-%d').date())
-            except ValueError:
-                pass
+        period = _period_filters(date_from, date_to)
+        commissions = _guide_commissions(user, ~Q(status=Booking.Status.RESERVED), **period)
+        total_commission = commissions['total_commission']
+        pending_commission = commissions['pending_commission']
         
-        # Комиссия за одного туриста (пока фиксированная, потом будет из модели)
-        commission_per_person = 500
-        
-        completed_bookings = bookings.filter(status=Booking.Status.COMPLETED)
-        total_commission = sum(
-            float(commission_per_person * booking.number_of_people)
-            for booking in completed_bookings
-        )
-        
-        pending_bookings = bookings.filter(status__in=[Booking.Status.PENDING, Booking.Status.CONFIRMED])
-        pending_commission = sum(
-            float(commission_per_person * booking.number_of_people)
-            for booking in pending_bookings
-        )
-        
-        # История комиссий
+        # История комиссий (включая брони из архива)
+        completed_bookings = reporting_bookings(
+            ('id', 'start_datetime', 'number_of_people', 'status'),
+            guide=user, status=Booking.Status.COMPLETED, **period
+        ).order_by('-start_datetime')
         commission_history = []
         for booking in completed_bookings:
             commission_history.append({
-                'booking_id': booking.id,
-                'date': booking.start_datetime.date().isoformat(),
-                'number_of_people': booking.number_of_people,
-                'commission': float(commission_per_person * booking.number_of_people),
-                'status': booking.status
+                'booking_id': booking['id'],
+                'date': booking['start_datetime'].date().isoformat(),
+                'number_of_people': booking['number_of_people'],
+                'commission': float(GUIDE_COMMISSION_PER_PERSON * booking['number_of_people']),
+                'status': booking['status']
             })
         
         return Response({
             'total_commission': total_commission,
-            'bookings_count': bookings.count(),
+            'bookings_count': commissions['bookings_count'],
             'pending_commission': pending_commission,
             'paid_commission': total_commission,
             'commission_history': commission_history
@@ -1078,32 +1063,33 @@ class AdminCaptainsFinancesTableView(APIView):
             if not boat_ids:
                 continue
             
-            # Получаем бронирования
+            # Получаем бронирования (рабочая таблица и архив)
             # Учитываем все статусы кроме отмененных для финансовой отчетности
-            bookings = Booking.objects.filter(
-                boat_id__in=boat_ids
-            ).exclude(status=Booking.Status.CANCELLED)
+            filters = {'boat_id__in': boat_ids}
             
             # Фильтр по периоду
             if period_start:
                 try:
-                    period_start_date = datetime.strptime(period_start, '%Y-%m-%d').date()
-                    bookings = bookings.filter(start_datetime__date__gte=period_start_date)
+                    filters['start_datetime__date__gte'] = datetime.strptime(period_start, '%Y-%m-%d').date()
                 except ValueError:
                     pass
             
             if period_end:
                 try:
-                    period_end_date = datetime.strptime(period_end, '%Y-%m-%d').date()
-                    bookings = bookings.filter(start_datetime__date__lte=period_end_date)
+                    filters['start_datetime__date__lte'] = datetime.strptime(period_end, '%Y-%m-%d').date()
                 except ValueError:
                     pass
             
+            bookings_list = list(reporting_bookings(
+                ('id', 'start_datetime', 'status', 'total_price', 'number_of_people'),
+                ~Q(status=Booking.Status.CANCELLED),
+                **filters
+            ))
+            
             # Логируем для отладки
-            bookings_list = list(bookings)
             logger.info(f'Капитан {captain.email}: найдено бронирований {len(bookings_list)}, судов {len(boat_ids)}')
             for b in bookings_list[:5]:  # Логируем первые 5
-                logger.info(f'  - Бронирование {b.id}: дата {b.start_datetime.date()}, статус {b.status}, цена {b.total_price}, люди {b.number_of_people}')
+                logger.info(f"  - Бронирование {b['id']}: дата {b['start_datetime'].date()}, статус {b['status']}, цена {b['total_price']}, люди {b['number_of_people']}")
             
             # Группируем по датам
             bookings_by_date = {}
@@ -1112,7 +1098,7 @@ class AdminCaptainsFinancesTableView(APIView):
             total_bookings_count = 0
             
             for booking in bookings_list:
-                booking_date = booking.start_datetime.date()
+                booking_date = booking['start_datetime'].date()
                 date_key = booking_date.isoformat()
                 
                 if date_key not in bookings_by_date:
@@ -1123,12 +1109,12 @@ class AdminCaptainsFinancesTableView(APIView):
                         'bookings_count': 0
                     }
                 
-                bookings_by_date[date_key]['revenue'] += booking.total_price
-                bookings_by_date[date_key]['people'] += booking.number_of_people
+                bookings_by_date[date_key]['revenue'] += booking['total_price']
+                bookings_by_date[date_key]['people'] += booking['number_of_people']
                 bookings_by_date[date_key]['bookings_count'] += 1
                 
-                total_revenue += booking.total_price
-                total_people += booking.number_of_people
+                total_revenue += booking['total_price']
+                total_people += booking['number_of_people']
                 total_bookings_count += 1
             
             # Рассчитываем комиссию и к выплате
@@ -1224,29 +1210,32 @@ class AdminHotelsFinancesTableView(APIView):
         
         # Для каждой гостиницы собираем данные
         for hotel in hotels:
-            # Получаем бронирования гостиницы
-            bookings = Booking.objects.filter(hotel_admin=hotel).exclude(status=Booking.Status.RESERVED)
+            # Получаем бронирования гостиницы (рабочая таблица и архив)
+            filters = {'hotel_admin': hotel}
             
             # Фильтр по периоду
             if period_start:
                 try:
-                    period_start_date = datetime.strptime(period_start, '%Y-%m-%d').date()
-                    bookings = bookings.filter(start_datetime__date__gte=period_start_date)
+                    filters['start_datetime__date__gte'] = datetime.strptime(period_start, '%Y-%m-%d').date()
                 except ValueError:
                     pass
             
             if period_end:
                 try:
-                    period_end_date = datetime.strptime(period_end, '%Y-%m-%d').date()
-                    bookings = bookings.filter(start_datetime__date__lte=period_end_date)
+                    filters['start_datetime__date__lte'] = datetime.strptime(period_end, '%Y-%m-%d').date()
                 except ValueError:
                     pass
             
+            bookings_list = list(reporting_bookings(
+                ('id', 'start_datetime', 'status', 'total_price', 'number_of_people', 'hotel_cashback_amount'),
+                ~Q(status=Booking.Status.RESERVED),
+                **filters
+            ))
+            
             # Логируем для отладки
-            bookings_list = list(bookings)
             logger.info(f'Гостиница {hotel.email}: найдено бронирований {len(bookings_list)}')
             for b in bookings_list[:5]:  # Логируем первые 5
-                logger.info(f'  - Бронирование {b.id}: дата {b.start_datetime.date()}, статус {b.status}, кешбэк {b.hotel_cashback_amount}')
+                logger.info(f"  - Бронирование {b['id']}: дата {b['start_datetime'].date()}, статус {b['status']}, кешбэк {b['hotel_cashback_amount']}")
             
             # Группируем по датам
             bookings_by_date = {}
@@ -1257,10 +1246,10 @@ class AdminHotelsFinancesTableView(APIView):
             
             for booking in bookings_list:
                 # Учитываем только подтвержденные бронирования для кешбэка
-                if booking.status not in [Booking.Status.CONFIRMED, Booking.Status.COMPLETED]:
+                if booking['status'] not in [Booking.Status.CONFIRMED, Booking.Status.COMPLETED]:
                     continue
                     
-                booking_date = booking.start_datetime.date()
+                booking_date = booking['start_datetime'].date()
                 date_key = booking_date.isoformat()
                 
                 if date_key not in bookings_by_date:
@@ -1272,14 +1261,14 @@ class AdminHotelsFinancesTableView(APIView):
                         'bookings_count': 0
                     }
                 
-                bookings_by_date[date_key]['cashback'] += booking.hotel_cashback_amount
-                bookings_by_date[date_key]['revenue'] += booking.total_price
-                bookings_by_date[date_key]['people'] += booking.number_of_people
+                bookings_by_date[date_key]['cashback'] += booking['hotel_cashback_amount']
+                bookings_by_date[date_key]['revenue'] += booking['total_price']
+                bookings_by_date[date_key]['people'] += booking['number_of_people']
                 bookings_by_date[date_key]['bookings_count'] += 1
                 
-                total_cashback += booking.hotel_cashback_amount
-                total_revenue += booking.total_price
-                total_people += booking.number_of_people
+                total_cashback += booking['hotel_cashback_amount']
+                total_revenue += booking['total_price']
+                total_people += booking['number_of_people']
                 total_bookings_count += 1
             
             # Добавляем в сводку по гостинице
@@ -1317,3 +1306,40 @@ class AdminHotelsFinancesTableView(APIView):
             'period_end': period_end
         })
 
+
+class AdminExportView(APIView):
+    """
+    Потоковая выгрузка для админа: бронирования, платежи, выплаты капитанам, кешбэк гостиниц
+    GET /api/accounts/admin/exports/<kind>/?file_format=csv|xlsx&period_start=YYYY-MM-DD&period_end=YYYY-MM-DD
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request, kind):
+        if not request.user.is_staff:
+            raise PermissionDenied("Только для администраторов")
+        
+        if kind not in exports.EXPORTS:
+            raise NotFound(f"Неизвестная выгрузка: {kind}")
+        
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in exports.FORMATS:
+            raise ValidationError({'file_format': 'Допустимые форматы: csv, xlsx'})
+        
+        # Фильтр по периоду
+        period = {}
+        for param in ('period_start', 'period_end'):
+            value = request.query_params.get(param)
+            if value:
+                try:
+                    period[param] = datetime.strptime(value, '%Y-%m-%d').date()
+                except ValueError:
+                    raise ValidationError({param: 'Неверный формат даты. Используйте YYYY-MM-DD'})
+        
+        filename, header, rows = exports.EXPORTS[kind]
+        stream, content_type = exports.FORMATS[file_format]
+        
+        logger.info(f"Admin {request.user.email} started export {kind}.{file_format}: {period}")
+        response = StreamingHttpResponse(stream(header, rows(**period)), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}.{file_format}"'
+        return response
+
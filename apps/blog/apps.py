@@ -5,3 +5,7 @@ class BlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.blog'
     verbose_name = 'Блог'
+
+    def ready(self):
+        """Импортируем signals при загрузке приложения"""
+        import apps.blog.signals
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='URL готовых thumbnail по размерам (создаются в фоне после сохранения)', verbose_name='Варианты изображения'),
+        ),
+    ]
@@ -42,6 +42,13 @@ class Article(models.Model):
         verbose_name='Категория'
     )
     image = models.ImageField(upload_to='blog/articles/', verbose_name='Изображение')
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Варианты изображения',
+        help_text='URL готовых thumbnail по размерам (создаются в фоне после сохранения)'
+    )
     content = RichTextField(verbose_name='Содержание')
     excerpt = models.TextField(max_length=500, blank=True, verbose_name='Краткое описание')
     is_published = models.BooleanField(default=False, verbose_name='Опубликовано')
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from sorl.thumbnail import get_thumbnail
+from apps.boats.services.image_variants import image_srcset, image_variant_url
 from .models import Category, Article
 
 
@@ -21,11 +21,12 @@ class ArticleListSerializer(serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     image_url = serializers.SerializerMethodField()
     thumbnail_url = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Article
         fields = (
-            'id', 'title', 'slug', 'category', 'image_url', 'thumbnail_url',
+            'id', 'title', 'slug', 'category', 'image_url', 'thumbnail_url', 'srcset',
             'excerpt', 'is_published', 'views_count', 'published_at', 'created_at'
         )
         read_only_fields = ('id', 'slug', 'views_count', 'published_at', 'created_at')
@@ -39,29 +40,24 @@ class ArticleListSerializer(serializers.ModelSerializer):
         return None
     
     def get_thumbnail_url(self, obj):
-        """Возвращает URL thumbnail для списка статей"""
-        if not obj.image:
-            return None
-        
-        try:
-            thumbnail = get_thumbnail(obj.image, '400x300', quality=85, crop='center')
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(thumbnail.url)
-            return thumbnail.url
-        except Exception:
-            return self.get_image_url(obj)
+        """Возвращает URL thumbnail для списка статей (готовый вариант, без PIL в запросе)"""
+        return image_variant_url(obj, '400x300', self.context.get('request'))
+    
+    def get_srcset(self, obj):
+        """Адаптивные варианты в WebP/AVIF: [{url, width, type}]"""
+        return image_srcset(obj, self.context.get('request'))
 
 
 class ArticleDetailSerializer(serializers.ModelSerializer):
     """Сериализатор для детальной информации о статье"""
     category = CategorySerializer(read_only=True)
     image_url = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Article
         fields = (
-            'id', 'title', 'slug', 'category', 'image_url', 'content',
+            'id', 'title', 'slug', 'category', 'image_url', 'srcset', 'content',
             'excerpt', 'is_published', 'views_count', 'published_at',
             'created_at', 'updated_at'
         )
@@ -74,4 +70,6 @@ class ArticleDetailSerializer(serializers.ModelSerializer):
                 return request.build_absolute_uri(obj.image.url)
             return obj.image.url
         return None
-
+    
+    def get_srcset(self, obj):
+        return image_srcset(obj, self.context.get('request'))
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from apps.boats.services.image_variants import schedule_image_variants
+from .models import Article
+
+
+@receiver(post_save, sender=Article)
+def create_article_image_variants(sender, instance, **kwargs):
+    """Создание thumbnail всех размеров в фоне после сохранения статьи"""
+    schedule_image_variants(instance)
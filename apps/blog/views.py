@@ -6,6 +6,8 @@ from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 from django.db.models import Q
 
+from apps.search.filters import FullTextSearchFilter
+from apps.search.models import SearchDocument
 from .models import Category, Article
 from .serializers import CategorySerializer, ArticleListSerializer, ArticleDetailSerializer
 
@@ -26,9 +28,10 @@ class ArticleViewSet(viewsets.ReadOnlyModelViewSet):
     """
     queryset = Article.objects.filter(is_published=True).select_related('category')
     lookup_field = 'slug'
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['category']
     search_fields = ['title', 'excerpt', 'content']
+    search_kind = SearchDocument.Kind.ARTICLE
     ordering_fields = ['published_at', 'created_at', 'views_count']
     ordering = ['-published_at']
     permission_classes = [AllowAny]
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from .models import (
     Dock, Boat, BoatImage, Feature, BoatPricing, SailingZone,
-    BoatAvailability, GuideBoatDiscount, HotelBoatCashback, CharterPricing
+    BoatAvailability, GuideBoatDiscount, HotelBoatCashback, CharterPricing, ScheduleTemplate
 )
 
 
@@ -145,6 +145,24 @@ class BoatAvailabilityAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(ScheduleTemplate)
+class ScheduleTemplateAdmin(admin.ModelAdmin):
+    list_display = ('boat', 'name', 'trip_type', 'date_from', 'date_to', 'is_active')
+    list_filter = ('is_active', 'trip_type', 'boat')
+    search_fields = ('boat__name', 'name')
+    fieldsets = (
+        ('Основная информация', {
+            'fields': ('boat', 'name', 'trip_type', 'capacity_limit')
+        }),
+        ('Расписание', {
+            'fields': ('weekdays', 'departure_times', 'duration_hours', 'date_from', 'date_to')
+        }),
+        ('Статус', {
+            'fields': ('is_active',)
+        }),
+    )
+
+
 @admin.register(CharterPricing)
 class CharterPricingAdmin(admin.ModelAdmin):
     list_display = ('boat', 'total_price', 'is_active')
@@ -5,3 +5,7 @@ class BoatsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.boats'
     verbose_name = 'Катера'
+
+    def ready(self):
+        """Импортируем signals при загрузке приложения"""
+        import apps.boats.signals
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.accounts.models import User
+from apps.blog.models import Article
+from apps.boats.models import BoatImage
+from apps.boats.services.image_variants import generate_image_variants, variants_are_current
+
+
+class Command(BaseCommand):
+    help = 'Создает thumbnail и WebP/AVIF-варианты фото судов, статей и аватарок (загруженных до фоновой обработки)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Пересоздать варианты, даже если они актуальны')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total = 0
+
+        for model, image_field in ((BoatImage, 'image'), (Article, 'image'), (User, 'avatar')):
+            generated = 0
+            images = model.objects.exclude(**{image_field: ''}).exclude(**{f'{image_field}__isnull': True})
+            for instance in images.order_by('pk').iterator():
+                if options['force'] or not variants_are_current(instance):
+                    if generate_image_variants(instance, force=options['force']):
+                        generated += 1
+            self.stdout.write(f"{model._meta.verbose_name_plural}: создано вариантов для {generated} изображений")
+            total += generated
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово! Обработано изображений: {total}. Время: {time.monotonic() - started:.2f} с'
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boats', '0014_backfill_hourly_charter_pricing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='boatimage',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='URL готовых thumbnail по размерам (создаются в фоне после загрузки)', verbose_name='Варианты изображения'),
+        ),
+    ]
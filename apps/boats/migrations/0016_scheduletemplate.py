@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:54
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boats', '0015_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=200, verbose_name='Название')),
+                ('weekdays', models.JSONField(default=list, help_text='Номера дней недели: 0 — понедельник, 6 — воскресенье', verbose_name='Дни недели')),
+                ('departure_times', models.JSONField(default=list, help_text='Например: ["10:00", "14:00"]', verbose_name='Время выхода')),
+                ('duration_hours', models.PositiveIntegerField(default=2, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(12)], verbose_name='Длительность (часы)')),
+                ('trip_type', models.CharField(choices=[('group', 'Групповой'), ('individual', 'Индивидуальный (Чарт)')], default='group', max_length=20, verbose_name='Тип выхода')),
+                ('capacity_limit', models.PositiveIntegerField(blank=True, help_text='Если не указано, используется вместимость судна', null=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(11)], verbose_name='Ограничение мест на рейс')),
+                ('date_from', models.DateField(verbose_name='Дата начала')),
+                ('date_to', models.DateField(verbose_name='Дата окончания')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активен')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('boat', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedule_templates', to='boats.boat', verbose_name='Судно')),
+            ],
+            options={
+                'verbose_name': 'Шаблон расписания',
+                'verbose_name_plural': 'Шаблоны расписания',
+                'ordering': ['-date_from'],
+            },
+        ),
+    ]
@@ -29,9 +29,36 @@ class Dock(models.Model):
         return self.name
 
 
+class BoatQuerySet(models.QuerySet):
+    """QuerySet судов с общими выборками"""
+
+    def with_min_price(self, on_date=None):
+        """
+        Аннотирует подзапросами:
+        - min_price - минимальная базовая цена за человека (BoatPricing);
+        - season_min_price - минимальная активная сезонная цена (SeasonalPricing),
+          действующая на on_date (по умолчанию сегодня), или NULL.
+        По аннотациям можно сортировать, фильтровать и пагинировать в БД.
+        """
+        on_date = on_date or date.today()
+        base_prices = BoatPricing.objects.filter(boat=models.OuterRef('pk')).order_by('price_per_person')
+        season_prices = SeasonalPricing.objects.filter(
+            boat=models.OuterRef('pk'),
+            is_active=True,
+            date_from__lte=on_date,
+            date_to__gte=on_date,
+        ).order_by('price_per_person')
+        return self.annotate(
+            min_price=models.Subquery(base_prices.values('price_per_person')[:1]),
+            season_min_price=models.Subquery(season_prices.values('price_per_person')[:1]),
+        )
+
+
 class Boat(models.Model):
     """Модель судна"""
     
+    objects = BoatQuerySet.as_manager()
+    
     class BoatType(models.TextChoices):
         BOAT = 'boat', 'Катер'
         YACHT = 'yacht', 'Яхта'
@@ -99,6 +126,13 @@ class BoatImage(models.Model):
         default=0,
         verbose_name='Порядок сортировки'
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Варианты изображения',
+        help_text='URL готовых thumbnail по размерам (создаются в фоне после загрузки)'
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     
     class Meta:
@@ -257,6 +291,71 @@ class BoatAvailability(models.Model):
         return int(duration.total_seconds() / 3600)
 
 
+class ScheduleTemplate(models.Model):
+    """
+    Шаблон регулярного расписания: по каким дням недели и в какое время судно выходит в период.
+    Рейсы (BoatAvailability) создаются из шаблона пачкой, см. services/schedule_templates.py
+    """
+
+    class Weekday(models.IntegerChoices):
+        MONDAY = 0, 'Понедельник'
+        TUESDAY = 1, 'Вторник'
+        WEDNESDAY = 2, 'Среда'
+        THURSDAY = 3, 'Четверг'
+        FRIDAY = 4, 'Пятница'
+        SATURDAY = 5, 'Суббота'
+        SUNDAY = 6, 'Воскресенье'
+
+    boat = models.ForeignKey(
+        Boat,
+        on_delete=models.CASCADE,
+        related_name='schedule_templates',
+        verbose_name='Судно'
+    )
+    name = models.CharField(max_length=200, blank=True, verbose_name='Название')
+    weekdays = models.JSONField(
+        default=list,
+        verbose_name='Дни недели',
+        help_text='Номера дней недели: 0 — понедельник, 6 — воскресенье'
+    )
+    departure_times = models.JSONField(
+        default=list,
+        verbose_name='Время выхода',
+        help_text='Например: ["10:00", "14:00"]'
+    )
+    duration_hours = models.PositiveIntegerField(
+        validators=[MinValueValidator(1), MaxValueValidator(12)],
+        default=2,
+        verbose_name='Длительность (часы)'
+    )
+    trip_type = models.CharField(
+        max_length=20,
+        choices=TripType.choices,
+        default=TripType.GROUP,
+        verbose_name='Тип выхода'
+    )
+    capacity_limit = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(1), MaxValueValidator(11)],
+        verbose_name='Ограничение мест на рейс',
+        help_text='Если не указано, используется вместимость судна'
+    )
+    date_from = models.DateField(verbose_name='Дата начала')
+    date_to = models.DateField(verbose_name='Дата окончания')
+    is_active = models.BooleanField(default=True, verbose_name='Активен')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    class Meta:
+        verbose_name = 'Шаблон расписания'
+        verbose_name_plural = 'Шаблоны расписания'
+        ordering = ['-date_from']
+
+    def __str__(self):
+        return f"{self.boat.name} - {self.name or 'шаблон'} ({self.date_from} - {self.date_to})"
+
+
 class GuideBoatDiscount(models.Model):
     """Скидка для гида от владельца судна"""
     guide = models.ForeignKey(
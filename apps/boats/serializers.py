@@ -1,60 +1,47 @@
 from rest_framework import serializers
 from django.db.models import Max
-from decimal import Decimal
-from sorl.thumbnail import get_thumbnail
 from .models import (
     Dock, Boat, BoatImage, Feature, BoatPricing,
-    BoatAvailability, SailingZone, BlockedDate, SeasonalPricing, GuideBoatDiscount,
-    CharterPricing
+    BoatAvailability, SailingZone, BlockedDate, SeasonalPricing,
+    CharterPricing, ScheduleTemplate
 )
-from apps.accounts.models import User
+from .services.image_variants import absolute_url, first_image, image_srcset, image_variant_url
+from .services.partner_rates import get_partner_rates
+from .services.schedule_templates import ends_after_midnight
 
 
 class BoatImageSerializer(serializers.ModelSerializer):
     """Сериализатор для фото судна"""
     image_url = serializers.SerializerMethodField()
     thumbnail_url = serializers.SerializerMethodField()
+    thumbnail_2x_url = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = BoatImage
-        fields = ('id', 'image', 'image_url', 'thumbnail_url', 'order', 'created_at')
+        fields = ('id', 'image', 'image_url', 'thumbnail_url', 'thumbnail_2x_url', 'srcset', 'order', 'created_at')
         read_only_fields = ('id', 'created_at')
     
     def get_image_url(self, obj):
-        request = self.context.get('request')
         if obj.image and hasattr(obj.image, 'url'):
-            if request:
-                return request.build_absolute_uri(obj.image.url)
-            return obj.image.url
+            return absolute_url(self.context.get('request'), obj.image.url)
         return None
     
+    def _variant_name(self):
+        # Детальная страница рейса - больший thumbnail (800x450), главная - 400
+        return '800x450' if self.context.get('is_detail_page', False) else '400'
+    
     def get_thumbnail_url(self, obj):
-        """Возвращает URL thumbnail для карусели"""
-        if not obj.image:
-            return None
-        
-        try:
-            # Определяем размер thumbnail в зависимости от контекста
-            # Для детальной страницы используем больший размер
-            is_detail_page = self.context.get('is_detail_page', False)
-            
-            if is_detail_page:
-                # Детальная страница рейса - используем больший thumbnail (800x450)
-                size = '600x600'
-            else:
-                # Главная страница - используем меньший thumbnail (400x220)
-                size = '400'
-            
-            # Создаем thumbnail (sorl-thumbnail автоматически сохранит пропорции)
-            thumbnail = get_thumbnail(obj.image, size, quality=85, crop='center')
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(thumbnail.url)
-            return thumbnail.url
-        except Exception as e:
-            # Если не удалось создать thumbnail, возвращаем оригинальное изображение
-            print(f"Ошибка при создании thumbnail: {e}")
-            return self.get_image_url(obj)
+        """Возвращает URL thumbnail для карусели (готовый вариант, без PIL в запросе)"""
+        return image_variant_url(obj, self._variant_name(), self.context.get('request'))
+    
+    def get_thumbnail_2x_url(self, obj):
+        """Thumbnail двойного размера для retina-экранов"""
+        return image_variant_url(obj, f'{self._variant_name()}@2x', self.context.get('request'))
+    
+    def get_srcset(self, obj):
+        """Адаптивные варианты в WebP/AVIF: [{url, width, type}]"""
+        return image_srcset(obj, self.context.get('request'))
 
 
 class FeatureSerializer(serializers.ModelSerializer):
@@ -87,36 +74,9 @@ class BoatPricingSerializer(serializers.ModelSerializer):
     
     def get_price_per_person(self, obj):
         """Возвращает цену за человека с учетом скидки для гидов"""
-        base_price = obj.price_per_person
-        request = self.context.get('request')
-        
-        # Если пользователь не авторизован, возвращаем базовую цену
-        if not request or not request.user.is_authenticated:
-            return base_price
-        
-        user = request.user
-        # Если пользователь не является верифицированным гидом, возвращаем базовую цену
-        if user.role != User.Role.GUIDE or not user.is_verified:
-            return base_price
-        
-        # Получаем владельца судна
-        boat = obj.boat
-        boat_owner = boat.owner
-        
-        # Ищем скидку для данного гида и владельца судна
-        try:
-            discount_obj = GuideBoatDiscount.objects.get(
-                guide=user,
-                boat_owner=boat_owner,
-                is_active=True
-            )
-            # Применяем скидку
-            discount_percent = discount_obj.discount_percent
-            discounted_price = Decimal(str(base_price)) * (1 - discount_percent / 100)
-            return discounted_price.quantize(Decimal('0.01'))
-        except GuideBoatDiscount.DoesNotExist:
-            # Если скидка не найдена, возвращаем базовую цену
-            return base_price
+        # Скидка верифицированного гида от владельца судна (скидки пользователя загружаются раз за запрос)
+        rates = get_partner_rates(self.context.get('request'))
+        return rates.guide_price(obj.price_per_person, obj.boat.owner_id)
 
 
 class BoatAvailabilitySerializer(serializers.ModelSerializer):
@@ -132,6 +92,59 @@ class BoatAvailabilitySerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created_at')
 
 
+class ScheduleTemplateSerializer(serializers.ModelSerializer):
+    """Сериализатор шаблона регулярного расписания"""
+    weekdays = serializers.ListField(
+        child=serializers.ChoiceField(choices=ScheduleTemplate.Weekday.choices),
+        allow_empty=False
+    )
+    departure_times = serializers.ListField(
+        child=serializers.TimeField(format='%H:%M'),
+        allow_empty=False
+    )
+    trip_type_display = serializers.CharField(source='get_trip_type_display', read_only=True)
+
+    # Не больше года за раз - ограничивает число рейсов, создаваемых одним запросом
+    MAX_PERIOD_DAYS = 366
+
+    class Meta:
+        model = ScheduleTemplate
+        fields = (
+            'id', 'name', 'weekdays', 'departure_times', 'duration_hours', 'trip_type', 'trip_type_display',
+            'capacity_limit', 'date_from', 'date_to', 'is_active', 'created_at', 'updated_at'
+        )
+        read_only_fields = ('id', 'created_at', 'updated_at')
+
+    def validate_weekdays(self, value):
+        return sorted(set(value))
+
+    def validate_departure_times(self, value):
+        # В JSON-поле храним строки "HH:MM"
+        return sorted({departure_time.strftime('%H:%M') for departure_time in value})
+
+    def validate(self, attrs):
+        date_from = attrs.get('date_from', getattr(self.instance, 'date_from', None))
+        date_to = attrs.get('date_to', getattr(self.instance, 'date_to', None))
+        if date_from and date_to:
+            if date_to < date_from:
+                raise serializers.ValidationError({'date_to': 'Дата окончания раньше даты начала'})
+            if (date_to - date_from).days > self.MAX_PERIOD_DAYS:
+                raise serializers.ValidationError(
+                    {'date_to': f'Период шаблона не может быть больше {self.MAX_PERIOD_DAYS} дней'}
+                )
+
+        # Рейс должен вернуться в тот же день: return_time рейса хранится без даты
+        departure_times = attrs.get('departure_times', getattr(self.instance, 'departure_times', None))
+        duration_hours = attrs.get('duration_hours', getattr(self.instance, 'duration_hours', None))
+        if departure_times and duration_hours:
+            late = [value for value in departure_times if ends_after_midnight(value, duration_hours)]
+            if late:
+                raise serializers.ValidationError(
+                    {'departure_times': f"Рейс длительностью {duration_hours} ч. из {', '.join(late)} заканчивается после полуночи"}
+                )
+        return attrs
+
+
 class SailingZoneSerializer(serializers.ModelSerializer):
     """Сериализатор для маршрутов (зон плавания)"""
     
@@ -193,19 +206,9 @@ class BoatForDockSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
     def get_first_image(self, obj):
-        first_image = obj.images.first()
-        if first_image and first_image.image:
-            try:
-                thumbnail = get_thumbnail(first_image.image, '400', quality=85, crop='center')
-                request = self.context.get('request')
-                if request:
-                    return request.build_absolute_uri(thumbnail.url)
-                return thumbnail.url
-            except Exception:
-                request = self.context.get('request')
-                if request:
-                    return request.build_absolute_uri(first_image.image.url)
-                return first_image.image.url
+        image = first_image(obj)
+        if image:
+            return image_variant_url(image, '400', self.context.get('request'))
         return None
 
     def get_owner_name(self, obj):
@@ -225,7 +228,10 @@ class DockPierSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
     def get_boats(self, obj):
-        active_boats = obj.boats.filter(is_active=True).select_related('owner').prefetch_related('images')
+        # DockViewSet.list загружает активные суда одним Prefetch (to_attr='active_boats')
+        active_boats = getattr(obj, 'active_boats', None)
+        if active_boats is None:
+            active_boats = obj.boats.filter(is_active=True).select_related('owner').prefetch_related('images')
         return BoatForDockSerializer(active_boats, many=True, context=self.context).data
 
 
@@ -247,20 +253,9 @@ class BoatShortSerializer(serializers.ModelSerializer):
     
     def get_first_image(self, obj):
         """Возвращает thumbnail первого изображения для главной страницы"""
-        first_image = obj.images.first()
-        if first_image:
-            try:
-                thumbnail = get_thumbnail(first_image.image, '400', quality=85, crop='center')
-                request = self.context.get('request')
-                if request:
-                    return request.build_absolute_uri(thumbnail.url)
-                return thumbnail.url
-            except Exception:
-                # Если не удалось создать thumbnail, возвращаем оригинал
-                request = self.context.get('request')
-                if request:
-                    return request.build_absolute_uri(first_image.image.url)
-                return first_image.image.url
+        image = first_image(obj)
+        if image:
+            return image_variant_url(image, '400', self.context.get('request'))
         return None
     
     def get_images(self, obj):
@@ -270,21 +265,12 @@ class BoatShortSerializer(serializers.ModelSerializer):
         result = []
         for img in images:
             if img.image:
-                try:
-                    # Используем thumbnail для карусели на главной странице
-                    thumbnail = get_thumbnail(img.image, '400', quality=85, crop='center')
-                    image_url = thumbnail.url
-                    if request:
-                        image_url = request.build_absolute_uri(image_url)
-                except Exception:
-                    # Если не удалось создать thumbnail, используем оригинал
-                    image_url = img.image.url
-                    if request:
-                        image_url = request.build_absolute_uri(image_url)
-                
+                # Готовые thumbnail для карусели на главной странице (оригинал, пока их нет)
                 result.append({
                     'id': img.id,
-                    'url': image_url,
+                    'url': image_variant_url(img, '400', request),
+                    'url_2x': image_variant_url(img, '400@2x', request),
+                    'srcset': image_srcset(img, request),
                     'order': img.order
                 })
         return result
@@ -304,6 +290,7 @@ class BoatListSerializer(serializers.ModelSerializer):
     first_image = serializers.SerializerMethodField()
     features = serializers.SerializerMethodField()
     min_price = serializers.SerializerMethodField()
+    season_min_price = serializers.SerializerMethodField()
     dock = DockSerializer(read_only=True)
     
     class Meta:
@@ -311,27 +298,32 @@ class BoatListSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'name', 'boat_type', 'boat_type_display', 'capacity',
             'description', 'is_active', 'owner_email', 'first_image',
-            'features', 'min_price', 'dock', 'created_at'
+            'features', 'min_price', 'season_min_price', 'dock', 'created_at'
         )
         read_only_fields = ('id', 'created_at')
     
     def get_first_image(self, obj):
-        first_image = obj.images.first()
-        if first_image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(first_image.image.url)
-            return first_image.image.url
+        image = first_image(obj)
+        if image:
+            return absolute_url(self.context.get('request'), image.image.url)
         return None
     
     def get_features(self, obj):
-        return [feature.name for feature in obj.features.filter(is_active=True)]
+        # Фильтруем в Python, чтобы использовать prefetch_related('features')
+        return [feature.name for feature in obj.features.all() if feature.is_active]
     
     def get_min_price(self, obj):
-        min_pricing = obj.pricing.order_by('price_per_person').first()
-        if min_pricing:
-            return float(min_pricing.price_per_person)
-        return None
+        """Минимальная цена за человека (аннотация Boat.objects.with_min_price())"""
+        if hasattr(obj, 'min_price'):
+            min_price = obj.min_price
+        else:
+            min_price = min((pricing.price_per_person for pricing in obj.pricing.all()), default=None)
+        return float(min_price) if min_price is not None else None
+    
+    def get_season_min_price(self, obj):
+        """Минимальная сезонная цена на сегодня (None - сезонных цен нет)"""
+        season_min_price = getattr(obj, 'season_min_price', None)
+        return float(season_min_price) if season_min_price is not None else None
 
 
 class BoatDetailSerializer(serializers.ModelSerializer):
@@ -0,0 +1,264 @@
+"""
+Предварительно рассчитанные варианты изображений (thumbnail и srcset).
+
+При сохранении BoatImage / Article / аватарки пользователя все нужные размеры
+создаются в пуле фоновых потоков, а их URL сохраняются в JSON-поле записи
+(image_variants / avatar_variants):
+- thumbnail с обрезкой (включая @2x для retina) - через sorl-thumbnail;
+- адаптивные варианты нескольких ширин в WebP и AVIF (если Pillow собран с AVIF)
+  для srcset - напрямую через Pillow, sorl не умеет AVIF.
+Сериализаторы читают готовые URL и не вызывают PIL и kvstore sorl в запросе;
+пока вариантов нет, отдается оригинал. Фото судна берутся из prefetch_related('images')
+(first_image), абсолютный URL собирается из базового адреса, вычисленного один раз на запрос.
+"""
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps, features
+
+from sorl.thumbnail import get_thumbnail
+
+logger = logging.getLogger(__name__)
+
+# Имя варианта -> геометрия sorl. Все варианты обрезаются по центру
+BOAT_IMAGE_VARIANTS = {
+    # Карточки и карусель на главной / в поиске рейсов
+    '400': '400',
+    '400@2x': '800',
+    # Детальная страница судна
+    '800x450': '800x450',
+    '800x450@2x': '1600x900',
+}
+ARTICLE_IMAGE_VARIANTS = {
+    '400x300': '400x300',
+    '400x300@2x': '800x600',
+}
+
+# Модель -> (поле изображения, JSON-поле вариантов, thumbnail, ширины srcset)
+IMAGE_VARIANT_MODELS = {
+    'boats.boatimage': ('image', 'image_variants', BOAT_IMAGE_VARIANTS, (320, 640, 960, 1280)),
+    'blog.article': ('image', 'image_variants', ARTICLE_IMAGE_VARIANTS, (320, 640, 960, 1280)),
+    'accounts.user': ('avatar', 'avatar_variants', {}, (64, 128, 256)),
+}
+
+# Форматы srcset в порядке предпочтения: (формат Pillow, расширение, MIME, качество)
+SRCSET_FORMATS = [
+    ('AVIF', 'avif', 'image/avif', 55),
+    ('WEBP', 'webp', 'image/webp', 80),
+]
+
+# Сколько ждем повторной постановки в очередь изображения без вариантов, сек
+SCHEDULE_LOCK_TIMEOUT = 300
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'IMAGE_VARIANT_WORKERS', 2),
+                thread_name_prefix='image-variants'
+            )
+        return _executor
+
+
+def _config(instance):
+    return IMAGE_VARIANT_MODELS[instance._meta.label_lower]
+
+
+def _image(instance):
+    return getattr(instance, _config(instance)[0])
+
+
+def _variants(instance):
+    return getattr(instance, _config(instance)[1]) or {}
+
+
+def srcset_formats():
+    """Форматы srcset, которые поддерживает установленный Pillow"""
+    return [fmt for fmt in SRCSET_FORMATS if features.check(fmt[1])]
+
+
+def variants_are_current(instance):
+    """Варианты созданы для текущего файла изображения"""
+    image = _image(instance)
+    return bool(image) and _variants(instance).get('source') == image.name
+
+
+def _render_srcset(instance, image, widths):
+    """Уменьшенные копии в WebP / AVIF. Возвращает [{url, width, type}], лучший формат первым"""
+    storage = image.storage
+    digest = hashlib.md5(image.name.encode('utf-8')).hexdigest()[:16]
+    prefix = f"variants/{instance._meta.label_lower.replace('.', '_')}/{digest}"
+
+    with image.open('rb') as f:
+        source = ImageOps.exif_transpose(Image.open(f))
+        source.load()
+    if source.mode not in ('RGB', 'RGBA'):
+        source = source.convert('RGBA' if source.mode in ('LA', 'PA', 'P') else 'RGB')
+
+    # Не увеличиваем: ширины больше оригинала заменяем шириной оригинала
+    targets = sorted({min(width, source.width) for width in widths})
+    resized = {
+        width: source if width == source.width else source.resize(
+            (width, max(1, round(source.height * width / source.width))), Image.LANCZOS
+        )
+        for width in targets
+    }
+
+    srcset = []
+    for fmt, ext, mime, quality in srcset_formats():
+        for width, picture in resized.items():
+            buffer = BytesIO()
+            picture.save(buffer, fmt, quality=quality)
+            path = f'{prefix}/{width}.{ext}'
+            if storage.exists(path):
+                storage.delete(path)
+            saved = storage.save(path, ContentFile(buffer.getvalue()))
+            srcset.append({'url': storage.url(saved), 'width': width, 'type': mime})
+    return srcset
+
+
+def generate_image_variants(instance, force=False):
+    """
+    Создает все варианты изображения и сохраняет их URL в JSON-поле вариантов.
+
+    Returns:
+        dict | None: сохраненные варианты (None - изображения нет или варианты актуальны)
+    """
+    field_name, variants_field, thumbnails, widths = _config(instance)
+    image = getattr(instance, field_name)
+    if not image or (variants_are_current(instance) and not force):
+        return None
+
+    quality = getattr(settings, 'THUMBNAIL_QUALITY', 85)
+    variants = {'source': image.name}
+    for name, geometry in thumbnails.items():
+        try:
+            variants[name] = get_thumbnail(image, geometry, quality=quality, crop='center').url
+        except Exception as e:
+            logger.error(f"Failed to create {geometry} thumbnail for {instance._meta.label} {instance.pk}: {str(e)}")
+    try:
+        variants['srcset'] = _render_srcset(instance, image, widths)
+    except Exception as e:
+        logger.error(f"Failed to create srcset for {instance._meta.label} {instance.pk}: {str(e)}")
+
+    # update() вместо save(): не вызываем post_save повторно и не перетираем изменения других полей
+    type(instance).objects.filter(pk=instance.pk, **{field_name: image.name}).update(**{variants_field: variants})
+    setattr(instance, variants_field, variants)
+    if instance._meta.label == 'boats.BoatImage':
+        # update() не вызывает post_save - сбрасываем кеш страницы «Причал» с URL оригиналов
+        from .pier_cache import invalidate_pier_cache
+        invalidate_pier_cache()
+    return variants
+
+
+def _lock_key(model, pk):
+    return f'image_variants_{model._meta.label_lower}_{pk}'
+
+
+def process_image_variants(model, pk):
+    try:
+        instance = model.objects.filter(pk=pk).first()
+        if instance is not None:
+            generate_image_variants(instance)
+    except Exception as e:
+        logger.error(f"❌ Error generating image variants for {model._meta.label} {pk}: {str(e)}", exc_info=True)
+    finally:
+        cache.delete(_lock_key(model, pk))
+
+
+def _run_in_worker(model, pk):
+    from django.db import connection
+
+    try:
+        process_image_variants(model, pk)
+    finally:
+        connection.close()
+
+
+def _enqueue(model, pk):
+    if not cache.add(_lock_key(model, pk), True, SCHEDULE_LOCK_TIMEOUT):
+        return
+    if getattr(settings, 'IMAGE_VARIANT_WORKERS', 2) <= 0:
+        process_image_variants(model, pk)
+    else:
+        _get_executor().submit(_run_in_worker, model, pk)
+
+
+def schedule_image_variants(instance):
+    """
+    Ставит создание вариантов в фоновый пул после коммита
+    (IMAGE_VARIANT_WORKERS=0 - сразу в текущем потоке). Повторные вызовы
+    для одного изображения, пока задача в очереди, игнорируются.
+    """
+    if not _image(instance) or variants_are_current(instance):
+        return
+    model, pk = type(instance), instance.pk
+    transaction.on_commit(lambda: _enqueue(model, pk))
+
+
+def absolute_url(request, url):
+    """
+    build_absolute_uri для URL файлов: схема и хост вычисляются один раз на запрос,
+    дальше - конкатенация строк (в списке рейсов сотни URL изображений).
+    """
+    if not request or not url or '://' in url:
+        return url
+    if not url.startswith('/'):
+        return request.build_absolute_uri(url)
+    base_url = getattr(request, '_absolute_base_url', None)
+    if base_url is None:
+        base_url = request.build_absolute_uri('/')[:-1]
+        request._absolute_base_url = base_url
+    return base_url + url
+
+
+def first_image(boat):
+    """
+    Первое фото судна. При prefetch_related('images') берется из кэша без запроса
+    (срез уже загруженного QuerySet), иначе - один запрос с LIMIT 1.
+    """
+    return next(iter(boat.images.all()[:1]), None)
+
+
+def image_variant_url(instance, name, request=None):
+    """
+    URL готового варианта изображения. Если вариант еще не создан -
+    ставит создание в очередь и возвращает URL оригинала.
+    """
+    image = _image(instance)
+    if not image:
+        return None
+    if variants_are_current(instance) and name in _variants(instance):
+        url = _variants(instance)[name]
+    else:
+        schedule_image_variants(instance)
+        url = image.url
+    return absolute_url(request, url)
+
+
+def image_srcset(instance, request=None):
+    """
+    Адаптивные варианты для srcset: [{url, width, type}], сначала AVIF, затем WebP.
+    Пустой список, если варианты еще не созданы (клиент использует обычный URL).
+    """
+    if not _image(instance):
+        return []
+    if not variants_are_current(instance):
+        schedule_image_variants(instance)
+        return []
+    return [
+        {**item, 'url': absolute_url(request, item['url'])}
+        for item in _variants(instance).get('srcset', [])
+    ]
@@ -0,0 +1,74 @@
+"""
+Скидки гидов и кешбэки гостиниц от владельцев судов в рамках одного запроса.
+
+Все активные GuideBoatDiscount / HotelBoatCashback пользователя загружаются
+одним запросом при первом обращении и хранятся на объекте request, дальше
+сериализаторы берут процент по владельцу судна из словаря. Поиск рейсов для
+гида стоит столько же запросов, сколько для анонимного пользователя.
+"""
+from decimal import Decimal
+
+from apps.accounts.models import User
+from ..models import GuideBoatDiscount, HotelBoatCashback
+
+
+class PartnerRates:
+    """Скидки и кешбэки пользователя: {boat_owner_id: процент}"""
+
+    def __init__(self, user=None):
+        self.user = user
+        self._guide_discounts = None
+        self._hotel_cashbacks = None
+
+    @property
+    def is_verified_guide(self):
+        user = self.user
+        return bool(user and user.is_authenticated and user.role == User.Role.GUIDE and user.is_verified)
+
+    @property
+    def is_hotel(self):
+        user = self.user
+        return bool(user and user.is_authenticated and user.role == User.Role.HOTEL)
+
+    def guide_discount_percent(self, boat_owner_id):
+        """Скидка верифицированного гида от владельца судна или None"""
+        if not self.is_verified_guide:
+            return None
+        if self._guide_discounts is None:
+            self._guide_discounts = dict(
+                GuideBoatDiscount.objects.filter(guide=self.user, is_active=True).values_list(
+                    'boat_owner_id', 'discount_percent'
+                )
+            )
+        return self._guide_discounts.get(boat_owner_id)
+
+    def hotel_cashback_percent(self, boat_owner_id):
+        """Кешбэк гостиницы от владельца судна или None"""
+        if not self.is_hotel:
+            return None
+        if self._hotel_cashbacks is None:
+            self._hotel_cashbacks = dict(
+                HotelBoatCashback.objects.filter(hotel=self.user, is_active=True).values_list(
+                    'boat_owner_id', 'cashback_percent'
+                )
+            )
+        return self._hotel_cashbacks.get(boat_owner_id)
+
+    def guide_price(self, base_price, boat_owner_id):
+        """Цена за человека со скидкой гида (без скидки - базовая цена как есть)"""
+        discount_percent = self.guide_discount_percent(boat_owner_id)
+        if discount_percent is None:
+            return base_price
+        discounted_price = Decimal(str(base_price)) * (1 - discount_percent / 100)
+        return discounted_price.quantize(Decimal('0.01'))
+
+
+def get_partner_rates(request):
+    """PartnerRates текущего пользователя, один на запрос"""
+    if request is None:
+        return PartnerRates()
+    rates = getattr(request, '_partner_rates', None)
+    if rates is None:
+        rates = PartnerRates(getattr(request, 'user', None))
+        request._partner_rates = rates
+    return rates
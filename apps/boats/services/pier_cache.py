@@ -0,0 +1,41 @@
+"""
+Кеш страницы «Причал» (DockViewSet.list).
+
+Отрисованный ответ хранится целиком под ключом с версией. Изменение причала,
+судна, фото судна или имени владельца меняет версию после коммита транзакции,
+и старые ответы больше не читаются. DOCK_PIER_CACHE_TIMEOUT ограничивает срок
+жизни ответа, если кеш локальный для процесса (LocMemCache) и не видит сброс
+версии из других процессов.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+CACHE_PREFIX = 'dock_pier_'
+VERSION_KEY = f'{CACHE_PREFIX}version'
+
+
+def _version():
+    return cache.get_or_set(VERSION_KEY, time.time_ns(), None)
+
+
+def _cache_key(request):
+    # Адрес целиком: хост (абсолютные URL фото в ответе), страница и параметры запроса
+    digest = hashlib.md5(request.build_absolute_uri().encode('utf-8')).hexdigest()
+    return f'{CACHE_PREFIX}{_version()}_{digest}'
+
+
+def get_cached_pier(request):
+    return cache.get(_cache_key(request))
+
+
+def cache_pier(request, data):
+    cache.set(_cache_key(request), data, getattr(settings, 'DOCK_PIER_CACHE_TIMEOUT', 300))
+
+
+def invalidate_pier_cache():
+    """Сбрасывает кеш после коммита (иначе параллельный запрос успеет закешировать старые данные)"""
+    transaction.on_commit(lambda: cache.set(VERSION_KEY, time.time_ns(), None))
@@ -0,0 +1,93 @@
+"""
+Создание рейсов (BoatAvailability) по шаблону регулярного расписания.
+
+Вместо сотен POST /boats/{id}/availability/ за сезон все рейсы шаблона создаются
+за один вызов: заблокированные даты и уже существующие рейсы загружаются двумя
+запросами, новые рейсы сохраняются bulk_create пачками.
+"""
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from ..models import BlockedDate, BoatAvailability
+
+BATCH_SIZE = 500
+
+
+def parse_departure_time(value):
+    """'10:00' (формат хранения в шаблоне) -> time"""
+    return time.fromisoformat(value)
+
+
+def ends_after_midnight(value, duration_hours):
+    """Рейс, отправляющийся в value ('HH:MM'), возвращается в полночь или на следующий день"""
+    departure_time = parse_departure_time(value)
+    return departure_time.hour * 60 + departure_time.minute + duration_hours * 60 >= 24 * 60
+
+
+def _blocked_days(boat, date_from, date_to):
+    days = set()
+    blocked = BlockedDate.objects.filter(
+        boat=boat, is_active=True, date_from__lte=date_to, date_to__gte=date_from
+    ).values_list('date_from', 'date_to')
+    for blocked_from, blocked_to in blocked:
+        day = max(blocked_from, date_from)
+        while day <= min(blocked_to, date_to):
+            days.add(day)
+            day += timedelta(days=1)
+    return days
+
+
+def generate_availabilities(template, batch_size=BATCH_SIZE):
+    """
+    Создает рейсы шаблона на все подходящие даты периода (прошедшие даты пропускаются).
+
+    Дата пропускается целиком, если попадает в активную блокировку (BlockedDate);
+    рейс пропускается, если у судна уже есть рейс в эту дату и время (в т.ч. неактивный -
+    отключенные капитаном рейсы не восстанавливаем).
+
+    Returns:
+        dict: created, skipped_blocked, skipped_existing
+    """
+    boat = template.boat
+    date_from = max(template.date_from, timezone.localdate())
+    date_to = template.date_to
+    result = {'created': 0, 'skipped_blocked': 0, 'skipped_existing': 0}
+    if date_from > date_to:
+        return result
+
+    weekdays = set(template.weekdays)
+    departure_times = sorted(parse_departure_time(value) for value in template.departure_times)
+    duration = timedelta(hours=template.duration_hours)
+
+    blocked_days = _blocked_days(boat, date_from, date_to)
+    existing = set(
+        BoatAvailability.objects.filter(
+            boat=boat, departure_date__gte=date_from, departure_date__lte=date_to
+        ).values_list('departure_date', 'departure_time')
+    )
+
+    slots = []
+    day = date_from
+    while day <= date_to:
+        if day.weekday() in weekdays:
+            for departure_time in departure_times:
+                if day in blocked_days:
+                    result['skipped_blocked'] += 1
+                elif (day, departure_time) in existing:
+                    result['skipped_existing'] += 1
+                else:
+                    slots.append(BoatAvailability(
+                        boat=boat,
+                        departure_date=day,
+                        departure_time=departure_time,
+                        return_time=(datetime.combine(day, departure_time) + duration).time(),
+                        capacity_limit=template.capacity_limit,
+                        trip_type=template.trip_type,
+                    ))
+        day += timedelta(days=1)
+
+    # bulk_create сам делит на пачки по batch_size и выполняет их в одной транзакции
+    BoatAvailability.objects.bulk_create(slots, batch_size=batch_size)
+    result['created'] = len(slots)
+    return result
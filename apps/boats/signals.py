@@ -0,0 +1,34 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.accounts.models import User
+from .models import Boat, BoatImage, Dock
+from .services.image_variants import schedule_image_variants
+from .services.pier_cache import invalidate_pier_cache
+
+
+@receiver(post_save, sender=BoatImage)
+def create_boat_image_variants(sender, instance, **kwargs):
+    """Создание thumbnail всех размеров в фоне после загрузки фото"""
+    schedule_image_variants(instance)
+
+
+@receiver(post_save, sender=Dock)
+@receiver(post_delete, sender=Dock)
+@receiver(post_save, sender=Boat)
+@receiver(post_delete, sender=Boat)
+@receiver(post_save, sender=BoatImage)
+@receiver(post_delete, sender=BoatImage)
+def reset_pier_cache(sender, **kwargs):
+    """Сброс кеша страницы «Причал» при изменении причалов, судов и фото"""
+    invalidate_pier_cache()
+
+
+@receiver(post_save, sender=User)
+def reset_pier_cache_on_owner_name(sender, instance, update_fields=None, **kwargs):
+    """На странице «Причал» выводится имя владельца судна"""
+    if instance.role != User.Role.BOAT_OWNER:
+        return
+    if update_fields is not None and not {'first_name', 'last_name'}.intersection(update_fields):
+        return
+    invalidate_pier_cache()
@@ -4,7 +4,7 @@
 import pytest
 from django.urls import reverse
 from rest_framework import status
-from apps.boats.models import Boat, BoatFeature, BoatPricing, BoatAvailability
+from apps.boats.models import Boat, BoatPricing, BoatAvailability
 
 
 @pytest.mark.django_db
@@ -31,6 +31,56 @@ class TestBoatList:
         assert response.status_code == status.HTTP_200_OK
 
 
+@pytest.mark.django_db
+class TestBoatListPrices:
+    """Минимальная цена в списке судов считается в БД"""
+
+    def _boat(self, owner, name, prices):
+        from decimal import Decimal
+        boat = Boat.objects.create(name=name, owner=owner, capacity=10, is_active=True)
+        for duration, price in prices.items():
+            BoatPricing.objects.create(boat=boat, duration_hours=duration, price_per_person=Decimal(price))
+        return boat
+
+    def test_sort_and_filter_by_min_price(self, api_client, boat_owner_user):
+        from datetime import date, timedelta
+        from decimal import Decimal
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from apps.boats.models import SeasonalPricing
+
+        cheap = self._boat(boat_owner_user, 'Дешевый', {2: '3000', 3: '4500'})
+        self._boat(boat_owner_user, 'Дорогой', {2: '7000'})
+        self._boat(boat_owner_user, 'Средний', {3: '5000'})
+        SeasonalPricing.objects.create(
+            boat=cheap, duration_hours=2, price_per_person=Decimal('3500'),
+            date_from=date.today() - timedelta(days=1), date_to=date.today() + timedelta(days=1)
+        )
+
+        url = reverse('boats:boat-list')
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get(url, {'ordering': 'min_price'})
+        assert response.status_code == status.HTTP_200_OK
+        results = response.data['results']
+        assert [boat['min_price'] for boat in results] == [3000.0, 5000.0, 7000.0]
+        assert results[0]['season_min_price'] == 3500.0
+        assert results[1]['season_min_price'] is None
+        # Цены не загружаются в Python (prefetch pricing) - только подзапрос в выборке судов
+        assert not any('"boats_boatpricing"."boat_id" IN' in q['sql'] for q in queries.captured_queries)
+
+        response = api_client.get(url, {'min_price': '4000', 'max_price': '6000'})
+        assert [boat['name'] for boat in response.data['results']] == ['Средний']
+
+    def test_non_finite_price_filter_ignored(self, api_client, boat_owner_user):
+        """NaN, Infinity и мусор в фильтре цены игнорируются, а не приводят к 500"""
+        self._boat(boat_owner_user, 'Дешевый', {2: '3000'})
+        url = reverse('boats:boat-list')
+        for value in ('NaN', 'sNaN', 'Infinity', '-inf', 'abc'):
+            response = api_client.get(url, {'min_price': value, 'max_price': value})
+            assert response.status_code == status.HTTP_200_OK
+            assert [boat['name'] for boat in response.data['results']] == ['Дешевый']
+
+
 @pytest.mark.django_db
 class TestBoatDetail:
     """Тесты деталей судна"""
@@ -133,3 +183,242 @@ class TestBoatAvailability:
         assert response.status_code == status.HTTP_201_CREATED
         assert BoatAvailability.objects.filter(boat=boat).exists()
 
+
+
+@pytest.mark.django_db
+class TestScheduleTemplates:
+    """Тесты шаблонов регулярного расписания"""
+
+    def test_generate_season(self, boat_owner_client, boat, django_assert_max_num_queries):
+        """Сезон создается одним запросом, блокировки и существующие рейсы пропускаются"""
+        from datetime import date, time, timedelta
+        from apps.boats.models import BlockedDate
+
+        start = date.today() + timedelta(days=1)
+        BoatAvailability.objects.create(
+            boat=boat, departure_date=start, departure_time=time(10, 0), return_time=time(12, 0)
+        )
+        BlockedDate.objects.create(boat=boat, date_from=start + timedelta(days=1), date_to=start + timedelta(days=2))
+
+        url = reverse('boats:boat-schedule-templates', kwargs={'pk': boat.id})
+        response = boat_owner_client.post(url, {
+            'weekdays': [6, 0, 1, 2, 3, 4, 5, 0],
+            'departure_times': ['14:00', '10:00'],
+            'duration_hours': 2,
+            'trip_type': 'group',
+            'capacity_limit': 6,
+            'date_from': start.isoformat(),
+            'date_to': (start + timedelta(days=179)).isoformat(),
+        }, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['weekdays'] == [0, 1, 2, 3, 4, 5, 6]
+        assert response.data['departure_times'] == ['10:00', '14:00']
+
+        url = reverse('boats:boat-generate-schedule', kwargs={'pk': boat.id, 'template_id': response.data['id']})
+        with django_assert_max_num_queries(8):
+            response = boat_owner_client.post(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {'created': 355, 'skipped_blocked': 4, 'skipped_existing': 1, 'skipped': 5}
+
+        slot = BoatAvailability.objects.get(boat=boat, departure_date=start, departure_time=time(14, 0))
+        assert slot.return_time == time(16, 0)
+        assert slot.capacity_limit == 6
+
+        # Повторный вызов ничего не дублирует
+        response = boat_owner_client.post(url)
+        assert response.data['created'] == 0
+        assert response.data['skipped_existing'] == 356
+        assert BoatAvailability.objects.filter(boat=boat).count() == 356
+
+    def test_weekdays_and_validation(self, boat_owner_client, boat):
+        """Только выбранные дни недели; период не может идти назад"""
+        from datetime import date, timedelta
+
+        url = reverse('boats:boat-schedule-templates', kwargs={'pk': boat.id})
+        start = date.today() + timedelta(days=1)
+        response = boat_owner_client.post(url, {
+            'weekdays': [5, 6],
+            'departure_times': ['12:00'],
+            'date_from': start.isoformat(),
+            'date_to': (start - timedelta(days=1)).isoformat(),
+        }, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'date_to' in response.data
+
+        response = boat_owner_client.post(url, {
+            'weekdays': [5, 6],
+            'departure_times': ['12:00'],
+            'date_from': start.isoformat(),
+            'date_to': (start + timedelta(days=27)).isoformat(),
+        }, format='json')
+        url = reverse('boats:boat-generate-schedule', kwargs={'pk': boat.id, 'template_id': response.data['id']})
+        assert boat_owner_client.post(url).data['created'] == 8
+        assert {slot.departure_date.weekday() for slot in BoatAvailability.objects.filter(boat=boat)} == {5, 6}
+
+    def test_trip_past_midnight_rejected(self, boat_owner_client, boat):
+        """Рейс, возвращающийся после полуночи, не проходит валидацию (в т.ч. при частичном обновлении)"""
+        from datetime import date, timedelta
+
+        url = reverse('boats:boat-schedule-templates', kwargs={'pk': boat.id})
+        start = date.today() + timedelta(days=1)
+        data = {
+            'weekdays': [0],
+            'departure_times': ['10:00', '22:00'],
+            'duration_hours': 4,
+            'date_from': start.isoformat(),
+            'date_to': (start + timedelta(days=6)).isoformat(),
+        }
+        response = boat_owner_client.post(url, data, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert '22:00' in str(response.data['departure_times'])
+
+        data['departure_times'] = ['10:00', '19:00']
+        response = boat_owner_client.post(url, data, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+
+        url = reverse('boats:boat-schedule-template-detail', kwargs={'pk': boat.id, 'template_id': response.data['id']})
+        response = boat_owner_client.patch(url, {'duration_hours': 4}, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        response = boat_owner_client.patch(url, {'duration_hours': 5}, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_other_user_forbidden(self, customer_client, boat):
+        url = reverse('boats:boat-schedule-templates', kwargs={'pk': boat.id})
+        response = customer_client.get(url)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+
+@pytest.mark.django_db
+class TestImageVariants:
+    """Тесты фонового создания thumbnail"""
+
+    def _upload(self, boat, color='red'):
+        from io import BytesIO
+        from PIL import Image
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from apps.boats.models import BoatImage
+
+        buffer = BytesIO()
+        Image.new('RGB', (1200, 900), color).save(buffer, 'JPEG')
+        return BoatImage.objects.create(
+            boat=boat, image=SimpleUploadedFile('photo.jpg', buffer.getvalue(), 'image/jpeg')
+        )
+
+    def test_variants_created_on_upload(self, boat, settings, tmp_path, django_capture_on_commit_callbacks):
+        """После загрузки все размеры создаются и читаются сериализатором без PIL"""
+        from unittest import mock
+        from apps.boats.serializers import BoatImageSerializer, BoatShortSerializer
+        from apps.boats.services.image_variants import BOAT_IMAGE_VARIANTS
+
+        settings.MEDIA_ROOT = tmp_path
+        settings.IMAGE_VARIANT_WORKERS = 0
+        with django_capture_on_commit_callbacks(execute=True):
+            image = self._upload(boat)
+
+        image.refresh_from_db()
+        assert image.image_variants['source'] == image.image.name
+        assert set(BOAT_IMAGE_VARIANTS) <= set(image.image_variants)
+
+        with mock.patch('apps.boats.services.image_variants.get_thumbnail', side_effect=AssertionError):
+            data = BoatImageSerializer(image, context={'is_detail_page': True}).data
+            short = BoatShortSerializer(boat).data
+        assert data['thumbnail_url'] == image.image_variants['800x450']
+        assert data['thumbnail_2x_url'] == image.image_variants['800x450@2x']
+        assert short['first_image'] == image.image_variants['400']
+        assert short['images'][0]['url_2x'] == image.image_variants['400@2x']
+
+    def test_original_served_until_generated(self, boat, settings, tmp_path, django_capture_on_commit_callbacks):
+        """Пока варианты не созданы, отдается оригинал; при замене файла варианты пересоздаются"""
+        from apps.boats.serializers import BoatImageSerializer
+
+        settings.MEDIA_ROOT = tmp_path
+        settings.IMAGE_VARIANT_WORKERS = 0
+        image = self._upload(boat)
+
+        assert image.image_variants == {}
+        assert BoatImageSerializer(image).data['thumbnail_url'] == image.image.url
+
+        with django_capture_on_commit_callbacks(execute=True):
+            replaced = self._upload(boat, color='blue')
+            image.image = replaced.image
+            image.save()
+        image.refresh_from_db()
+        assert image.image_variants['source'] == replaced.image.name
+
+    def test_srcset_modern_formats(self, boat, settings, tmp_path, django_capture_on_commit_callbacks):
+        """WebP/AVIF-варианты нескольких ширин без увеличения сверх оригинала"""
+        from PIL import Image
+        from apps.boats.serializers import BoatImageSerializer
+        from apps.boats.services.image_variants import srcset_formats
+
+        settings.MEDIA_ROOT = tmp_path
+        settings.IMAGE_VARIANT_WORKERS = 0
+        assert BoatImageSerializer(self._upload(boat)).data['srcset'] == []
+
+        with django_capture_on_commit_callbacks(execute=True):
+            image = self._upload(boat)
+        image.refresh_from_db()
+
+        srcset = BoatImageSerializer(image).data['srcset']
+        types = [mime for _, _, mime, _ in srcset_formats()]
+        assert 'image/webp' in types
+        assert [item['type'] for item in srcset] == [mime for mime in types for _ in range(4)]
+        assert [item['width'] for item in srcset[:4]] == [320, 640, 960, 1200]
+
+        path = tmp_path / srcset[0]['url'].replace(settings.MEDIA_URL, '', 1).lstrip('/')
+        with Image.open(path) as variant:
+            assert variant.size == (320, 240)
+            assert variant.get_format_mimetype() == srcset[0]['type']
+
+
+
+@pytest.mark.django_db
+class TestDockPier:
+    """Тесты страницы «Причал»"""
+
+    def _docks(self, boat_owner_user):
+        from apps.boats.models import BoatImage, Dock
+
+        for dock_number in range(3):
+            dock = Dock.objects.create(name=f'Причал {dock_number}')
+            for boat_number in range(2):
+                boat = Boat.objects.create(
+                    name=f'Катер {dock_number}-{boat_number}', boat_type=Boat.BoatType.BOAT,
+                    owner=boat_owner_user, capacity=8, dock=dock
+                )
+                BoatImage.objects.create(boat=boat, image=f'boats/{boat.pk}.jpg')
+            Boat.objects.create(
+                name=f'Скрытый {dock_number}', boat_type=Boat.BoatType.BOAT,
+                owner=boat_owner_user, capacity=8, dock=dock, is_active=False
+            )
+
+    def test_pier_queries_do_not_grow(self, api_client, boat_owner_user, django_assert_num_queries):
+        """Причалы, суда, владельцы и фото - фиксированное число запросов, неактивные суда скрыты"""
+        self._docks(boat_owner_user)
+        url = reverse('boats:dock-list')
+        # count + причалы + суда с владельцами + фото
+        with django_assert_num_queries(4):
+            response = api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        docks = response.data['results']
+        assert len(docks) == 3
+        assert [len(dock['boats']) for dock in docks] == [2, 2, 2]
+        assert docks[0]['boats'][0]['first_image'].endswith('.jpg')
+
+    def test_pier_cached_until_change(self, api_client, boat_owner_user, django_assert_num_queries,
+                                      django_capture_on_commit_callbacks):
+        """Повторный запрос без обращений к БД, изменение судна сбрасывает кеш"""
+        self._docks(boat_owner_user)
+        url = reverse('boats:dock-list')
+        api_client.get(url)
+        with django_assert_num_queries(0):
+            cached = api_client.get(url)
+        assert {boat['name'] for boat in cached.data['results'][0]['boats']} == {'Катер 0-0', 'Катер 0-1'}
+
+        with django_capture_on_commit_callbacks(execute=True):
+            boat = Boat.objects.get(name='Катер 0-0')
+            boat.name = 'Переименован'
+            boat.save()
+        response = api_client.get(url)
+        assert {boat['name'] for boat in response.data['results'][0]['boats']} == {'Переименован', 'Катер 0-1'}
@@ -2,33 +2,39 @@ from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAuthenticatedOrReadOnly
-from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Count, Min
+from django.db.models import Q, Count, Min, Prefetch
 from django.utils import timezone
 from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
 
-from .models import Dock, Boat, BoatImage, Feature, BoatPricing, BoatAvailability, SailingZone, BlockedDate, SeasonalPricing, CharterPricing
+from .models import Dock, Boat, BoatImage, Feature, BoatPricing, BoatAvailability, SailingZone, BlockedDate, SeasonalPricing, CharterPricing, ScheduleTemplate
 from .serializers import (
     DockSerializer, DockPierSerializer, BoatListSerializer, BoatDetailSerializer, BoatCreateUpdateSerializer,
     BoatImageSerializer, FeatureSerializer, BoatPricingSerializer,
     BoatAvailabilitySerializer, SailingZoneSerializer, BlockedDateSerializer, SeasonalPricingSerializer,
-    CharterPricingSerializer
+    CharterPricingSerializer, ScheduleTemplateSerializer
 )
+from .services.schedule_templates import generate_availabilities
+from .services.pier_cache import cache_pier, get_cached_pier
 from apps.accounts.models import User
+from apps.search.filters import FullTextSearchFilter
+from apps.search.models import SearchDocument
 
 
 class BoatViewSet(viewsets.ModelViewSet):
     """
     ViewSet для управления судами
     """
-    queryset = Boat.objects.filter(is_active=True).select_related('owner').prefetch_related(
+    queryset = Boat.objects.filter(is_active=True).select_related('owner', 'dock').prefetch_related(
         'images', 'features', 'pricing', 'sailing_zones'
     )
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['boat_type', 'capacity']
     search_fields = ['name', 'description']
-    ordering_fields = ['created_at', 'name']
+    search_kind = SearchDocument.Kind.BOAT
+    ordering_fields = ['created_at', 'name', 'min_price']
     ordering = ['-created_at']
     
     def get_serializer_class(self):
@@ -70,6 +76,24 @@ class BoatViewSet(viewsets.ModelViewSet):
         if max_capacity:
             queryset = queryset.filter(capacity__lte=max_capacity)
         
+        # Минимальная цена - подзапросом в БД (для сортировки ?ordering=min_price и фильтра по цене)
+        if self.action == 'list':
+            queryset = queryset.prefetch_related(None).prefetch_related('images', 'features').with_min_price()
+            for param, lookup in (('min_price', 'min_price__gte'), ('max_price', 'min_price__lte')):
+                value = self.request.query_params.get(param)
+                if value:
+                    try:
+                        price = Decimal(value)
+                    except (InvalidOperation, ValueError):
+                        continue
+                    # NaN и Infinity Decimal разбирает, но в запрос к БД их передать нельзя
+                    if price.is_finite():
+                        queryset = queryset.filter(**{lookup: price})
+        
+        # Шаблоны расписания: нужно только само судно, без фото, особенностей и цен
+        if self.action in ('schedule_templates', 'schedule_template_detail', 'generate_schedule'):
+            queryset = queryset.prefetch_related(None)
+        
         # Фильтрация по доступности на дату
         available_date = self.request.query_params.get('available_date')
         if available_date:
@@ -391,9 +415,9 @@ class BoatViewSet(viewsets.ModelViewSet):
             )
         
         # Получаем все суда владельца (включая неактивные)
-        boats = Boat.objects.filter(owner=request.user).select_related('owner').prefetch_related(
-            'images', 'features', 'pricing'
-        ).order_by('-created_at')
+        boats = Boat.objects.filter(owner=request.user).select_related('owner', 'dock').prefetch_related(
+            'images', 'features'
+        ).with_min_price().order_by('-created_at')
         
         serializer = BoatListSerializer(boats, many=True, context={'request': request})
         return Response(serializer.data)
@@ -434,6 +458,68 @@ class BoatViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
     
+    @action(detail=True, methods=['get', 'post'], permission_classes=[IsAuthenticated], url_path='schedule-templates')
+    def schedule_templates(self, request, pk=None):
+        """Шаблоны регулярного расписания судна"""
+        boat = self.get_object()
+        if boat.owner != request.user:
+            raise PermissionDenied("Вы можете управлять расписанием только своих судов")
+
+        if request.method == 'GET':
+            templates = boat.schedule_templates.all()
+            serializer = ScheduleTemplateSerializer(templates, many=True)
+            return Response(serializer.data)
+
+        elif request.method == 'POST':
+            serializer = ScheduleTemplateSerializer(data=request.data)
+            if serializer.is_valid():
+                serializer.save(boat=boat)
+                return Response(serializer.data, status=status.HTTP_201_CREATED)
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['put', 'patch', 'delete'], permission_classes=[IsAuthenticated], url_path='schedule-templates/(?P<template_id>[^/.]+)')
+    def schedule_template_detail(self, request, pk=None, template_id=None):
+        """Изменение и удаление шаблона расписания (созданные рейсы не затрагиваются)"""
+        template = self._get_schedule_template(request, template_id)
+
+        if request.method == 'DELETE':
+            template.delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        serializer = ScheduleTemplateSerializer(template, data=request.data, partial=request.method == 'PATCH')
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated], url_path='schedule-templates/(?P<template_id>[^/.]+)/generate')
+    def generate_schedule(self, request, pk=None, template_id=None):
+        """
+        Создание рейсов по шаблону на весь период одним запросом.
+        Заблокированные даты и уже существующие рейсы пропускаются, повторный вызов безопасен.
+        """
+        template = self._get_schedule_template(request, template_id)
+        if not template.is_active:
+            return Response(
+                {'error': 'Шаблон расписания отключен'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        result = generate_availabilities(template)
+        return Response({
+            **result,
+            'skipped': result['skipped_blocked'] + result['skipped_existing'],
+        })
+
+    def _get_schedule_template(self, request, template_id):
+        boat = self.get_object()
+        if boat.owner != request.user:
+            raise PermissionDenied("Вы можете управлять расписанием только своих судов")
+        try:
+            return boat.schedule_templates.get(id=template_id)
+        except (ScheduleTemplate.DoesNotExist, ValueError):
+            raise NotFound('Шаблон расписания не найден')
+
     @action(detail=True, methods=['get', 'post'], permission_classes=[IsAuthenticated], url_path='seasonal-pricing')
     def seasonal_pricing(self, request, pk=None):
         """Управление сезонными ценами"""
@@ -619,3 +705,19 @@ class DockViewSet(viewsets.ReadOnlyModelViewSet):
         if self.action == 'list':
             return DockPierSerializer
         return DockSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            # Суда всех причалов страницы с владельцами и фото - по одному запросу на связь
+            active_boats = Boat.objects.filter(is_active=True).select_related('owner').prefetch_related('images')
+            queryset = queryset.prefetch_related(Prefetch('boats', queryset=active_boats, to_attr='active_boats'))
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        """Страница «Причал» кешируется целиком, кеш сбрасывается сигналами (services/pier_cache.py)"""
+        data = get_cached_pier(request)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            cache_pier(request, data)
+        return Response(data)
@@ -1,7 +1,11 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.http import HttpResponseRedirect, StreamingHttpResponse
 from django.utils import timezone
 from django.utils.html import format_html
-from .models import Booking, PromoCode
+from apps.boats.models import BoatAvailability
+from .models import ArchivedBooking, Booking, PromoCode
+from .services.transitions import transition, can_transition, BookingTransitionError
 
 
 @admin.register(PromoCode)
@@ -30,8 +34,66 @@ class PromoCodeAdmin(admin.ModelAdmin):
     discount_value_display.short_description = 'Скидка'
 
 
+class BookingAdminForm(forms.ModelForm):
+    """
+    Форма бронирования в админке: активная бронь должна быть привязана к рейсу,
+    иначе ее места не учитываются при проверке свободных мест.
+    Если рейс не выбран, он подбирается по судну и времени начала и окончания.
+    """
+
+    class Meta:
+        model = Booking
+        fields = '__all__'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        boat = cleaned_data.get('boat')
+        availability = cleaned_data.get('availability')
+        start_datetime = cleaned_data.get('start_datetime')
+        end_datetime = cleaned_data.get('end_datetime')
+
+        to_status = cleaned_data.get('status')
+        if self.instance.pk and self.changed_data == ['status'] and to_status:
+            # Смена только статуса выполняется переходом (BookingAdmin.save_model)
+            from_status = self.initial['status']
+            if not can_transition(from_status, to_status):
+                self.add_error('status', (
+                    f'Недопустимый переход статуса: {Booking.Status(from_status).label} -> '
+                    f'{Booking.Status(to_status).label}'
+                ))
+                return cleaned_data
+
+        if availability and boat and availability.boat_id != boat.pk:
+            self.add_error('availability', 'Рейс относится к другому судну')
+            return cleaned_data
+
+        active = cleaned_data.get('status') in (
+            Booking.Status.RESERVED, Booking.Status.PENDING, Booking.Status.CONFIRMED
+        )
+        if availability or not active or not (boat and start_datetime and end_datetime):
+            return cleaned_data
+
+        start = timezone.localtime(start_datetime)
+        end = timezone.localtime(end_datetime)
+        availability = BoatAvailability.objects.filter(
+            boat=boat,
+            departure_date=start.date(),
+            departure_time=start.time(),
+            return_time=end.time(),
+        ).order_by('-is_active', 'id').first()
+        if availability is None:
+            self.add_error(
+                'availability',
+                'Укажите рейс: в расписании судна нет рейса на это время'
+            )
+        else:
+            cleaned_data['availability'] = availability
+        return cleaned_data
+
+
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
+    form = BookingAdminForm
     list_display = (
         'guest_name',
         'guest_phone',
@@ -53,9 +115,10 @@ class BookingAdmin(admin.ModelAdmin):
     )
     list_filter = ('status', 'trip_type', 'payment_method', 'boat', 'guide', 'created_at', 'start_datetime', 'telegram_notification_sent')
     search_fields = ('guest_name', 'guest_phone', 'customer__email', 'guide__email', 'boat__name', 'event_type')
-    readonly_fields = ('original_price', 'discount_amount', 'remaining_amount', 'telegram_notification_sent', 'google_calendar_event_id', 'created_at', 'updated_at')
+    readonly_fields = ('original_price', 'discount_amount', 'remaining_amount', 'telegram_notification_sent', 'google_calendar_event_id', 'hold_expires_at', 'created_at', 'updated_at')
+    raw_id_fields = ('availability',)
     date_hierarchy = 'start_datetime'
-    actions = ['delete_unpaid_reserved_bookings']
+    actions = ['delete_unpaid_reserved_bookings', 'mark_completed', 'mark_cancelled', 'export_csv', 'export_xlsx']
     
     def days_old(self, obj):
         """Показывает сколько дней прошло с момента создания"""
@@ -82,9 +145,82 @@ class BookingAdmin(admin.ModelAdmin):
             f'Удалено {count} неоплаченных бронирований (RESERVED)'
         )
     delete_unpaid_reserved_bookings.short_description = "Удалить выбранные неоплаченные бронирования (RESERVED)"
+    
+    def _transition_selected(self, request, queryset, to_status):
+        """Переводит выбранные бронирования в to_status по таблице переходов"""
+        changed = 0
+        skipped = 0
+        for booking in queryset.only('id', 'status', 'notes', 'google_calendar_event_id'):
+            if not can_transition(booking.status, to_status):
+                skipped += 1
+                continue
+            try:
+                transition(booking, to_status)
+                changed += 1
+            except BookingTransitionError:
+                skipped += 1
+        self.message_user(request, f'Изменен статус: {changed}, пропущено: {skipped}')
+    
+    def mark_completed(self, request, queryset):
+        """Отметить выбранные подтвержденные бронирования как завершенные"""
+        self._transition_selected(request, queryset, Booking.Status.COMPLETED)
+    mark_completed.short_description = "Отметить как завершенные"
+    
+    def mark_cancelled(self, request, queryset):
+        """Отменить выбранные бронирования"""
+        self._transition_selected(request, queryset, Booking.Status.CANCELLED)
+    mark_cancelled.short_description = "Отменить выбранные бронирования"
+    
+    def _export_selected(self, queryset, file_format):
+        """Потоковая выгрузка выбранных бронирований"""
+        from apps.accounts.services import exports
+        stream, content_type = exports.FORMATS[file_format]
+        rows = exports.booking_rows(queryset=queryset.order_by())
+        response = StreamingHttpResponse(stream(exports.BOOKING_HEADER, rows), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="bookings.{file_format}"'
+        return response
+    
+    def export_csv(self, request, queryset):
+        """Выгрузить выбранные бронирования в CSV"""
+        return self._export_selected(queryset, 'csv')
+    export_csv.short_description = "Выгрузить в CSV"
+    
+    def export_xlsx(self, request, queryset):
+        """Выгрузить выбранные бронирования в XLSX"""
+        return self._export_selected(queryset, 'xlsx')
+    export_xlsx.short_description = "Выгрузить в XLSX"
+    
+    def save_model(self, request, obj, form, change):
+        """Если в форме изменен только статус - меняем его переходом, без пересчета цен"""
+        if change and form.changed_data == ['status']:
+            to_status = obj.status
+            obj.status = form.initial['status']
+            fields = {}
+            if obj.availability_id != form.initial.get('availability'):
+                # Рейс подобран формой по судну и времени
+                fields['availability'] = obj.availability
+            try:
+                transition(obj, to_status, **fields)
+            except BookingTransitionError as e:
+                # Статус успел измениться параллельно: сообщаем об ошибке вместо "изменено успешно"
+                request._booking_transition_failed = True
+                self.message_user(request, str(e), level=messages.ERROR)
+            return
+        super().save_model(request, obj, form, change)
+
+    def log_change(self, request, obj, message):
+        if getattr(request, '_booking_transition_failed', False):
+            return None
+        return super().log_change(request, obj, message)
+
+    def response_change(self, request, obj):
+        """После неудачного перехода статуса возвращаемся на страницу бронирования без сообщения об успехе"""
+        if getattr(request, '_booking_transition_failed', False):
+            return HttpResponseRedirect(request.path)
+        return super().response_change(request, obj)
     fieldsets = (
         ('Основная информация', {
-            'fields': ('trip_type', 'boat', 'guide', 'customer', 'guest_name', 'guest_phone', 'number_of_people')
+            'fields': ('trip_type', 'boat', 'availability', 'guide', 'customer', 'guest_name', 'guest_phone', 'number_of_people')
         }),
         ('Время и мероприятие', {
             'fields': ('start_datetime', 'end_datetime', 'duration_hours', 'event_type')
@@ -103,7 +239,7 @@ class BookingAdmin(admin.ModelAdmin):
             )
         }),
         ('Статус', {
-            'fields': ('status',)
+            'fields': ('status', 'hold_expires_at')
         }),
         ('Интеграции', {
             'fields': ('telegram_notification_sent', 'google_calendar_event_id'),
@@ -116,3 +252,21 @@ class BookingAdmin(admin.ModelAdmin):
             'fields': ('created_at', 'updated_at')
         }),
     )
+
+
+@admin.register(ArchivedBooking)
+class ArchivedBookingAdmin(admin.ModelAdmin):
+    """Архив бронирований - только просмотр"""
+    list_display = ['id', 'boat', 'start_datetime', 'guest_name', 'number_of_people', 'total_price', 'status', 'archived_at']
+    list_filter = ['status', 'trip_type', 'start_datetime']
+    search_fields = ['id', 'guest_name', 'guest_phone', 'boat__name']
+    date_hierarchy = 'start_datetime'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
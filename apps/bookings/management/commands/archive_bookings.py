@@ -0,0 +1,91 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.bookings.models import ArchivedBooking, Booking
+from apps.payments.models import ArchivedPayment, Payment
+
+logger = logging.getLogger(__name__)
+
+ARCHIVABLE_STATUSES = [
+    Booking.Status.COMPLETED,
+    Booking.Status.CANCELLED,
+]
+
+# Поля, которые переносятся в архив (совпадают по именам в Booking и ArchivedBooking)
+BOOKING_FIELDS = [
+    field.attname for field in ArchivedBooking._meta.concrete_fields if field.name != 'archived_at'
+]
+PAYMENT_FIELDS = [field.attname for field in ArchivedPayment._meta.concrete_fields]
+
+
+class Command(BaseCommand):
+    help = 'Переносит старые завершенные и отмененные бронирования и их платежи в архивные таблицы'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months',
+            type=int,
+            default=getattr(settings, 'BOOKING_ARCHIVE_MONTHS', 12),
+            help='Архивировать брони, закончившиеся раньше чем N месяцев назад'
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='Размер пачки бронирований')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать, ничего не менять')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        cutoff = timezone.now() - timedelta(days=30 * options['months'])
+
+        started = time.monotonic()
+        candidates = Booking.objects.filter(status__in=ARCHIVABLE_STATUSES, end_datetime__lt=cutoff)
+
+        if options['dry_run']:
+            self.stdout.write(
+                f"Найдено броней для архивации: {candidates.count()} "
+                f"(окончание раньше {timezone.localtime(cutoff):%d.%m.%Y}, dry-run, без изменений)"
+            )
+            return
+
+        stats = {'bookings': 0, 'payments': 0, 'batches': 0}
+        last_id = 0
+
+        while True:
+            with transaction.atomic():
+                bookings = list(
+                    candidates.filter(id__gt=last_id)
+                    .order_by('id')
+                    .select_for_update()
+                    .values(*BOOKING_FIELDS)[:batch_size]
+                )
+                if not bookings:
+                    break
+
+                ids = [booking['id'] for booking in bookings]
+                payments = list(Payment.objects.filter(booking_id__in=ids).values(*PAYMENT_FIELDS))
+
+                ArchivedBooking.objects.bulk_create(ArchivedBooking(**booking) for booking in bookings)
+                ArchivedPayment.objects.bulk_create(ArchivedPayment(**payment) for payment in payments)
+
+                Payment.objects.filter(booking_id__in=ids).delete()
+                Booking.objects.filter(id__in=ids).delete()
+
+            last_id = ids[-1]
+            stats['bookings'] += len(bookings)
+            stats['payments'] += len(payments)
+            stats['batches'] += 1
+            self.stdout.write(f"Пачка {stats['batches']}: перенесено броней {len(bookings)}, платежей {len(payments)}")
+
+            if len(bookings) < batch_size:
+                break
+
+        summary = (
+            f"Перенесено в архив броней: {stats['bookings']} (пачек: {stats['batches']}), "
+            f"платежей: {stats['payments']}. Время: {time.monotonic() - started:.2f} с"
+        )
+        logger.info(f"archive_bookings: {summary}")
+        self.stdout.write(self.style.SUCCESS(f'Готово! {summary}'))
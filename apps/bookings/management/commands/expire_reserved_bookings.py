@@ -0,0 +1,114 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.bookings.models import Booking
+from apps.bookings.services.bulk_cancel import cancel_tbank_payments, save_payment_statuses
+from apps.payments.models import Payment
+from apps.payments.services import TBankService
+
+logger = logging.getLogger(__name__)
+
+# Платежи, по которым деньги уже списываются или списаны: такие брони не трогаем,
+# их переведет в PENDING webhook / check_status
+IN_FLIGHT_PAYMENT_STATUSES = [
+    Payment.Status.AUTHORIZING,
+    Payment.Status.AUTHORIZED,
+    Payment.Status.CONFIRMING,
+    Payment.Status.CONFIRMED,
+]
+
+# Платежные сессии без оплаты - отменяем в Т-Банке, чтобы ссылка перестала работать
+CANCELLABLE_PAYMENT_STATUSES = [
+    Payment.Status.NEW,
+    Payment.Status.FORM_SHOWED,
+]
+
+
+class Command(BaseCommand):
+    help = 'Отменяет неоплаченные бронирования (RESERVED) с истекшим удержанием мест и их платежи в Т-Банке'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Размер пачки бронирований')
+        parser.add_argument('--workers', type=int, default=4, help='Параллельных запросов Cancel в Т-Банк')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать, ничего не менять')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        workers = options['workers']
+        dry_run = options['dry_run']
+
+        started = time.monotonic()
+        now = timezone.now()
+
+        stale = Booking.objects.expired_holds(now).exclude(
+            payments__status__in=IN_FLIGHT_PAYMENT_STATUSES
+        )
+
+        if dry_run:
+            self.stdout.write(f"Найдено просроченных броней: {stale.count()} (dry-run, без изменений)")
+            return
+
+        try:
+            tbank_service = TBankService()
+        except ValueError as e:
+            tbank_service = None
+            self.stdout.write(self.style.WARNING(f'⚠️ Т-Банк не настроен, платежи не отменяются: {e}'))
+
+        stats = {'bookings': 0, 'batches': 0, 'payments': 0, 'payments_failed': 0}
+        db_seconds = 0.0
+        tbank_seconds = 0.0
+
+        while True:
+            db_started = time.monotonic()
+            ids = list(stale.order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+
+            with transaction.atomic():
+                # Одним UPDATE; повторная проверка статуса защищает от оплаты между выборкой и обновлением
+                cancelled = Booking.objects.expired_holds(now).filter(id__in=ids).update(
+                    status=Booking.Status.CANCELLED,
+                    hold_expires_at=None,
+                    updated_at=timezone.now(),
+                )
+                payments = list(
+                    Payment.objects.filter(
+                        booking_id__in=ids,
+                        booking__status=Booking.Status.CANCELLED,
+                        status__in=CANCELLABLE_PAYMENT_STATUSES,
+                    ).values_list('id', 'payment_id')
+                )
+            db_seconds += time.monotonic() - db_started
+
+            stats['bookings'] += cancelled
+            stats['batches'] += 1
+
+            if tbank_service and payments:
+                tbank_started = time.monotonic()
+                results = cancel_tbank_payments(tbank_service, payments, workers)
+                tbank_seconds += time.monotonic() - tbank_started
+
+                db_started = time.monotonic()
+                save_payment_statuses(results)
+                db_seconds += time.monotonic() - db_started
+
+                stats['payments'] += sum(1 for _, new_status in results if new_status)
+                stats['payments_failed'] += sum(1 for _, new_status in results if not new_status)
+
+            self.stdout.write(f"Пачка {stats['batches']}: отменено броней {cancelled}, платежей к отмене {len(payments)}")
+
+            if len(ids) < batch_size:
+                break
+
+        total_seconds = time.monotonic() - started
+        summary = (
+            f"Отменено броней: {stats['bookings']} (пачек: {stats['batches']}), "
+            f"отменено платежей: {stats['payments']}, ошибок Т-Банка: {stats['payments_failed']}. "
+            f"Время: всего {total_seconds:.2f} с, БД {db_seconds:.2f} с, Т-Банк {tbank_seconds:.2f} с"
+        )
+        logger.info(f"expire_reserved_bookings: {summary}")
+        self.stdout.write(self.style.SUCCESS(f'Готово! {summary}'))
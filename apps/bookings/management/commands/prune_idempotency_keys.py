@@ -0,0 +1,19 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from apps.bookings.services.idempotency import prune_idempotency_keys
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Удаляет истекшие ключи Idempotency-Key запросов создания бронирований'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки удаления')
+
+    def handle(self, *args, **options):
+        deleted = prune_idempotency_keys(batch_size=options['batch_size'])
+        logger.info(f"prune_idempotency_keys: deleted {deleted}")
+        self.stdout.write(self.style.SUCCESS(f'Готово! Удалено ключей: {deleted}'))
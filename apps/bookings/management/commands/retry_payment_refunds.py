@@ -0,0 +1,41 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from apps.bookings.services.bulk_cancel import (
+    DEFAULT_WORKERS, REFUND_RETRY_DELAY, pending_refunds, process_refunds,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Повторяет невыполненные возвраты и отмены платежей после массовой отмены бронирований'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Параллельных запросов Cancel')
+        parser.add_argument(
+            '--retry-delay',
+            type=int,
+            default=REFUND_RETRY_DELAY,
+            help='Повторять возвраты, которые не выполнялись дольше N секунд'
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='Размер пачки возвратов')
+
+    def handle(self, *args, **options):
+        refunds = pending_refunds(options['retry_delay'])
+        total = {'refunded': 0, 'failed': 0}
+        previous_ids = None
+        while True:
+            ids = list(refunds.order_by('id').values_list('id', flat=True)[:options['batch_size']])
+            if not ids or ids == previous_ids:
+                # Пусто или пачка не обработана (Т-Банк не настроен)
+                break
+            stats = process_refunds(refunds.filter(id__in=ids), options['workers'])
+            total['refunded'] += stats['refunded']
+            total['failed'] += stats['failed']
+            previous_ids = ids
+
+        summary = f"возвращено/отменено платежей: {total['refunded']}, ошибок Т-Банка: {total['failed']}"
+        logger.info(f"retry_payment_refunds: {summary}")
+        self.stdout.write(self.style.SUCCESS(f'Готово! {summary}'))
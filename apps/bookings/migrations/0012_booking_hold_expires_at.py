@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boats', '0014_backfill_hourly_charter_pricing'),
+        ('bookings', '0011_booking_client_payment_reminder_sent_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='hold_expires_at',
+            field=models.DateTimeField(blank=True, help_text='Для RESERVED: до этого времени неоплаченная бронь занимает места на рейсе', null=True, verbose_name='Места удерживаются до'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'hold_expires_at'], name='bookings_bo_status_815b94_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boats', '0014_backfill_hourly_charter_pricing'),
+        ('bookings', '0012_booking_hold_expires_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='availability',
+            field=models.ForeignKey(blank=True, help_text='Слот расписания, на который сделано бронирование', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bookings', to='boats.boatavailability', verbose_name='Рейс'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['availability', 'status'], name='bookings_bo_availab_4090f9_idx'),
+        ),
+    ]
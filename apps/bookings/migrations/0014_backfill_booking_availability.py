@@ -0,0 +1,52 @@
+from django.db import migrations
+from django.utils import timezone
+
+
+def backfill_booking_availability(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    BoatAvailability = apps.get_model('boats', 'BoatAvailability')
+
+    # (лодка, дата, время отправления, время возвращения) -> слот; активные слоты в приоритете
+    slots = {}
+    for slot in BoatAvailability.objects.order_by('-is_active', 'id').values(
+        'id', 'boat_id', 'departure_date', 'departure_time', 'return_time'
+    ):
+        key = (slot['boat_id'], slot['departure_date'], slot['departure_time'], slot['return_time'])
+        slots.setdefault(key, slot['id'])
+
+    if not slots:
+        return
+
+    batch = []
+    bookings = Booking.objects.filter(availability__isnull=True).only(
+        'id', 'boat_id', 'start_datetime', 'end_datetime'
+    )
+    for booking in bookings.iterator(chunk_size=2000):
+        start = timezone.localtime(booking.start_datetime)
+        end = timezone.localtime(booking.end_datetime)
+        availability_id = slots.get((booking.boat_id, start.date(), start.time(), end.time()))
+        if availability_id is None:
+            continue
+        booking.availability_id = availability_id
+        batch.append(booking)
+        if len(batch) >= 500:
+            Booking.objects.bulk_update(batch, ['availability'])
+            batch = []
+
+    if batch:
+        Booking.objects.bulk_update(batch, ['availability'])
+
+
+def noop_reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0013_booking_availability'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_booking_availability, noop_reverse),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boats', '0014_backfill_hourly_charter_pricing'),
+        ('bookings', '0014_backfill_booking_availability'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False, verbose_name='ID бронирования')),
+                ('trip_type', models.CharField(choices=[('group', 'Групповой'), ('individual', 'Индивидуальный (Чарт)')], max_length=20, verbose_name='Тип выхода')),
+                ('availability_id', models.IntegerField(blank=True, null=True, verbose_name='ID рейса')),
+                ('start_datetime', models.DateTimeField(verbose_name='Дата и время начала')),
+                ('end_datetime', models.DateTimeField(verbose_name='Дата и время окончания')),
+                ('duration_hours', models.PositiveIntegerField(verbose_name='Длительность (часов)')),
+                ('event_type', models.CharField(blank=True, max_length=200, verbose_name='Тип мероприятия')),
+                ('guest_name', models.CharField(max_length=200, verbose_name='Имя гостя')),
+                ('guest_phone', models.CharField(max_length=20, verbose_name='Контактный телефон')),
+                ('number_of_people', models.PositiveIntegerField(verbose_name='Количество людей')),
+                ('price_per_person', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Цена за человека (₽)')),
+                ('original_price', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Исходная стоимость (₽)')),
+                ('discount_percent', models.DecimalField(decimal_places=2, default=0, max_digits=5, verbose_name='Скидка (%)')),
+                ('discount_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Сумма скидки (₽)')),
+                ('hotel_cashback_percent', models.DecimalField(decimal_places=2, default=0, max_digits=5, verbose_name='Кешбэк гостиницы (%)')),
+                ('hotel_cashback_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Сумма кешбэка гостиницы (₽)')),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Итоговая стоимость (₽)')),
+                ('deposit', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Предоплата (₽)')),
+                ('remaining_amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Остаток к оплате (₽)')),
+                ('payment_method', models.CharField(choices=[('cash', 'Наличные'), ('card', 'Безналичный расчет'), ('online', 'Онлайн оплата')], max_length=20, verbose_name='Способ оплаты остатка')),
+                ('status', models.CharField(choices=[('reserved', 'Зарезервировано (ожидает оплаты)'), ('pending', 'Ожидает подтверждения'), ('confirmed', 'Подтверждено'), ('cancelled', 'Отменено'), ('completed', 'Завершено')], max_length=20, verbose_name='Статус')),
+                ('notes', models.TextField(blank=True, verbose_name='Примечания')),
+                ('created_at', models.DateTimeField(verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(verbose_name='Дата обновления')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата архивации')),
+                ('boat', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='boats.boat', verbose_name='Судно')),
+                ('customer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Клиент')),
+                ('guide', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Гид')),
+                ('hotel_admin', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Администратор гостиницы')),
+                ('promo_code', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='bookings.promocode', verbose_name='Промокод')),
+            ],
+            options={
+                'verbose_name': 'Архивное бронирование',
+                'verbose_name_plural': 'Архив бронирований',
+                'ordering': ['-start_datetime'],
+                'indexes': [models.Index(fields=['start_datetime'], name='bookings_ar_start_d_c9baff_idx'), models.Index(fields=['boat', 'start_datetime'], name='bookings_ar_boat_id_c9deff_idx'), models.Index(fields=['hotel_admin', 'start_datetime'], name='bookings_ar_hotel_a_8d19b4_idx')],
+            },
+        ),
+    ]
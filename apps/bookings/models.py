@@ -1,9 +1,13 @@
 from decimal import Decimal
+from datetime import datetime, timedelta
 
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from apps.accounts.models import User
-from apps.boats.models import Boat, TripType
+from apps.boats.models import Boat, BoatAvailability, TripType
 
 
 class PromoCode(models.Model):
@@ -83,9 +87,107 @@ class PromoCode(models.Model):
         return f"{self.code} - {amt}₽ ({'активен' if self.is_active else 'неактивен'})"
 
 
+def _slot_bounds(availability):
+    """Начало и окончание рейса (BoatAvailability) как datetime в текущей временной зоне"""
+    start = datetime.combine(availability.departure_date, availability.departure_time)
+    end = datetime.combine(availability.departure_date, availability.return_time)
+    if settings.USE_TZ:
+        start, end = timezone.make_aware(start), timezone.make_aware(end)
+    return start, end
+
+
+class BookingQuerySet(models.QuerySet):
+    """QuerySet бронирований с общими выборками"""
+
+    def for_listing(self):
+        """
+        Предзагрузка связей, которые использует BookingListSerializer
+        (судно с причалом и владельцем, гид, клиент, платежи).
+        Количество запросов не зависит от числа бронирований в выдаче.
+        """
+        return self.select_related(
+            'boat', 'boat__dock', 'boat__owner', 'guide', 'customer'
+        ).prefetch_related('payments')
+
+    def occupying(self, now=None):
+        """
+        Бронирования, занимающие места на рейсе:
+        оплаченные (PENDING, CONFIRMED) и RESERVED с действующим удержанием мест
+        """
+        now = now or timezone.now()
+        return self.filter(
+            models.Q(status__in=[self.model.Status.PENDING, self.model.Status.CONFIRMED]) |
+            models.Q(status=self.model.Status.RESERVED, hold_expires_at__gt=now)
+        )
+
+    def occupied_seats(self, availability, now=None):
+        """
+        Занятые места на рейсе: брони, блокировки капитана и действующие удержания.
+        Учитываются и брони без рейса (не сопоставленные миграцией 0014, созданные в админке)
+        на том же судне, пересекающиеся с рейсом по времени.
+        """
+        start, end = _slot_bounds(availability)
+        return self.occupying(now).filter(
+            models.Q(availability=availability) |
+            models.Q(
+                availability__isnull=True,
+                boat_id=availability.boat_id,
+                start_datetime__lt=end,
+                end_datetime__gt=start,
+            )
+        ).aggregate(
+            total=models.Sum('number_of_people')
+        )['total'] or 0
+
+    def occupied_seats_by_availability(self, availability_ids, now=None):
+        """
+        Занятые места по нескольким рейсам: {availability_id: мест}.
+        Число запросов не зависит от числа рейсов; брони без рейса учитываются как в occupied_seats.
+        """
+        rows = self.occupying(now).filter(
+            availability_id__in=availability_ids
+        ).values('availability_id').annotate(total=models.Sum('number_of_people')).order_by()
+        occupied = {row['availability_id']: row['total'] for row in rows}
+
+        slots = {
+            slot.id: (slot.boat_id, *_slot_bounds(slot))
+            for slot in BoatAvailability.objects.filter(id__in=availability_ids).only(
+                'id', 'boat_id', 'departure_date', 'departure_time', 'return_time'
+            )
+        }
+        if not slots:
+            return occupied
+
+        unlinked = self.occupying(now).filter(
+            availability__isnull=True,
+            boat_id__in={boat_id for boat_id, _, _ in slots.values()},
+            start_datetime__lt=max(end for _, _, end in slots.values()),
+            end_datetime__gt=min(start for _, start, _ in slots.values()),
+        ).values_list('boat_id', 'start_datetime', 'end_datetime', 'number_of_people')
+        for boat_id, start, end, people in unlinked:
+            for slot_id, (slot_boat_id, slot_start, slot_end) in slots.items():
+                if boat_id == slot_boat_id and start < slot_end and end > slot_start:
+                    occupied[slot_id] = occupied.get(slot_id, 0) + people
+        return occupied
+
+    def expired_holds(self, now=None):
+        """
+        RESERVED бронирования, у которых истекло удержание мест.
+        Для записей без hold_expires_at (созданных до появления удержаний) - по дате создания.
+        """
+        now = now or timezone.now()
+        legacy_deadline = now - timedelta(minutes=getattr(settings, 'BOOKING_HOLD_MINUTES', 15))
+        return self.filter(status=self.model.Status.RESERVED).filter(
+            models.Q(hold_expires_at__lte=now) |
+            models.Q(hold_expires_at__isnull=True, created_at__lte=legacy_deadline)
+        )
+
+
 class Booking(models.Model):
     """Модель бронирования"""
-    
+
+    objects = BookingQuerySet.as_manager()
+
     class Status(models.TextChoices):
         RESERVED = 'reserved', 'Зарезервировано (ожидает оплаты)'
         PENDING = 'pending', 'Ожидает подтверждения'
@@ -111,6 +213,15 @@ class Booking(models.Model):
         related_name='bookings',
         verbose_name='Судно'
     )
+    availability = models.ForeignKey(
+        'boats.BoatAvailability',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='bookings',
+        verbose_name='Рейс',
+        help_text='Слот расписания, на который сделано бронирование'
+    )
     start_datetime = models.DateTimeField(verbose_name='Дата и время начала')
     end_datetime = models.DateTimeField(verbose_name='Дата и время окончания')
     duration_hours = models.PositiveIntegerField(
@@ -267,6 +378,12 @@ class Booking(models.Model):
         verbose_name='Напоминание клиенту об оплате отправлено',
         help_text='Флаг для предотвращения дублирования напоминания клиенту об оплате остатка за 1 час до выхода'
     )
+    hold_expires_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Места удерживаются до',
+        help_text='Для RESERVED: до этого времени неоплаченная бронь занимает места на рейсе'
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
     
@@ -277,12 +394,21 @@ class Booking(models.Model):
         indexes = [
             models.Index(fields=['boat', 'start_datetime', 'end_datetime']),
             models.Index(fields=['boat', 'status']),
+            models.Index(fields=['availability', 'status']),
             models.Index(fields=['customer', 'status']),
             models.Index(fields=['guide', 'status']),
             models.Index(fields=['hotel_admin', 'status']),
             models.Index(fields=['promo_code']),
+            # Выборка истекших удержаний мест: status=RESERVED AND hold_expires_at <= now
+            models.Index(fields=['status', 'hold_expires_at']),
         ]
     
+    @staticmethod
+    def get_hold_expires_at(now=None):
+        """Время окончания удержания мест для новой RESERVED брони"""
+        now = now or timezone.now()
+        return now + timedelta(minutes=getattr(settings, 'BOOKING_HOLD_MINUTES', 15))
+    
     def __str__(self):
         return f"{self.guest_name} - {self.boat.name} ({self.start_datetime.strftime('%d.%m.%Y %H:%M')})"
     
@@ -425,3 +551,125 @@ class Booking(models.Model):
             self.remaining_amount = self.total_price - self.deposit
 
         super().save(*args, **kwargs)
+
+
+class ArchivedBooking(models.Model):
+    """
+    Архив завершенных и отмененных бронирований (команда archive_bookings).
+    Поля и их имена совпадают с Booking, чтобы отчеты читали обе таблицы одинаково
+    (services.reporting). id сохраняется из исходной брони.
+    """
+    id = models.IntegerField(primary_key=True, verbose_name='ID бронирования')
+    trip_type = models.CharField(max_length=20, choices=TripType.choices, verbose_name='Тип выхода')
+    boat = models.ForeignKey(
+        Boat,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Судно'
+    )
+    availability_id = models.IntegerField(null=True, blank=True, verbose_name='ID рейса')
+    start_datetime = models.DateTimeField(verbose_name='Дата и время начала')
+    end_datetime = models.DateTimeField(verbose_name='Дата и время окончания')
+    duration_hours = models.PositiveIntegerField(verbose_name='Длительность (часов)')
+    event_type = models.CharField(max_length=200, blank=True, verbose_name='Тип мероприятия')
+    guide = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Гид'
+    )
+    hotel_admin = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Администратор гостиницы'
+    )
+    customer = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Клиент'
+    )
+    guest_name = models.CharField(max_length=200, verbose_name='Имя гостя')
+    guest_phone = models.CharField(max_length=20, verbose_name='Контактный телефон')
+    number_of_people = models.PositiveIntegerField(verbose_name='Количество людей')
+    price_per_person = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name='Цена за человека (₽)')
+    original_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name='Исходная стоимость (₽)')
+    discount_percent = models.DecimalField(max_digits=5, decimal_places=2, default=0, verbose_name='Скидка (%)')
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name='Сумма скидки (₽)')
+    hotel_cashback_percent = models.DecimalField(max_digits=5, decimal_places=2, default=0, verbose_name='Кешбэк гостиницы (%)')
+    hotel_cashback_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name='Сумма кешбэка гостиницы (₽)')
+    total_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Итоговая стоимость (₽)')
+    deposit = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Предоплата (₽)')
+    promo_code = models.ForeignKey(
+        PromoCode,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Промокод'
+    )
+    remaining_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Остаток к оплате (₽)')
+    payment_method = models.CharField(max_length=20, choices=Booking.PaymentMethod.choices, verbose_name='Способ оплаты остатка')
+    status = models.CharField(max_length=20, choices=Booking.Status.choices, verbose_name='Статус')
+    notes = models.TextField(blank=True, verbose_name='Примечания')
+    created_at = models.DateTimeField(verbose_name='Дата создания')
+    updated_at = models.DateTimeField(verbose_name='Дата обновления')
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата архивации')
+
+    class Meta:
+        verbose_name = 'Архивное бронирование'
+        verbose_name_plural = 'Архив бронирований'
+        ordering = ['-start_datetime']
+        indexes = [
+            models.Index(fields=['start_datetime']),
+            models.Index(fields=['boat', 'start_datetime']),
+            models.Index(fields=['hotel_admin', 'start_datetime']),
+        ]
+
+    def __str__(self):
+        return f"Архив: бронирование #{self.id} - {self.guest_name} ({self.start_datetime:%d.%m.%Y})"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Ключ Idempotency-Key запроса создания бронирования (services.idempotency).
+    Хранится в БД, чтобы повтор запроса распознавался любым воркером.
+    """
+
+    class State(models.TextChoices):
+        PROCESSING = 'processing', 'Обрабатывается'
+        DONE = 'done', 'Выполнен'
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys',
+        verbose_name='Пользователь'
+    )
+    scope = models.CharField(max_length=50, verbose_name='Операция')
+    key = models.CharField(max_length=64, verbose_name='Ключ (SHA-256)')
+    fingerprint = models.CharField(max_length=64, verbose_name='Отпечаток запроса')
+    state = models.CharField(max_length=20, choices=State.choices, default=State.PROCESSING, verbose_name='Состояние')
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name='HTTP статус ответа')
+    response_data = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder, verbose_name='Тело ответа')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    expires_at = models.DateTimeField(db_index=True, verbose_name='Действует до')
+
+    class Meta:
+        verbose_name = 'Ключ идемпотентности'
+        verbose_name_plural = 'Ключи идемпотентности'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'scope', 'key'], name='unique_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}: {self.user_id} ({self.get_state_display()})"
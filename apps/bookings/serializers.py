@@ -1,10 +1,12 @@
 from rest_framework import serializers
 from decimal import Decimal
 from datetime import datetime, timedelta
+from django.db import transaction
 from django.utils import timezone
 from .models import Booking, PromoCode
 from apps.boats.models import Boat, BoatAvailability, BoatPricing, CharterPricing, TripType
 from apps.boats.serializers import DockSerializer
+from apps.boats.services.partner_rates import get_partner_rates
 from apps.accounts.models import User
 from apps.payments.serializers import PaymentSerializer
 
@@ -258,14 +260,15 @@ class BookingCreateSerializer(serializers.ModelSerializer):
                 pass
         return attrs
 
+    @transaction.atomic
     def create(self, validated_data):
         trip_id = validated_data.pop('trip_id')
         promo_code_obj = validated_data.pop('promo_code', None)
         is_preview = validated_data.pop('preview', False)
         user = self.context['request'].user
 
-        # Получаем доступный рейс
-        availability = BoatAvailability.objects.get(id=trip_id)
+        # Получаем доступный рейс и блокируем его: проверка мест и создание брони атомарны
+        availability = BoatAvailability.objects.select_for_update().get(id=trip_id)
         boat = availability.boat
         is_individual = availability.trip_type == TripType.INDIVIDUAL
 
@@ -324,6 +327,7 @@ class BookingCreateSerializer(serializers.ModelSerializer):
             booking = Booking.objects.create(
                 trip_type=TripType.INDIVIDUAL,
                 boat=boat,
+                availability=availability,
                 start_datetime=start_datetime,
                 end_datetime=end_datetime,
                 duration_hours=duration_hours,
@@ -339,38 +343,17 @@ class BookingCreateSerializer(serializers.ModelSerializer):
                 total_price=total_price,
                 deposit=deposit,
                 remaining_amount=remaining_amount,
-                status=Booking.Status.RESERVED
+                status=Booking.Status.RESERVED,
+                hold_expires_at=Booking.get_hold_expires_at()
             )
             return booking
 
         else:
             # === ГРУППОВОЙ ВЫХОД (текущая логика) ===
             # Проверяем доступность мест
-            existing_bookings = Booking.objects.filter(
-                boat=boat,
-                status__in=[Booking.Status.PENDING, Booking.Status.CONFIRMED],
-                start_datetime__lt=end_datetime,
-                end_datetime__gt=start_datetime
-            ).exclude(
-                customer__isnull=True,
-                guide__isnull=True,
-                notes__startswith="[БЛОКИРОВКА]"
-            )
-
-            blocked_bookings = Booking.objects.filter(
-                boat=boat,
-                customer__isnull=True,
-                guide__isnull=True,
-                notes__startswith="[БЛОКИРОВКА]",
-                status=Booking.Status.CONFIRMED,
-                start_datetime__lt=end_datetime,
-                end_datetime__gt=start_datetime
-            )
-
-            booked_places = sum(booking.number_of_people for booking in existing_bookings)
-            blocked_places = sum(booking.number_of_people for booking in blocked_bookings)
-            effective_capacity = availability.effective_capacity
-            available_places = effective_capacity - booked_places - blocked_places
+            # Брони, блокировки и действующие удержания этого рейса - одним SUM по индексу
+            occupied_places = Booking.objects.occupied_seats(availability)
+            available_places = availability.effective_capacity - occupied_places
 
             if not is_preview and validated_data['number_of_people'] > available_places:
                 raise serializers.ValidationError(
@@ -409,17 +392,10 @@ class BookingCreateSerializer(serializers.ModelSerializer):
             discount_percent = Decimal('0')
             guide_discount_amount = Decimal('0')
             if guide:
-                from apps.boats.models import GuideBoatDiscount
-                try:
-                    discount_obj = GuideBoatDiscount.objects.get(
-                        guide=guide,
-                        boat_owner=boat.owner,
-                        is_active=True
-                    )
-                    discount_percent = discount_obj.discount_percent
+                guide_discount = get_partner_rates(self.context['request']).guide_discount_percent(boat.owner_id)
+                if guide_discount is not None:
+                    discount_percent = guide_discount
                     guide_discount_amount = (original_price * discount_percent) / Decimal('100')
-                except GuideBoatDiscount.DoesNotExist:
-                    pass
 
             # Рассчитываем скидку по промокоду
             promo_discount_amount = Decimal('0')
@@ -457,6 +433,7 @@ class BookingCreateSerializer(serializers.ModelSerializer):
             booking = Booking.objects.create(
                 trip_type=TripType.GROUP,
                 boat=boat,
+                availability=availability,
                 start_datetime=start_datetime,
                 end_datetime=end_datetime,
                 duration_hours=duration_hours,
@@ -470,7 +447,8 @@ class BookingCreateSerializer(serializers.ModelSerializer):
                 price_per_person=price_per_person,
                 deposit=deposit,
                 promo_code=promo_code_obj,
-                status=Booking.Status.RESERVED
+                status=Booking.Status.RESERVED,
+                hold_expires_at=Booking.get_hold_expires_at()
             )
             return booking
     
@@ -487,20 +465,6 @@ class BlockSeatsSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('id', 'start_datetime', 'end_datetime', 'created_at')
     
-    def validate_trip_id(self, value):
-        """Проверяет существование рейса и права доступа"""
-        try:
-            availability = BoatAvailability.objects.get(id=value, is_active=True)
-        except BoatAvailability.DoesNotExist:
-            raise serializers.ValidationError("Рейс не найден")
-        
-        # Проверяем, что пользователь - владелец судна
-        user = self.context['request'].user
-        if user.role != User.Role.BOAT_OWNER or availability.boat.owner != user:
-            raise serializers.ValidationError("Вы можете блокировать места только на своих судах")
-        
-        return value
-    
     def validate_number_of_people(self, value):
         """Проверяет количество людей"""
         if value < 1:
@@ -510,7 +474,7 @@ class BlockSeatsSerializer(serializers.ModelSerializer):
         return value
     
     def validate(self, attrs):
-        """Валидация данных блокировки"""
+        """Валидация данных блокировки: рейс и права доступа проверяются одним запросом"""
         trip_id = attrs.get('trip_id')
         number_of_people = attrs.get('number_of_people')
         
@@ -519,76 +483,41 @@ class BlockSeatsSerializer(serializers.ModelSerializer):
         
         # Получаем рейс
         try:
-            availability = BoatAvailability.objects.get(id=trip_id, is_active=True)
+            availability = BoatAvailability.objects.select_related('boat').get(id=trip_id, is_active=True)
         except BoatAvailability.DoesNotExist:
-            raise serializers.ValidationError("Рейс не найден")
+            raise serializers.ValidationError({'trip_id': "Рейс не найден"})
         
-        boat = availability.boat
+        # Проверяем, что пользователь - владелец судна
+        user = self.context['request'].user
+        if user.role != User.Role.BOAT_OWNER or availability.boat.owner_id != user.id:
+            raise serializers.ValidationError({'trip_id': "Вы можете блокировать места только на своих судах"})
+        
+        error = self.check_capacity(availability, number_of_people, Booking.objects.occupied_seats(availability))
+        if error:
+            raise serializers.ValidationError(error)
         
+        attrs['availability'] = availability
+        return attrs
+    
+    @staticmethod
+    def check_capacity(availability, number_of_people, occupied_places):
+        """Возвращает текст ошибки, если мест недостаточно, иначе None"""
         # Используем effective_capacity из availability, если указано ограничение
         effective_capacity = availability.effective_capacity
         
         # Проверяем, что количество мест не превышает эффективную вместимость
         if number_of_people > effective_capacity:
-            raise serializers.ValidationError(
-                f"Количество мест ({number_of_people}) превышает доступную вместимость ({effective_capacity})"
-            )
-        
-        # Создаем datetime для проверки пересечений
-        start_datetime = datetime.combine(availability.departure_date, availability.departure_time)
-        end_datetime = datetime.combine(availability.departure_date, availability.return_time)
-        
-        # Если время возвращения меньше времени отправления, значит рейс через полночь
-        if availability.return_time < availability.departure_time:
-            end_datetime += timedelta(days=1)
-        
-        # Проверяем доступность мест (учитываем обычные бронирования и другие блокировки)
-        # ИСКЛЮЧАЕМ заблокированные места (customer=None, guide=None, notes содержит "[БЛОКИРОВКА]")
-        # чтобы не считать их дважды
-        existing_bookings = Booking.objects.filter(
-            boat=boat,
-            status__in=[Booking.Status.PENDING, Booking.Status.CONFIRMED],
-            start_datetime__lt=end_datetime,
-            end_datetime__gt=start_datetime
-        ).exclude(
-            customer__isnull=True,
-            guide__isnull=True,
-            notes__startswith="[БЛОКИРОВКА]"
-        )
-        
-        # Подсчитываем заблокированные места капитаном
-        blocked_bookings = Booking.objects.filter(
-            boat=boat,
-            customer__isnull=True,
-            guide__isnull=True,
-            notes__startswith="[БЛОКИРОВКА]",
-            status=Booking.Status.CONFIRMED,
-            start_datetime__lt=end_datetime,
-            end_datetime__gt=start_datetime
-        )
-        
-        booked_places = sum(booking.number_of_people for booking in existing_bookings)
-        blocked_places = sum(booking.number_of_people for booking in blocked_bookings)
-        # Используем effective_capacity из availability, если указано ограничение
-        effective_capacity = availability.effective_capacity
-        available_places = effective_capacity - booked_places - blocked_places
+            return f"Количество мест ({number_of_people}) превышает доступную вместимость ({effective_capacity})"
         
+        # Проверяем доступность мест (обычные бронирования и другие блокировки этого рейса)
+        available_places = effective_capacity - occupied_places
         if number_of_people > available_places:
-            raise serializers.ValidationError(
-                f"Недостаточно свободных мест. Доступно: {available_places}, запрошено: {number_of_people}"
-            )
-        
-        return attrs
+            return f"Недостаточно свободных мест. Доступно: {available_places}, запрошено: {number_of_people}"
+        return None
     
-    def create(self, validated_data):
-        """Создает блокировку мест (Booking с признаками блокировки)"""
-        trip_id = validated_data.pop('trip_id')
-        number_of_people = validated_data.pop('number_of_people')
-        
-        # Получаем рейс
-        availability = BoatAvailability.objects.get(id=trip_id)
-        boat = availability.boat
-        
+    @staticmethod
+    def build_block(availability, number_of_people):
+        """Несохраненная блокировка мест (Booking с признаками блокировки) на рейс"""
         # Создаем datetime
         start_datetime = datetime.combine(availability.departure_date, availability.departure_time)
         end_datetime = datetime.combine(availability.departure_date, availability.return_time)
@@ -601,12 +530,9 @@ class BlockSeatsSerializer(serializers.ModelSerializer):
         duration = end_datetime - start_datetime
         duration_hours = int(duration.total_seconds() / 3600)
         
-        # Формируем notes с префиксом блокировки
-        notes = "[БЛОКИРОВКА] Продано напрямую"
-        
-        # Создаем блокировку как Booking
-        booking = Booking.objects.create(
-            boat=boat,
+        return Booking(
+            boat=availability.boat,
+            availability=availability,
             start_datetime=start_datetime,
             end_datetime=end_datetime,
             duration_hours=duration_hours,
@@ -623,14 +549,167 @@ class BlockSeatsSerializer(serializers.ModelSerializer):
             total_price=Decimal('0'),
             deposit=Decimal('0'),
             remaining_amount=Decimal('0'),
+            hotel_cashback_percent=Decimal('0'),
+            hotel_cashback_amount=Decimal('0'),
             payment_method=Booking.PaymentMethod.CASH,
             status=Booking.Status.CONFIRMED,
-            notes=notes
+            # Формируем notes с префиксом блокировки
+            notes="[БЛОКИРОВКА] Продано напрямую"
         )
-        
+    
+    def create(self, validated_data):
+        """Создает блокировку мест (Booking с признаками блокировки)"""
+        booking = self.build_block(validated_data['availability'], validated_data['number_of_people'])
+        booking.save()
         return booking
 
 
+class BlockSeatsItemSerializer(serializers.Serializer):
+    """Один рейс в массовой блокировке мест"""
+    trip_id = serializers.IntegerField(help_text='ID рейса из BoatAvailability')
+    number_of_people = serializers.IntegerField(min_value=1, max_value=11)
+
+
+class BulkBlockSeatsSerializer(serializers.Serializer):
+    """
+    Массовая блокировка мест капитаном на нескольких рейсах.
+    Занятость всех рейсов считается одним запросом, блокировки создаются bulk_create
+    в одной транзакции. Ошибки возвращаются по каждому элементу, корректные элементы создаются.
+    """
+    items = serializers.ListField(child=BlockSeatsItemSerializer(), allow_empty=False, max_length=100)
+    
+    @transaction.atomic
+    def create(self, validated_data):
+        user = self.context['request'].user
+        items = validated_data['items']
+        trip_ids = {item['trip_id'] for item in items}
+        
+        # Блокируем рейсы: проверка мест и создание блокировок атомарны
+        availabilities = {
+            availability.id: availability
+            for availability in BoatAvailability.objects.select_for_update().select_related('boat').filter(
+                id__in=trip_ids, is_active=True, boat__owner=user
+            )
+        }
+        occupied = Booking.objects.occupied_seats_by_availability(list(availabilities))
+        
+        results = []
+        blocks = []
+        for item in items:
+            trip_id = item['trip_id']
+            number_of_people = item['number_of_people']
+            result = {'trip_id': trip_id, 'number_of_people': number_of_people}
+            results.append(result)
+            
+            availability = availabilities.get(trip_id)
+            if availability is None:
+                result['error'] = "Рейс не найден"
+                continue
+            
+            error = BlockSeatsSerializer.check_capacity(availability, number_of_people, occupied.get(trip_id, 0))
+            if error:
+                result['error'] = error
+                continue
+            
+            # Учитываем места, заблокированные предыдущими элементами этого же запроса
+            occupied[trip_id] = occupied.get(trip_id, 0) + number_of_people
+            booking = BlockSeatsSerializer.build_block(availability, number_of_people)
+            blocks.append((result, booking))
+        
+        Booking.objects.bulk_create([booking for _, booking in blocks])
+        for result, booking in blocks:
+            result.update({
+                'booking_id': booking.id,
+                'start_datetime': booking.start_datetime,
+                'end_datetime': booking.end_datetime,
+            })
+        return results
+
+
+class BulkUnblockSeatsSerializer(serializers.Serializer):
+    """Массовая разблокировка мест по списку ID блокировок"""
+    booking_ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=100
+    )
+    
+    @transaction.atomic
+    def create(self, validated_data):
+        user = self.context['request'].user
+        booking_ids = list(dict.fromkeys(validated_data['booking_ids']))
+        
+        blocks = dict(
+            Booking.objects.select_for_update().filter(
+                id__in=booking_ids,
+                boat__owner=user,
+                customer__isnull=True,
+                guide__isnull=True,
+                notes__startswith="[БЛОКИРОВКА]"
+            ).values_list('id', 'status')
+        )
+        unblock_ids = [pk for pk, block_status in blocks.items() if block_status == Booking.Status.CONFIRMED]
+        
+        # Разблокируем (меняем статус на CANCELLED) одним UPDATE
+        if unblock_ids:
+            Booking.objects.filter(id__in=unblock_ids).update(
+                status=Booking.Status.CANCELLED,
+                updated_at=timezone.now()
+            )
+        
+        results = []
+        for pk in booking_ids:
+            result = {'booking_id': pk}
+            if pk not in blocks:
+                result['error'] = "Блокировка не найдена"
+            elif pk not in unblock_ids:
+                result['error'] = "Места уже разблокированы"
+            results.append(result)
+        return results
+
+
+class BulkCheckInSerializer(serializers.Serializer):
+    """Посадка нескольких бронирований одним условным UPDATE"""
+    booking_ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=100
+    )
+    
+    @transaction.atomic
+    def create(self, validated_data):
+        user = self.context['request'].user
+        booking_ids = list(dict.fromkeys(validated_data['booking_ids']))
+        
+        # Блокировки мест не участвуют в посадке. Строки блокируются до UPDATE,
+        # чтобы параллельная отмена не перетерлась посадкой
+        bookings = dict(
+            Booking.objects.select_for_update().filter(id__in=booking_ids, boat__owner=user).exclude(
+                customer__isnull=True,
+                guide__isnull=True,
+                hotel_admin__isnull=True,
+                notes__startswith="[БЛОКИРОВКА]"
+            ).values_list('id', 'status')
+        )
+        checked_in_ids = {pk for pk, booking_status in bookings.items() if booking_status == Booking.Status.CONFIRMED}
+        
+        if checked_in_ids:
+            Booking.objects.filter(id__in=checked_in_ids, status=Booking.Status.CONFIRMED).update(
+                status=Booking.Status.COMPLETED,
+                updated_at=timezone.now()
+            )
+        
+        results = []
+        for pk in booking_ids:
+            result = {'booking_id': pk}
+            if pk not in bookings:
+                result['error'] = "Бронирование не найдено"
+            elif pk in checked_in_ids:
+                result['status'] = Booking.Status.COMPLETED
+            elif bookings[pk] == Booking.Status.COMPLETED:
+                result['error'] = "Посадка уже подтверждена"
+            else:
+                result['error'] = "Бронирование должно быть полностью оплачено для посадки"
+            results.append(result)
+        return results
+
+
 class HotelBookingSerializer(serializers.ModelSerializer):
     """Сериализатор для создания бронирования от гостиницы"""
     trip_id = serializers.IntegerField(write_only=True, help_text='ID из /api/trips/')
@@ -665,6 +744,7 @@ class HotelBookingSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Максимальное количество людей - 11")
         return value
     
+    @transaction.atomic
     def create(self, validated_data):
         trip_id = validated_data.pop('trip_id')
         user = self.context['request'].user
@@ -673,43 +753,18 @@ class HotelBookingSerializer(serializers.ModelSerializer):
         if user.role != User.Role.HOTEL:
             raise serializers.ValidationError('Только гостиницы могут создавать бронирования')
         
-        # Получаем доступный рейс
-        availability = BoatAvailability.objects.get(id=trip_id)
+        # Получаем доступный рейс и блокируем его: проверка мест и создание брони атомарны
+        availability = BoatAvailability.objects.select_for_update().get(id=trip_id)
         boat = availability.boat
         
-        # Проверяем доступность мест
+        # Проверяем доступность мест: брони, блокировки и действующие удержания этого рейса
         start_datetime = datetime.combine(availability.departure_date, availability.departure_time)
         end_datetime = datetime.combine(availability.departure_date, availability.return_time)
         
         if availability.return_time < availability.departure_time:
             end_datetime += timedelta(days=1)
         
-        # Проверяем пересечения с существующими бронированиями
-        # Учитываем ТОЛЬКО PENDING и CONFIRMED (RESERVED не учитываем - неоплаченные не занимают места)
-        existing_bookings = Booking.objects.filter(
-            boat=boat,
-            status__in=[Booking.Status.PENDING, Booking.Status.CONFIRMED],
-            start_datetime__lt=end_datetime,
-            end_datetime__gt=start_datetime
-        )
-        
-        # Подсчитываем заблокированные места
-        blocked_bookings = Booking.objects.filter(
-            boat=boat,
-            customer__isnull=True,
-            guide__isnull=True,
-            hotel_admin__isnull=True,
-            notes__startswith="[БЛОКИРОВКА]",
-            status=Booking.Status.CONFIRMED,
-            start_datetime__lt=end_datetime,
-            end_datetime__gt=start_datetime
-        )
-        
-        booked_places = sum(booking.number_of_people for booking in existing_bookings)
-        blocked_places = sum(booking.number_of_people for booking in blocked_bookings)
-        # Используем effective_capacity из availability, если указано ограничение
-        effective_capacity = availability.effective_capacity
-        available_places = effective_capacity - booked_places - blocked_places
+        available_places = availability.effective_capacity - Booking.objects.occupied_seats(availability)
         
         if validated_data['number_of_people'] > available_places:
             raise serializers.ValidationError(
@@ -729,18 +784,10 @@ class HotelBookingSerializer(serializers.ModelSerializer):
         original_price = price_per_person * validated_data['number_of_people']
         
         # Рассчитываем кешбэк гостиницы (если есть)
-        hotel_cashback_percent = Decimal('0')
         hotel_cashback_amount = Decimal('0')
-        try:
-            from apps.boats.models import HotelBoatCashback
-            cashback_obj = HotelBoatCashback.objects.get(
-                hotel=user,
-                boat_owner=boat.owner,
-                is_active=True
-            )
-            hotel_cashback_percent = cashback_obj.cashback_percent
-        except HotelBoatCashback.DoesNotExist:
-            pass
+        hotel_cashback_percent = get_partner_rates(self.context['request']).hotel_cashback_percent(boat.owner_id)
+        if hotel_cashback_percent is None:
+            hotel_cashback_percent = Decimal('0')
         
         # Итоговая цена (пока без скидок, так как для гостиницы скидки не применяются)
         total_price = original_price
@@ -756,6 +803,7 @@ class HotelBookingSerializer(serializers.ModelSerializer):
         # Гостиница не оплачивает, создаётся ссылка для гостя
         booking = Booking.objects.create(
             boat=boat,
+            availability=availability,
             start_datetime=start_datetime,
             end_datetime=end_datetime,
             duration_hours=duration_hours,
@@ -773,7 +821,8 @@ class HotelBookingSerializer(serializers.ModelSerializer):
             remaining_amount=remaining_amount,
             hotel_cashback_percent=hotel_cashback_percent,
             hotel_cashback_amount=hotel_cashback_amount,
-            status=Booking.Status.RESERVED
+            status=Booking.Status.RESERVED,
+            hold_expires_at=Booking.get_hold_expires_at()
         )
         
         return booking
@@ -0,0 +1,275 @@
+"""
+Массовая отмена бронирований (погодная отмена дня или рейса).
+
+Все брони отменяются одним UPDATE в одной транзакции. Побочные эффекты
+(возвраты и отмена платежей в Т-Банке, удаление событий Google Calendar,
+уведомления в мессенджеры) выполняются после коммита одной пачкой в фоновом потоке.
+Сигнал booking_status_changed для массовой отмены не отправляется.
+
+Возвраты ставятся в очередь (PaymentRefund) в той же транзакции, что и отмена броней:
+невыполненные (ошибка Т-Банка, перезапуск воркера) повторяет команда retry_payment_refunds.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Concat
+from django.utils import timezone
+
+from ..models import Booking
+from apps.payments.models import Payment, PaymentRefund
+
+logger = logging.getLogger(__name__)
+
+CANCELLABLE_STATUSES = [
+    Booking.Status.RESERVED,
+    Booking.Status.PENDING,
+    Booking.Status.CONFIRMED,
+]
+
+# Оплаченные платежи - возврат, неоплаченные платежные сессии - отмена ссылки
+REFUNDABLE_PAYMENT_STATUSES = [
+    Payment.Status.NEW,
+    Payment.Status.FORM_SHOWED,
+    Payment.Status.AUTHORIZED,
+    Payment.Status.CONFIRMED,
+]
+
+DEFAULT_WORKERS = 8
+# После стольких неудачных попыток возврат остается в очереди для разбора вручную
+MAX_REFUND_ATTEMPTS = 10
+# Пауза перед повтором (секунды): первую попытку в это время может выполнять фоновый поток
+REFUND_RETRY_DELAY = 300
+# Строк в сводке для общих чатов (лимит Telegram - 4096 символов на сообщение)
+SUMMARY_MAX_LINES = 40
+
+
+def cancel_bookings(bookings, reason, run_async=True):
+    """
+    Отменяет все активные брони из queryset одним UPDATE.
+
+    Returns:
+        list: ID отмененных бронирований
+    """
+    note = f"\nОтменено: {reason}" if reason else "\nОтменено"
+
+    with transaction.atomic():
+        booking_ids = list(
+            bookings.filter(status__in=CANCELLABLE_STATUSES)
+            .select_for_update()
+            .values_list('id', flat=True)
+        )
+        if not booking_ids:
+            return []
+
+        Booking.objects.filter(id__in=booking_ids).update(
+            status=Booking.Status.CANCELLED,
+            hold_expires_at=None,
+            notes=Concat('notes', Value(note)),
+            updated_at=timezone.now(),
+        )
+        logger.info(f"Bulk cancelled {len(booking_ids)} bookings: {reason}")
+        _queue_refunds(booking_ids, reason)
+
+        if run_async:
+            transaction.on_commit(lambda: threading.Thread(
+                target=process_bulk_cancellation,
+                args=(booking_ids, reason),
+                daemon=True
+            ).start())
+        else:
+            transaction.on_commit(lambda: process_bulk_cancellation(booking_ids, reason))
+
+    return booking_ids
+
+
+def process_bulk_cancellation(booking_ids, reason, workers=DEFAULT_WORKERS):
+    """Возвраты, удаление событий календаря и уведомления для отмененных броней"""
+    from django.db import connection
+
+    try:
+        stats = {
+            'payments': refund_payments(booking_ids, workers),
+            'calendar_events': _delete_calendar_events(booking_ids),
+            'notifications': _send_cancellation_notices(booking_ids, reason),
+        }
+        logger.info(f"✅ Bulk cancellation side effects done for {len(booking_ids)} bookings: {stats}")
+        return stats
+    except Exception as e:
+        logger.error(f"❌ Bulk cancellation side effects failed: {str(e)}", exc_info=True)
+    finally:
+        if threading.current_thread() is not threading.main_thread():
+            connection.close()
+
+
+def _queue_refunds(booking_ids, reason):
+    """Ставит в очередь возврат/отмену всех платежей броней (в транзакции отмены)"""
+    payment_ids = Payment.objects.filter(
+        booking_id__in=booking_ids,
+        status__in=REFUNDABLE_PAYMENT_STATUSES,
+    ).values_list('id', flat=True)
+    PaymentRefund.objects.bulk_create(
+        [PaymentRefund(payment_id=pk, reason=(reason or '')[:255]) for pk in payment_ids]
+    )
+
+
+def refund_payments(booking_ids, workers=DEFAULT_WORKERS):
+    """Отменяет/возвращает в Т-Банке платежи броней из очереди. Возвращает число успешных отмен"""
+    return process_refunds(PaymentRefund.objects.filter(payment__booking_id__in=booking_ids), workers)['refunded']
+
+
+def pending_refunds(retry_delay=REFUND_RETRY_DELAY):
+    """Невыполненные возвраты, которые пора повторить"""
+    threshold = timezone.now() - timedelta(seconds=retry_delay)
+    return PaymentRefund.objects.filter(
+        Q(last_attempt_at__isnull=True) | Q(last_attempt_at__lt=threshold),
+        processed_at__isnull=True,
+        attempts__lt=MAX_REFUND_ATTEMPTS,
+        created_at__lt=threshold,
+    )
+
+
+def process_refunds(refunds, workers=DEFAULT_WORKERS):
+    """
+    Выполняет возвраты из очереди: Cancel в Т-Банке, статус платежа, отметка в очереди.
+    Неудачные остаются в очереди с увеличенным счетчиком попыток.
+
+    Returns:
+        dict: refunded, failed
+    """
+    from apps.payments.services import TBankService
+
+    stats = {'refunded': 0, 'failed': 0}
+    rows = list(
+        refunds.filter(processed_at__isnull=True, attempts__lt=MAX_REFUND_ATTEMPTS)
+        .values_list('id', 'payment_id', 'payment__payment_id', 'payment__status')
+    )
+    if not rows:
+        return stats
+
+    try:
+        tbank_service = TBankService()
+    except ValueError as e:
+        logger.warning(f"⚠️ Т-Банк не настроен, платежи не отменяются: {e}")
+        return stats
+
+    # Платеж мог уже быть возвращен (уведомление Т-Банка) - Cancel не нужен
+    payments = [
+        (pk, payment_id) for _, pk, payment_id, status in rows
+        if payment_id and status in REFUNDABLE_PAYMENT_STATUSES
+    ]
+    results = cancel_tbank_payments(tbank_service, payments, workers)
+    save_payment_statuses(results)
+
+    failed_payments = {pk for pk, new_status in results if not new_status}
+    done = [refund_id for refund_id, pk, _, _ in rows if pk not in failed_payments]
+    failed = [refund_id for refund_id, pk, _, _ in rows if pk in failed_payments]
+
+    now = timezone.now()
+    PaymentRefund.objects.filter(id__in=done).update(
+        processed_at=now, last_attempt_at=now, attempts=F('attempts') + 1, error=''
+    )
+    PaymentRefund.objects.filter(id__in=failed).update(
+        last_attempt_at=now, attempts=F('attempts') + 1, error='Cancel в Т-Банке не выполнен, см. лог'
+    )
+    if failed:
+        logger.warning(f"⚠️ {len(failed)} refunds failed and stay queued for retry_payment_refunds")
+
+    stats['refunded'] = sum(1 for _, new_status in results if new_status)
+    stats['failed'] = len(failed)
+    return stats
+
+
+def cancel_tbank_payments(tbank_service, payments, workers):
+    """Параллельно вызывает Cancel в Т-Банке. Возвращает [(id платежа, новый статус или None)]"""
+    def cancel(payment):
+        pk, payment_id = payment
+        try:
+            result = tbank_service.cancel_payment(payment_id)
+            new_status = (result.get('Status') or '').lower()
+            return pk, new_status if new_status in Payment.Status.values else Payment.Status.CANCELED
+        except Exception as e:
+            logger.error(f"Failed to cancel T-Bank payment {payment_id}: {str(e)}")
+            return pk, None
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return list(executor.map(cancel, payments))
+
+
+def save_payment_statuses(results):
+    """Сохраняет статусы отмененных платежей: один UPDATE на каждый итоговый статус"""
+    by_status = {}
+    for pk, new_status in results:
+        if new_status:
+            by_status.setdefault(new_status, []).append(pk)
+
+    now = timezone.now()
+    for new_status, pks in by_status.items():
+        Payment.objects.filter(pk__in=pks).update(status=new_status, updated_at=now)
+
+
+def _delete_calendar_events(booking_ids):
+    bookings = list(
+        Booking.objects.filter(id__in=booking_ids, google_calendar_event_id__isnull=False)
+        .exclude(google_calendar_event_id='')
+        .only('id', 'google_calendar_event_id')
+    )
+    if not bookings:
+        return 0
+
+    from .google_calendar_service import GoogleCalendarService
+    deleted_ids = GoogleCalendarService().delete_events(bookings)
+    if deleted_ids:
+        Booking.objects.filter(id__in=deleted_ids).update(google_calendar_event_id=None)
+    return len(deleted_ids)
+
+
+def _send_cancellation_notices(booking_ids, reason):
+    """Одна сводка в общие чаты и по одному сообщению каждому участнику со списком его броней"""
+    from .telegram_service import TelegramService
+    from .max_service import MaxService
+
+    bookings = list(
+        Booking.objects.filter(id__in=booking_ids)
+        .exclude(notes__startswith="[БЛОКИРОВКА]")
+        .select_related('boat', 'customer', 'guide', 'hotel_admin')
+        .order_by('start_datetime')
+    )
+    if not bookings:
+        return 0
+
+    by_user = {}
+    for booking in bookings:
+        for user in (booking.customer, booking.guide, booking.hotel_admin):
+            if user and (getattr(user, 'telegram_chat_id', None) or getattr(user, 'max_chat_id', None)):
+                by_user.setdefault(user.id, (user, []))[1].append(booking)
+
+    def booking_line(booking):
+        start = timezone.localtime(booking.start_datetime)
+        return f"#{booking.id} {booking.boat.name}, {start.strftime('%d.%m.%Y %H:%M')}, {booking.guest_name} ({booking.number_of_people} чел.)"
+
+    reason_text = f"\nПричина: {reason}" if reason else ""
+    telegram_service = TelegramService()
+    max_service = MaxService()
+
+    lines = [booking_line(booking) for booking in bookings[:SUMMARY_MAX_LINES]]
+    if len(bookings) > SUMMARY_MAX_LINES:
+        lines.append(f"... и еще {len(bookings) - SUMMARY_MAX_LINES}")
+    summary = f"⛈️ Отмена выходов: {len(bookings)} бронирований{reason_text}\n\n" + "\n".join(lines)
+    telegram_service.send_message(summary, parse_mode=None)
+    max_service.send_message(summary, text_format=None)
+
+    sent = 0
+    for user, user_bookings in by_user.values():
+        message = (
+            f"⛈️ Выход в море отменен{reason_text}\n\n"
+            + "\n".join(booking_line(booking) for booking in user_bookings)
+            + "\n\nВнесенная оплата будет возвращена."
+        )
+        telegram_service.send_to_user(user, message)
+        max_service.send_to_user(user, message)
+        sent += 1
+    return sent
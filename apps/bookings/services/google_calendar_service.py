@@ -14,6 +14,8 @@ class GoogleCalendarService:
     """Сервис для синхронизации бронирований с Google Calendar админа"""
     
     SCOPES = ['https://www.googleapis.com/auth/calendar']
+    # Максимум вложенных запросов в одном batch-запросе Calendar API
+    BATCH_SIZE = 50
     
     def __init__(self):
         self.service_account_file = getattr(settings, 'GOOGLE_CALENDAR_SERVICE_ACCOUNT_FILE', None)
@@ -246,3 +248,48 @@ class GoogleCalendarService:
         except Exception as e:
             logger.error(f"❌ Error deleting calendar event for booking #{booking.id}: {str(e)}", exc_info=True)
             return False
+    
+    def delete_events(self, bookings):
+        """
+        Пакетное удаление событий (batch-запросы Google API, до 50 удалений в одном HTTP-запросе)
+        
+        Args:
+            bookings: Список Booking с заполненным google_calendar_event_id
+            
+        Returns:
+            list: ID бронирований, события которых удалены (или уже отсутствовали)
+        """
+        if not self.service or not self.calendar_id:
+            logger.warning("❌ Google Calendar not configured, skipping batch event deletion")
+            return []
+        
+        bookings = [booking for booking in bookings if booking.google_calendar_event_id]
+        deleted_ids = []
+        
+        def callback(request_id, response, exception):
+            booking_id = int(request_id)
+            if exception is None:
+                deleted_ids.append(booking_id)
+            elif isinstance(exception, HttpError) and exception.resp.status == 404:
+                # Считаем успешным, если событие уже удалено
+                deleted_ids.append(booking_id)
+            else:
+                logger.error(f"❌ Google Calendar API error deleting event for booking #{booking_id}: {str(exception)}")
+        
+        for start in range(0, len(bookings), self.BATCH_SIZE):
+            batch = self.service.new_batch_http_request(callback=callback)
+            for booking in bookings[start:start + self.BATCH_SIZE]:
+                batch.add(
+                    self.service.events().delete(
+                        calendarId=self.calendar_id,
+                        eventId=booking.google_calendar_event_id
+                    ),
+                    request_id=str(booking.id)
+                )
+            try:
+                batch.execute()
+            except Exception as e:
+                logger.error(f"❌ Error executing calendar batch delete: {str(e)}", exc_info=True)
+        
+        logger.info(f"✅ Calendar batch delete: {len(deleted_ids)} of {len(bookings)} events removed")
+        return deleted_ids
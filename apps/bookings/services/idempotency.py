@@ -0,0 +1,139 @@
+"""
+Идемпотентность создания бронирований по заголовку Idempotency-Key.
+
+Повторный запрос с тем же ключом возвращает сохраненный ответ (бронирование и
+ссылку на оплату) без создания новой брони и без повторного Init в Т-Банке.
+Ключи хранятся в таблице IdempotencyKey с уникальностью (user, scope, key) и сроком
+действия, поэтому повтор распознается любым воркером, а не только тем, что принял
+первый запрос.
+"""
+import hashlib
+import json
+import logging
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from ..models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = 255
+# Сколько держим "захват" ключа, пока обрабатывается первый запрос (Init в Т-Банке до 30 сек)
+PROCESSING_TIMEOUT = 120
+
+
+def _key_digest(key: str) -> str:
+    # Ключ клиента хешируем: в таблице хранится строка фиксированной длины
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def request_fingerprint(data) -> str:
+    """Отпечаток тела запроса для проверки, что ключ не переиспользован с другими данными"""
+    if hasattr(data, 'dict'):
+        data = data.dict()
+    payload = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _claim(scope: str, user, digest: str, fingerprint: str):
+    """
+    Атомарно захватывает ключ (вставка под уникальным ограничением).
+
+    Returns:
+        tuple: (IdempotencyKey или None, захвачен ли ключ этим запросом)
+    """
+    now = timezone.now()
+    # Истекший ключ (в т.ч. зависший "захват" упавшего воркера) можно использовать заново
+    IdempotencyKey.objects.filter(user=user, scope=scope, key=digest, expires_at__lte=now).delete()
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                user=user,
+                scope=scope,
+                key=digest,
+                fingerprint=fingerprint,
+                expires_at=now + timedelta(seconds=PROCESSING_TIMEOUT),
+            )
+        return record, True
+    except IntegrityError:
+        return IdempotencyKey.objects.filter(user=user, scope=scope, key=digest).first(), False
+
+
+def prune_idempotency_keys(batch_size=1000) -> int:
+    """Удаляет истекшие ключи пачками. Returns: количество удаленных ключей"""
+    deleted = 0
+    expired = IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+    while True:
+        ids = list(expired.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
+
+
+def idempotent(scope: str):
+    """
+    Декоратор для action'ов создания бронирования.
+
+    Без заголовка Idempotency-Key (и для preview-запросов) view вызывается как обычно.
+    Сохраняются только успешные ответы: после ошибки клиент может повторить запрос
+    с тем же ключом.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.META.get(IDEMPOTENCY_HEADER)
+            if not key or request.data.get('preview', False):
+                return view_method(self, request, *args, **kwargs)
+
+            if len(key) > MAX_KEY_LENGTH:
+                return Response(
+                    {'error': f'Idempotency-Key не должен превышать {MAX_KEY_LENGTH} символов'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            fingerprint = request_fingerprint(request.data)
+
+            # Атомарно захватываем ключ; если он уже есть - это повтор
+            record, claimed = _claim(scope, request.user, _key_digest(key), fingerprint)
+            if not claimed:
+                if record is not None and record.fingerprint != fingerprint:
+                    return Response(
+                        {'error': 'Idempotency-Key уже использован с другими параметрами запроса'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                    )
+                if record is None or record.state == IdempotencyKey.State.PROCESSING:
+                    return Response(
+                        {'error': 'Запрос с этим Idempotency-Key еще обрабатывается, повторите позже'},
+                        status=status.HTTP_409_CONFLICT
+                    )
+                logger.info(f"Idempotent replay for {scope}, user {request.user.pk}")
+                response = Response(record.response_data, status=record.response_status)
+                response['Idempotent-Replayed'] = 'true'
+                return response
+
+            try:
+                response = view_method(self, request, *args, **kwargs)
+            except Exception:
+                IdempotencyKey.objects.filter(pk=record.pk).delete()
+                raise
+
+            if status.is_success(response.status_code):
+                ttl = getattr(settings, 'BOOKING_IDEMPOTENCY_TTL', 24 * 60 * 60)
+                IdempotencyKey.objects.filter(pk=record.pk).update(
+                    state=IdempotencyKey.State.DONE,
+                    response_status=response.status_code,
+                    response_data=response.data,
+                    expires_at=timezone.now() + timedelta(seconds=ttl),
+                )
+            else:
+                IdempotencyKey.objects.filter(pk=record.pk).delete()
+            return response
+        return wrapper
+    return decorator
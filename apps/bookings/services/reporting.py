@@ -0,0 +1,63 @@
+"""
+Чтение бронирований и платежей для отчетов: рабочие таблицы + архив.
+
+Старые завершенные и отмененные брони переносятся командой archive_bookings
+в ArchivedBooking/ArchivedPayment. Отчеты (финансы, выгрузки) читают данные
+только через эти функции, чтобы видеть обе таблицы. Рабочий код (занятость мест,
+списки, напоминания) продолжает работать только с Booking.
+"""
+from ..models import ArchivedBooking, Booking
+
+
+def reporting_bookings(fields, *conditions, **filters):
+    """
+    Брони из рабочей таблицы и архива: UNION ALL двух values()-запросов.
+    Условия (Q и именованные фильтры) применяются к обеим таблицам;
+    результат можно только сортировать по fields и итерировать.
+    """
+    hot = Booking.objects.filter(*conditions, **filters).values(*fields).order_by()
+    archived = ArchivedBooking.objects.filter(*conditions, **filters).values(*fields).order_by()
+    return hot.union(archived, all=True)
+
+
+def reporting_payments(fields, *conditions, **filters):
+    """Платежи из рабочей таблицы и архива (см. reporting_bookings)"""
+    from apps.payments.models import ArchivedPayment, Payment
+
+    hot = Payment.objects.filter(*conditions, **filters).values(*fields).order_by()
+    archived = ArchivedPayment.objects.filter(*conditions, **filters).values(*fields).order_by()
+    return hot.union(archived, all=True)
+
+
+def reporting_booking_totals(group_by, aggregates, *conditions, annotations=None, **filters):
+    """
+    Агрегаты по броням обеих таблиц с группировкой: каждая таблица группируется в SQL,
+    результаты складываются по ключу группы. Подходит для аддитивных агрегатов (Sum, Count).
+
+    Args:
+        group_by: поля группировки (в т.ч. из annotations, например day=TruncDate(...))
+        aggregates: {имя: Sum(...) | Count(...)}
+        conditions, filters: условия filter() для обеих таблиц
+        annotations: вычисляемые поля для группировки
+
+    Returns:
+        list[dict]: строки с полями group_by и aggregates, отсортированные по group_by
+    """
+    totals = {}
+    for model in (Booking, ArchivedBooking):
+        queryset = model.objects.filter(*conditions, **filters)
+        if annotations:
+            queryset = queryset.annotate(**annotations)
+        rows = queryset.values(*group_by).annotate(**aggregates).order_by()
+        for row in rows:
+            key = tuple(row[name] for name in group_by)
+            if key not in totals:
+                totals[key] = row
+                continue
+            for name in aggregates:
+                totals[key][name] = (totals[key][name] or 0) + (row[name] or 0)
+
+    def sort_key(key):
+        return tuple((value is None, value if value is not None else 0) for value in key)
+
+    return [totals[key] for key in sorted(totals, key=sort_key)]
@@ -0,0 +1,86 @@
+"""
+Переходы статусов бронирования.
+
+Статус меняется условным UPDATE ... WHERE id=? AND status=? только по разрешенным
+переходам. Booking.save() не вызывается: цены не пересчитываются, pre_save/post_save
+не срабатывают. Вместо post_save отправляется сигнал booking_status_changed.
+"""
+import logging
+
+from django.dispatch import Signal
+from django.utils import timezone
+
+from ..models import Booking
+
+logger = logging.getLogger(__name__)
+
+Status = Booking.Status
+
+# reserved -> pending -> confirmed -> completed, отмена из любого активного статуса.
+# RESERVED -> CONFIRMED: полная оплата гостем по ссылке гостиницы без предоплаты.
+ALLOWED_TRANSITIONS = {
+    Status.RESERVED: {Status.PENDING, Status.CONFIRMED, Status.CANCELLED},
+    Status.PENDING: {Status.CONFIRMED, Status.CANCELLED},
+    Status.CONFIRMED: {Status.COMPLETED, Status.CANCELLED},
+    Status.COMPLETED: set(),
+    Status.CANCELLED: set(),
+}
+
+# Сигнал о смене статуса: sender=Booking, booking, from_status, to_status, changed_fields
+booking_status_changed = Signal()
+
+
+class BookingTransitionError(Exception):
+    """Недопустимый переход статуса бронирования"""
+    pass
+
+
+class BookingTransitionConflict(BookingTransitionError):
+    """Статус бронирования успел измениться в параллельном запросе"""
+    pass
+
+
+def can_transition(from_status, to_status) -> bool:
+    return to_status in ALLOWED_TRANSITIONS.get(from_status, set())
+
+
+def transition(booking, to_status, **fields):
+    """
+    Переводит бронирование в статус to_status из текущего booking.status.
+
+    Дополнительные поля (notes, deposit, ...) пишутся тем же UPDATE.
+    Raises:
+        BookingTransitionError: переход не разрешен таблицей ALLOWED_TRANSITIONS
+        BookingTransitionConflict: статус в БД уже не равен booking.status
+    """
+    from_status = booking.status
+    if not can_transition(from_status, to_status):
+        raise BookingTransitionError(
+            f"Недопустимый переход статуса бронирования #{booking.pk}: {from_status} -> {to_status}"
+        )
+
+    now = timezone.now()
+    updated = Booking.objects.filter(pk=booking.pk, status=from_status).update(
+        status=to_status,
+        updated_at=now,
+        **fields
+    )
+    if not updated:
+        raise BookingTransitionConflict(
+            f"Статус бронирования #{booking.pk} изменился параллельно (ожидался {from_status})"
+        )
+
+    booking.status = to_status
+    booking.updated_at = now
+    for name, value in fields.items():
+        setattr(booking, name, value)
+
+    logger.info(f"Booking {booking.pk} status changed: {from_status} -> {to_status}")
+    booking_status_changed.send(
+        sender=Booking,
+        booking=booking,
+        from_status=from_status,
+        to_status=to_status,
+        changed_fields={'status', *fields},
+    )
+    return booking
@@ -3,6 +3,7 @@ from django.dispatch import receiver
 from django.utils import timezone
 import logging
 from .models import Booking
+from .services.transitions import booking_status_changed
 
 logger = logging.getLogger(__name__)
 
@@ -73,6 +74,112 @@ def _format_booking_message(booking):
     return message
 
 
+def _send_new_booking_notifications(instance):
+    """
+    Уведомления в мессенджеры и событие в Google Calendar для новой/оплаченной брони.
+    Вызывается из post_save и при переходе в PENDING через booking_status_changed.
+    """
+    claimed_notification = False
+
+    # Атомарно "бронируем" право на отправку уведомления.
+    # Это защищает от гонки, когда webhook и check_status одновременно обновляют одну бронь.
+    claimed_rows = Booking.objects.filter(
+        pk=instance.pk,
+        telegram_notification_sent=False
+    ).update(telegram_notification_sent=True)
+
+    if claimed_rows == 0:
+        logger.info(f"⏭️ Booking {instance.id} messenger notification already claimed/sent, skipping duplicate")
+        return
+
+    claimed_notification = True
+    instance.telegram_notification_sent = True
+    logger.info(f"✅ Booking {instance.id} is ready for messenger notification, sending ===")
+    try:
+        from .services.telegram_service import TelegramService
+        from .services.max_service import MaxService
+
+        logger.info("Importing TelegramService and MaxService...")
+        telegram_service = TelegramService()
+        max_service = MaxService()
+        
+        # 1. Отправка в общие чаты/каналы
+        logger.info(f"Services created, sending booking notification for booking {instance.id}...")
+
+        telegram_result = telegram_service.send_booking_notification(instance)
+        if telegram_result:
+            logger.info(f"✅ Telegram channel notification sent for booking {instance.id}")
+        else:
+            logger.warning(f"⚠️ Telegram channel notification returned None for booking {instance.id}")
+
+        max_result = max_service.send_booking_notification(instance)
+        if max_result:
+            logger.info(f"✅ MAX chat notification sent for booking {instance.id}")
+        else:
+            logger.warning(f"⚠️ MAX chat notification returned None for booking {instance.id}")
+        
+        # Личные уведомления: собираем получателей без дублей (одна персона = одно сообщение)
+        # Приоритет: клиент > гид > владелец (клиенту важнее "ваше бронирование подтверждено")
+        recipients = []  # [(user, message_prefix), ...]
+        seen_user_ids = set()
+
+        def add_recipient(user, prefix, role_name):
+            has_any_chat = bool(getattr(user, 'telegram_chat_id', None) or getattr(user, 'max_chat_id', None))
+            if user and has_any_chat and user.id not in seen_user_ids:
+                seen_user_ids.add(user.id)
+                recipients.append((user, prefix, role_name))
+
+        add_recipient(instance.customer, "✅ Ваше бронирование подтверждено!\n\n", "customer")
+        add_recipient(instance.guide, "👥 Новое бронирование с вашей группой!\n\n", "guide")
+        add_recipient(instance.boat.owner, f"🚤 Новое бронирование на ваш катер {instance.boat.name}!\n\n", "boat_owner")
+
+        for user, prefix, role_name in recipients:
+            logger.info(f"Sending personal notification to {role_name} {user.email}")
+            message = prefix + _format_booking_message(instance)
+            telegram_service.send_to_user(user, message)
+            max_service.send_to_user(user, message)
+            
+    except Exception as e:
+        if claimed_notification:
+            # Освобождаем "claim" при ошибке, чтобы была возможность ретрая.
+            Booking.objects.filter(pk=instance.pk).update(telegram_notification_sent=False)
+            instance.telegram_notification_sent = False
+        logger.error(f"❌ Failed to send messenger notification for booking {instance.id}: {str(e)}", exc_info=True)
+    
+    # Создаем событие в Google Calendar после успешной оплаты предоплаты (когда статус PENDING)
+    # Создаем только если событие еще не создано (защита от дублирования при повторных вызовах сигнала)
+    if instance.status == Booking.Status.PENDING and not instance.google_calendar_event_id:
+        logger.info(f"=== Creating Google Calendar event for booking {instance.id} ===")
+        try:
+            # Дополнительная проверка после refresh_from_db - защита от race condition
+            # Используем select_for_update для блокировки записи в транзакции
+            from django.db import transaction
+            with transaction.atomic():
+                # Блокируем запись для обновления, чтобы предотвратить параллельное создание
+                booking = Booking.objects.select_for_update().get(pk=instance.pk)
+                
+                # Проверяем еще раз, что событие не было создано другим процессом
+                if booking.google_calendar_event_id:
+                    logger.warning(f"⚠️ Booking {instance.id} already has calendar event (race condition prevented): {booking.google_calendar_event_id}")
+                    return
+                
+                from .services.google_calendar_service import GoogleCalendarService
+                calendar_service = GoogleCalendarService()
+                event_id = calendar_service.create_event(booking)
+                if event_id:
+                    # Используем update() вместо save() чтобы не вызывать сигнал post_save повторно
+                    Booking.objects.filter(pk=booking.pk).update(google_calendar_event_id=event_id)
+                    # Обновляем локальный объект для дальнейшего использования
+                    instance.google_calendar_event_id = event_id
+                    logger.info(f"✅ Google Calendar event created for booking {instance.id}, event_id={event_id}")
+                else:
+                    logger.warning(f"⚠️ Google Calendar event creation returned None for booking {instance.id}")
+        except Booking.DoesNotExist:
+            logger.error(f"❌ Booking {instance.id} not found when trying to create calendar event")
+        except Exception as e:
+            logger.error(f"❌ Failed to create Google Calendar event for booking {instance.id}: {str(e)}", exc_info=True)
+
+
 # Храним старые значения для отслеживания изменений
 _booking_cache = {}
 
@@ -128,111 +235,13 @@ def send_telegram_notification_on_booking_creation(sender, instance, created, **
         logger.info(f"⏭️ Booking {instance.id} is RESERVED (waiting for deposit payment), skipping messenger notification")
         return
     
-    claimed_notification = False
-
     # Отправляем уведомление только при создании нового бронирования или при переходе в PENDING
     # PENDING означает, что предоплата внесена и места заблокированы
     if created or (not created and instance.status == Booking.Status.PENDING):
-        # Атомарно "бронируем" право на отправку уведомления.
-        # Это защищает от гонки, когда webhook и check_status одновременно обновляют одну бронь.
-        claimed_rows = Booking.objects.filter(
-            pk=instance.pk,
-            telegram_notification_sent=False
-        ).update(telegram_notification_sent=True)
-
-        if claimed_rows == 0:
-            logger.info(f"⏭️ Booking {instance.id} messenger notification already claimed/sent, skipping duplicate")
-            return
-
-        claimed_notification = True
-        instance.telegram_notification_sent = True
-        logger.info(f"✅ Booking {instance.id} is ready for messenger notification, sending ===")
-        try:
-            from .services.telegram_service import TelegramService
-            from .services.max_service import MaxService
-
-            logger.info("Importing TelegramService and MaxService...")
-            telegram_service = TelegramService()
-            max_service = MaxService()
-            
-            # 1. Отправка в общие чаты/каналы
-            logger.info(f"Services created, sending booking notification for booking {instance.id}...")
-
-            telegram_result = telegram_service.send_booking_notification(instance)
-            if telegram_result:
-                logger.info(f"✅ Telegram channel notification sent for booking {instance.id}")
-            else:
-                logger.warning(f"⚠️ Telegram channel notification returned None for booking {instance.id}")
-
-            max_result = max_service.send_booking_notification(instance)
-            if max_result:
-                logger.info(f"✅ MAX chat notification sent for booking {instance.id}")
-            else:
-                logger.warning(f"⚠️ MAX chat notification returned None for booking {instance.id}")
-            
-            # Личные уведомления: собираем получателей без дублей (одна персона = одно сообщение)
-            # Приоритет: клиент > гид > владелец (клиенту важнее "ваше бронирование подтверждено")
-            recipients = []  # [(user, message_prefix), ...]
-            seen_user_ids = set()
-
-            def add_recipient(user, prefix, role_name):
-                has_any_chat = bool(getattr(user, 'telegram_chat_id', None) or getattr(user, 'max_chat_id', None))
-                if user and has_any_chat and user.id not in seen_user_ids:
-                    seen_user_ids.add(user.id)
-                    recipients.append((user, prefix, role_name))
-
-            add_recipient(instance.customer, "✅ Ваше бронирование подтверждено!\n\n", "customer")
-            add_recipient(instance.guide, "👥 Новое бронирование с вашей группой!\n\n", "guide")
-            add_recipient(instance.boat.owner, f"🚤 Новое бронирование на ваш катер {instance.boat.name}!\n\n", "boat_owner")
-
-            for user, prefix, role_name in recipients:
-                logger.info(f"Sending personal notification to {role_name} {user.email}")
-                message = prefix + _format_booking_message(instance)
-                telegram_service.send_to_user(user, message)
-                max_service.send_to_user(user, message)
-                
-        except Exception as e:
-            if claimed_notification:
-                # Освобождаем "claim" при ошибке, чтобы была возможность ретрая.
-                Booking.objects.filter(pk=instance.pk).update(telegram_notification_sent=False)
-                instance.telegram_notification_sent = False
-            logger.error(f"❌ Failed to send messenger notification for booking {instance.id}: {str(e)}", exc_info=True)
-        
-        # Создаем событие в Google Calendar после успешной оплаты предоплаты (когда статус PENDING)
-        # Создаем только если событие еще не создано (защита от дублирования при повторных вызовах сигнала)
-        if instance.status == Booking.Status.PENDING and not instance.google_calendar_event_id:
-            logger.info(f"=== Creating Google Calendar event for booking {instance.id} ===")
-            try:
-                # Дополнительная проверка после refresh_from_db - защита от race condition
-                # Используем select_for_update для блокировки записи в транзакции
-                from django.db import transaction
-                with transaction.atomic():
-                    # Блокируем запись для обновления, чтобы предотвратить параллельное создание
-                    booking = Booking.objects.select_for_update().get(pk=instance.pk)
-                    
-                    # Проверяем еще раз, что событие не было создано другим процессом
-                    if booking.google_calendar_event_id:
-                        logger.warning(f"⚠️ Booking {instance.id} already has calendar event (race condition prevented): {booking.google_calendar_event_id}")
-                        return
-                    
-                    from .services.google_calendar_service import GoogleCalendarService
-                    calendar_service = GoogleCalendarService()
-                    event_id = calendar_service.create_event(booking)
-                    if event_id:
-                        # Используем update() вместо save() чтобы не вызывать сигнал post_save повторно
-                        Booking.objects.filter(pk=booking.pk).update(google_calendar_event_id=event_id)
-                        # Обновляем локальный объект для дальнейшего использования
-                        instance.google_calendar_event_id = event_id
-                        logger.info(f"✅ Google Calendar event created for booking {instance.id}, event_id={event_id}")
-                    else:
-                        logger.warning(f"⚠️ Google Calendar event creation returned None for booking {instance.id}")
-            except Booking.DoesNotExist:
-                logger.error(f"❌ Booking {instance.id} not found when trying to create calendar event")
-            except Exception as e:
-                logger.error(f"❌ Failed to create Google Calendar event for booking {instance.id}: {str(e)}", exc_info=True)
+        _send_new_booking_notifications(instance)
     else:
         logger.info(f"Booking {instance.id} is not new (created=False), skipping notification")
-    
+
     # Обновляем событие в Google Calendar при изменении бронирования
     if not created and instance.google_calendar_event_id and instance.status != Booking.Status.CANCELLED:
         old_data = _booking_cache.get(instance.pk)
@@ -268,4 +277,53 @@ def send_telegram_notification_on_booking_creation(sender, instance, created, **
                     logger.error(f"❌ Failed to update Google Calendar event for booking {instance.id}: {str(e)}", exc_info=True)
         
         # Очищаем кэш
-        _booking_cache.pop(instance.pk, None)
\ No newline at end of file
+        _booking_cache.pop(instance.pk, None)
+
+
+# Поля, изменение которых переходом статуса требует обновить событие в Google Calendar
+CALENDAR_EVENT_FIELDS = {'deposit', 'remaining_amount', 'notes'}
+
+
+@receiver(booking_status_changed, sender=Booking)
+def handle_booking_status_change(sender, booking, from_status, to_status, changed_fields, **kwargs):
+    """
+    Побочные эффекты перехода статуса (services.transitions.transition).
+    Заменяет post_save для изменений статуса, выполненных условным UPDATE.
+    """
+    if booking.notes and booking.notes.startswith("[БЛОКИРОВКА]"):
+        return
+
+    if to_status == Booking.Status.PENDING:
+        _send_new_booking_notifications(booking)
+        return
+
+    # Удаляем событие из Google Calendar при отмене
+    if to_status == Booking.Status.CANCELLED and booking.google_calendar_event_id:
+        try:
+            from .services.google_calendar_service import GoogleCalendarService
+            calendar_service = GoogleCalendarService()
+            if calendar_service.delete_event(booking):
+                logger.info(f"✅ Google Calendar event deleted for booking {booking.id}")
+                # Очищаем event_id после успешного удаления
+                Booking.objects.filter(pk=booking.pk).update(google_calendar_event_id=None)
+                booking.google_calendar_event_id = None
+            else:
+                logger.warning(f"⚠️ Failed to delete Google Calendar event for booking {booking.id}")
+        except Exception as e:
+            logger.error(f"❌ Failed to delete Google Calendar event for booking {booking.id}: {str(e)}", exc_info=True)
+        return
+
+    if (
+        to_status != Booking.Status.CANCELLED and
+        booking.google_calendar_event_id and
+        changed_fields & CALENDAR_EVENT_FIELDS
+    ):
+        try:
+            from .services.google_calendar_service import GoogleCalendarService
+            calendar_service = GoogleCalendarService()
+            if calendar_service.update_event(booking):
+                logger.info(f"✅ Google Calendar event updated after status change for booking {booking.id}")
+            else:
+                logger.warning(f"⚠️ Failed to update Google Calendar event for booking {booking.id}")
+        except Exception as e:
+            logger.error(f"❌ Failed to update Google Calendar event for booking {booking.id}: {str(e)}", exc_info=True)
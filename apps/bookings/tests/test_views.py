@@ -6,6 +6,7 @@ from django.urls import reverse
 from rest_framework import status
 from datetime import datetime, timedelta
 from apps.bookings.models import Booking
+from apps.boats.models import BoatAvailability
 
 
 @pytest.mark.django_db
@@ -62,6 +63,7 @@ class TestBookingCreate:
         # Создаем первое бронирование
         Booking.objects.create(
             boat=boat,
+            availability=boat_availability,
             start_datetime=datetime.combine(boat_availability.departure_date, boat_availability.departure_time),
             end_datetime=datetime.combine(boat_availability.departure_date, boat_availability.return_time),
             duration_hours=2,
@@ -168,3 +170,1170 @@ class TestBookingPayRemaining:
         response = customer_client.post(url, {'payment_method': 'online'}, format='json')
         assert response.status_code == status.HTTP_400_BAD_REQUEST
 
+
+
+def _add_bookings_with_payments(booking, count):
+    """Создает копии бронирования с платежами и причалом у судна"""
+    from apps.boats.models import Dock
+    from apps.payments.models import Payment
+
+    if booking.boat.dock_id is None:
+        booking.boat.dock = Dock.objects.create(name='Тестовый причал')
+        booking.boat.save(update_fields=['dock'])
+
+    for i in range(count):
+        booking.pk = None
+        booking.save()
+        Payment.objects.create(
+            booking=booking,
+            payment_id=f'test_{booking.pk}_{i}',
+            order_id=f'booking_{booking.pk}_deposit_{i}',
+            amount=booking.deposit,
+            payment_type=Payment.PaymentType.DEPOSIT,
+            status=Payment.Status.CONFIRMED,
+        )
+
+
+@pytest.mark.django_db
+class TestBookingListQueries:
+    """Тесты количества запросов в списке бронирований"""
+
+    def test_list_queries_do_not_grow(self, customer_client, booking):
+        """Количество запросов не зависит от числа бронирований"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        url = reverse('bookings:booking-list')
+        _add_bookings_with_payments(booking, 1)
+        with CaptureQueriesContext(connection) as small:
+            response = customer_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+
+        _add_bookings_with_payments(booking, 5)
+        with CaptureQueriesContext(connection) as large:
+            response = customer_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['count'] == 7
+        assert all(item['payments'] for item in response.data['results'][:6])
+        assert len(large.captured_queries) == len(small.captured_queries)
+
+
+@pytest.fixture
+def tbank_init(settings, monkeypatch):
+    """Подменяет Init Т-Банка и считает вызовы"""
+    from django.core.cache import cache
+    from apps.payments.services import TBankService
+
+    cache.clear()
+    settings.TBANK_TERMINAL_KEY = 'test_terminal'
+    settings.TBANK_PASSWORD = 'test_password'
+    calls = []
+
+    def fake_init_payment(self, amount, order_id, **kwargs):
+        calls.append(order_id)
+        return {
+            'PaymentId': f'pay_{len(calls)}',
+            'PaymentURL': f'https://securepay.tinkoff.ru/new/{len(calls)}',
+            'Status': 'NEW',
+            'OrderId': order_id,
+            'Amount': int(amount * 100),
+            'raw_response': {},
+        }
+
+    monkeypatch.setattr(TBankService, 'init_payment', fake_init_payment)
+    return calls
+
+
+@pytest.mark.django_db
+class TestBookingIdempotency:
+    """Тесты повторов создания бронирования с Idempotency-Key"""
+
+    def _data(self, boat_availability):
+        return {
+            'trip_id': boat_availability.id,
+            'number_of_people': 2,
+            'guest_name': 'Повтор',
+            'guest_phone': '+79001234576'
+        }
+
+    def test_retry_returns_original_booking(self, customer_client, boat_with_pricing, boat_availability, tbank_init):
+        """Повтор с тем же ключом не создает бронь и не вызывает Т-Банк"""
+        url = reverse('bookings:booking-list')
+        data = self._data(boat_availability)
+        first = customer_client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='retry-1')
+        second = customer_client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='retry-1')
+
+        assert first.status_code == status.HTTP_201_CREATED
+        assert second.status_code == status.HTTP_201_CREATED
+        assert second['Idempotent-Replayed'] == 'true'
+        assert second.data['id'] == first.data['id']
+        assert second.data['payment_url'] == first.data['payment_url']
+        assert Booking.objects.filter(guest_name='Повтор').count() == 1
+        assert len(tbank_init) == 1
+
+    def test_key_reused_with_other_body(self, customer_client, boat_with_pricing, boat_availability, tbank_init):
+        """Тот же ключ с другими данными отклоняется"""
+        url = reverse('bookings:booking-list')
+        data = self._data(boat_availability)
+        customer_client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='retry-2')
+        data['number_of_people'] = 3
+        response = customer_client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='retry-2')
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert len(tbank_init) == 1
+
+    def test_key_stored_in_database(self, customer_client, customer_user, boat_with_pricing,
+                                    boat_availability, tbank_init):
+        """Ключ хранится в БД: повтор распознается и без общего кеша (другой воркер)"""
+        from django.core.cache import cache
+        from apps.bookings.models import IdempotencyKey
+
+        url = reverse('bookings:booking-list')
+        data = self._data(boat_availability)
+        first = customer_client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='retry-3')
+        cache.clear()
+        second = customer_client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='retry-3')
+
+        assert second['Idempotent-Replayed'] == 'true'
+        assert second.data['id'] == first.data['id']
+        record = IdempotencyKey.objects.get(user=customer_user, scope='booking_create')
+        assert record.state == IdempotencyKey.State.DONE
+        assert len(tbank_init) == 1
+
+    def test_processing_and_expired_keys(self, customer_client, customer_user, boat_with_pricing,
+                                         boat_availability, tbank_init):
+        """Захваченный ключ дает 409, истекший захват освобождается и удаляется командой"""
+        from datetime import timedelta
+        from io import StringIO
+        from django.core.management import call_command
+        from django.utils import timezone
+        from apps.bookings.models import IdempotencyKey
+        from apps.bookings.services.idempotency import _key_digest, request_fingerprint
+
+        url = reverse('bookings:booking-list')
+        data = self._data(boat_availability)
+        record = IdempotencyKey.objects.create(
+            user=customer_user,
+            scope='booking_create',
+            key=_key_digest('retry-4'),
+            fingerprint=request_fingerprint(data),
+            expires_at=timezone.now() + timedelta(minutes=1),
+        )
+        response = customer_client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='retry-4')
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert len(tbank_init) == 0
+
+        # Воркер, захвативший ключ, упал - после истечения захвата запрос выполняется
+        IdempotencyKey.objects.filter(pk=record.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        response = customer_client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='retry-4')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert len(tbank_init) == 1
+
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        call_command('prune_idempotency_keys', stdout=StringIO())
+        assert not IdempotencyKey.objects.exists()
+
+
+@pytest.mark.django_db
+class TestAsyncPaymentInit:
+    """Тесты асинхронной инициализации платежа (Prefer: respond-async)"""
+
+    def _create(self, client, boat_availability, capture):
+        url = reverse('bookings:booking-list')
+        data = {
+            'trip_id': boat_availability.id,
+            'number_of_people': 2,
+            'guest_name': 'Фоновая оплата',
+            'guest_phone': '+79001234579'
+        }
+        with capture(execute=True):
+            return client.post(url, data, format='json', HTTP_PREFER='respond-async')
+
+    def test_booking_returned_before_init(self, customer_client, boat_with_pricing, boat_availability,
+                                          tbank_init, settings, django_capture_on_commit_callbacks):
+        """Бронь возвращается сразу, ссылка на оплату появляется в init_status"""
+        settings.PAYMENT_INIT_WORKERS = 0
+        response = self._create(customer_client, boat_availability, django_capture_on_commit_callbacks)
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['payment_url'] is None
+        assert response.data['payment']['status'] == 'initializing'
+        assert len(tbank_init) == 1
+
+        status_response = customer_client.get(response.data['payment']['status_url'])
+        assert status_response.status_code == status.HTTP_200_OK
+        assert status_response.data['is_ready'] is True
+        assert status_response.data['status'] == 'new'
+        assert status_response.data['payment_url'] == 'https://securepay.tinkoff.ru/new/1'
+
+    def test_init_error_cancels_booking(self, customer_client, boat_with_pricing, boat_availability,
+                                        settings, monkeypatch, django_capture_on_commit_callbacks):
+        """Ошибка Init в фоне отменяет RESERVED бронь и видна в init_status"""
+        from apps.payments.services import TBankService
+
+        settings.TBANK_TERMINAL_KEY = 'test_terminal'
+        settings.TBANK_PASSWORD = 'test_password'
+        settings.PAYMENT_INIT_WORKERS = 0
+
+        def failing_init_payment(self, amount, order_id, **kwargs):
+            raise ConnectionError('Gateway timeout')
+
+        monkeypatch.setattr(TBankService, 'init_payment', failing_init_payment)
+        response = self._create(customer_client, boat_availability, django_capture_on_commit_callbacks)
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert Booking.objects.get(pk=response.data['id']).status == Booking.Status.CANCELLED
+
+        status_response = customer_client.get(response.data['payment']['status_url'])
+        assert status_response.data['status'] == 'init_failed'
+        assert status_response.data['is_failed'] is True
+        assert status_response.data['is_ready'] is False
+
+    def test_lost_init_failed_by_reconcile(self, customer_client, boat_with_pricing, boat_availability,
+                                           settings, django_capture_on_commit_callbacks):
+        """Платеж, чья задача Init потеряна, reconcile_payments переводит в init_failed"""
+        from io import StringIO
+        from django.core.management import call_command
+        from django.utils import timezone
+        from apps.payments.models import Payment
+
+        # Задача Init не выполняется: имитация перезапуска процесса до ее запуска
+        settings.PAYMENT_INIT_ASYNC = True
+        settings.PAYMENT_INIT_TIMEOUT = 300
+        url = reverse('bookings:booking-list')
+        data = {
+            'trip_id': boat_availability.id,
+            'number_of_people': 2,
+            'guest_name': 'Потерянный Init',
+            'guest_phone': '+79001234579'
+        }
+        with django_capture_on_commit_callbacks(execute=False):
+            lost = customer_client.post(url, data, format='json')
+            fresh = customer_client.post(url, data, format='json')
+        Payment.objects.filter(pk=lost.data['payment']['id']).update(
+            created_at=timezone.now() - timedelta(seconds=301)
+        )
+
+        out = StringIO()
+        call_command('reconcile_payments', '--min-age', '0', '--rate', '0', stdout=out)
+
+        assert 'init_failed: 1' in out.getvalue()
+        assert Payment.objects.get(pk=lost.data['payment']['id']).status == Payment.Status.INIT_FAILED
+        assert Booking.objects.get(pk=lost.data['id']).status == Booking.Status.CANCELLED
+        assert Payment.objects.get(pk=fresh.data['payment']['id']).status == Payment.Status.INITIALIZING
+        assert Booking.objects.get(pk=fresh.data['id']).status == Booking.Status.RESERVED
+
+        status_response = customer_client.get(lost.data['payment']['status_url'])
+        assert status_response.data['is_failed'] is True
+
+
+@pytest.mark.django_db
+class TestTBankInitRequest:
+    """Init через настоящий TBankService: подменяется только HTTP-запрос"""
+
+    def test_init_payment_with_redirect_due_date(self, booking, settings, monkeypatch):
+        """Все аргументы init_booking_payment принимаются init_payment и попадают в запрос Init"""
+        from decimal import Decimal
+        from unittest import mock
+        from django.utils import timezone
+        from apps.payments.models import Payment
+        from apps.payments.services import tbank_service
+        from apps.payments.services.payment_init import init_booking_payment
+
+        settings.TBANK_TERMINAL_KEY = 'test_terminal'
+        settings.TBANK_PASSWORD = 'test_password'
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {
+            'Success': True, 'ErrorCode': '0', 'Status': 'NEW', 'PaymentId': '100500',
+            'OrderId': 'order', 'PaymentURL': 'https://securepay.tinkoff.ru/new/100500',
+        }
+        post = mock.Mock(return_value=response)
+        monkeypatch.setattr(tbank_service.requests, 'post', post)
+
+        due = timezone.now() + timedelta(minutes=30)
+        payment = init_booking_payment(
+            booking, Payment.PaymentType.DEPOSIT, Decimal('1000.00'), 'Предоплата', 'deposit',
+            customer_email='customer@test.com', redirect_due_date=due,
+        )
+
+        assert payment.payment_id == '100500'
+        assert post.call_count == 1
+        sent = post.call_args.kwargs['json']
+        assert post.call_args.args[0].endswith('/Init')
+        assert sent['Amount'] == 100000
+        assert sent['RedirectDueDate'] == timezone.localtime(due).isoformat(timespec='seconds')
+        assert sent['Receipt']['Items'][0]['Amount'] == 100000
+        assert sent['Token'] == tbank_service.TBankService().generate_token(sent)
+
+
+@pytest.mark.django_db
+class TestSeatHolds:
+    """Тесты удержания мест неоплаченными (RESERVED) бронированиями"""
+
+    def _reserve(self, boat_availability, customer_user, hold_expires_at):
+        """Создает RESERVED бронь на 10 мест рейса"""
+        from decimal import Decimal
+        start_datetime = datetime.combine(boat_availability.departure_date, boat_availability.departure_time)
+        end_datetime = datetime.combine(boat_availability.departure_date, boat_availability.return_time)
+        return Booking.objects.create(
+            boat=boat_availability.boat,
+            availability=boat_availability,
+            start_datetime=start_datetime,
+            end_datetime=end_datetime,
+            duration_hours=2,
+            event_type='Выход в море',
+            customer=customer_user,
+            number_of_people=10,
+            guest_name='Удержание',
+            guest_phone='+79001234577',
+            price_per_person=Decimal('4000'),
+            deposit=Decimal('10000'),
+            status=Booking.Status.RESERVED,
+            hold_expires_at=hold_expires_at
+        )
+
+    def _data(self, boat_availability):
+        return {
+            'trip_id': boat_availability.id,
+            'number_of_people': 2,
+            'guest_name': 'Второй клиент',
+            'guest_phone': '+79001234578'
+        }
+
+    def test_active_hold_takes_seats(self, customer_client, customer_user, boat_with_pricing, boat_availability, tbank_init):
+        """Действующее удержание учитывается при проверке свободных мест"""
+        from django.utils import timezone
+        self._reserve(boat_availability, customer_user, timezone.now() + timedelta(minutes=10))
+
+        url = reverse('bookings:booking-list')
+        response = customer_client.post(url, self._data(boat_availability), format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert tbank_init == []
+
+    def test_expired_hold_frees_seats(self, customer_client, customer_user, boat_with_pricing, boat_availability, tbank_init):
+        """Истекшее удержание не занимает места"""
+        from django.utils import timezone
+        self._reserve(boat_availability, customer_user, timezone.now() - timedelta(minutes=1))
+
+        url = reverse('bookings:booking-list')
+        response = customer_client.post(url, self._data(boat_availability), format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+
+    def test_deposit_payment_converts_hold(self, customer_client, boat_with_pricing, boat_availability, tbank_init):
+        """Оплата предоплаты переводит бронь в PENDING и снимает срок удержания"""
+        from django.db import transaction
+        from apps.payments.models import Payment
+        from apps.payments.services.payment_status import apply_paid_booking_effects
+
+        url = reverse('bookings:booking-list')
+        response = customer_client.post(url, self._data(boat_availability), format='json')
+        booking = Booking.objects.get(pk=response.data['id'])
+        assert booking.status == Booking.Status.RESERVED
+        assert booking.hold_expires_at is not None
+
+        with transaction.atomic():
+            payment = Payment.objects.select_for_update().select_related('booking').get(booking=booking)
+            payment.status = Payment.Status.CONFIRMED
+            apply_paid_booking_effects(payment)
+            payment.save()
+
+        booking.refresh_from_db()
+        assert booking.status == Booking.Status.PENDING
+        assert booking.hold_expires_at is None
+
+
+@pytest.mark.django_db
+class TestPaymentWebhookQueue:
+    """Тесты приема уведомлений Т-Банка через очередь"""
+
+    def _post(self, client, data, capture):
+        with capture(execute=True):
+            return client.post(reverse('payment-webhook'), data, format='json')
+
+    def test_webhook_acks_and_dedupes(self, api_client, customer_client, boat_with_pricing, boat_availability,
+                                      tbank_init, settings, monkeypatch, django_capture_on_commit_callbacks):
+        """Уведомление подтверждается, применяется в фоне, повтор не обрабатывается"""
+        from apps.payments.models import Payment, PaymentNotification
+        from apps.payments.services import TBankService
+        from apps.payments.services.notifications import queue_metrics
+
+        settings.PAYMENT_WEBHOOK_WORKERS = 0
+        monkeypatch.setattr(TBankService, 'verify_notification', lambda self, data: True)
+        response = customer_client.post(reverse('bookings:booking-list'), {
+            'trip_id': boat_availability.id,
+            'number_of_people': 2,
+            'guest_name': 'Вебхук',
+            'guest_phone': '+79001234580'
+        }, format='json')
+        payment_id = response.data['payment_id']
+
+        data = {'PaymentId': payment_id, 'Status': 'CONFIRMED', 'Success': True, 'Token': 'token'}
+        first = self._post(api_client, data, django_capture_on_commit_callbacks)
+        second = self._post(api_client, data, django_capture_on_commit_callbacks)
+
+        assert first.status_code == second.status_code == 200
+        assert first.content == second.content == b'OK'
+        assert PaymentNotification.objects.filter(payment_id=payment_id).count() == 1
+        assert Payment.objects.get(payment_id=payment_id).status == Payment.Status.CONFIRMED
+        assert Booking.objects.get(pk=response.data['id']).status == Booking.Status.PENDING
+
+        metrics = queue_metrics()
+        assert metrics['queue_depth'] == 0
+        assert metrics['processed'] == 1
+
+    def test_unknown_payment_stays_queued(self, api_client, settings, monkeypatch, django_capture_on_commit_callbacks):
+        """Уведомление по неизвестному платежу остается в очереди для повторной обработки"""
+        from apps.payments.models import PaymentNotification
+        from apps.payments.services import TBankService
+        from apps.payments.services.notifications import queue_metrics
+
+        settings.TBANK_TERMINAL_KEY = 'test_terminal'
+        settings.TBANK_PASSWORD = 'test_password'
+        settings.PAYMENT_WEBHOOK_WORKERS = 0
+        monkeypatch.setattr(TBankService, 'verify_notification', lambda self, data: True)
+
+        response = self._post(api_client, {'PaymentId': 'missing', 'Status': 'CONFIRMED'}, django_capture_on_commit_callbacks)
+
+        assert response.status_code == 200
+        notification = PaymentNotification.objects.get(payment_id='missing')
+        assert notification.processed_at is None
+        assert notification.attempts == 1
+        assert queue_metrics()['queue_depth'] == 1
+
+    def test_stale_status_ignored(self, api_client, booking, settings, monkeypatch,
+                                  django_capture_on_commit_callbacks):
+        """AUTHORIZED, пришедший после CONFIRMED, не откатывает статус платежа"""
+        from apps.payments.models import Payment, PaymentEvent
+        from apps.payments.services import TBankService
+
+        settings.TBANK_TERMINAL_KEY = 'test_terminal'
+        settings.TBANK_PASSWORD = 'test_password'
+        settings.PAYMENT_WEBHOOK_WORKERS = 0
+        monkeypatch.setattr(TBankService, 'verify_notification', lambda self, data: True)
+        Payment.objects.create(
+            booking=booking, payment_id='777', order_id='order_777', amount=booking.deposit,
+            payment_type=Payment.PaymentType.DEPOSIT, status=Payment.Status.NEW,
+        )
+
+        def post(tbank_status):
+            data = {'PaymentId': 777, 'OrderId': 'order_777', 'Status': tbank_status, 'Token': tbank_status}
+            response = self._post(api_client, data, django_capture_on_commit_callbacks)
+            assert response.status_code == 200
+            return Payment.objects.get(payment_id='777')
+
+        assert post('CONFIRMED').status == Payment.Status.CONFIRMED
+        payment = post('AUTHORIZED')
+        assert payment.status == Payment.Status.CONFIRMED
+        assert payment.paid_at is not None
+        # Переход вперед (возврат после оплаты) применяется
+        assert post('REFUNDED').status == Payment.Status.REFUNDED
+        # Устаревшее уведомление все равно сохраняется в журнал
+        assert PaymentEvent.objects.filter(payment_id='777').count() == 3
+
+    def test_simulator_sends_payment_notifications_in_order(self, settings, monkeypatch):
+        """Симулятор отправляет AUTHORIZED и CONFIRMED одного платежа последовательно"""
+        from apps.payments.services.tbank_simulator import TBankSimulator
+
+        settings.TBANK_TERMINAL_KEY = 'test_terminal'
+        settings.TBANK_PASSWORD = 'test_password'
+        simulator = TBankSimulator(port=0, webhook_url='http://webhook', webhook_workers=4, webhook_duplicates=2)
+        sent = []
+        monkeypatch.setattr(simulator, '_send_webhook', lambda url, notification: sent.append(notification['Status']))
+        try:
+            response = simulator._init({'OrderId': 'order_1', 'Amount': 100000})
+            assert simulator.pay(response['PaymentId']) == 'CONFIRMED'
+        finally:
+            simulator._webhooks.shutdown(wait=True)
+            simulator.server.server_close()
+
+        assert sent == ['AUTHORIZED', 'AUTHORIZED', 'CONFIRMED', 'CONFIRMED']
+
+
+@pytest.mark.django_db
+class TestPaymentEventLog:
+    """Тесты журнала ответов Т-Банка и срока его хранения"""
+
+    def test_webhook_recorded_compressed(self, api_client, booking, settings, monkeypatch,
+                                        django_capture_on_commit_callbacks):
+        """Уведомление сохраняется в журнал в сжатом виде, в Payment остаются только поля"""
+        import json
+        from apps.payments.models import Payment, PaymentEvent
+        from apps.payments.services import TBankService
+
+        settings.TBANK_TERMINAL_KEY = 'test_terminal'
+        settings.TBANK_PASSWORD = 'test_password'
+        settings.PAYMENT_WEBHOOK_WORKERS = 0
+        monkeypatch.setattr(TBankService, 'verify_notification', lambda self, data: True)
+        Payment.objects.create(
+            booking=booking, payment_id='555', order_id='order_555', amount=booking.deposit,
+            payment_type=Payment.PaymentType.DEPOSIT, status=Payment.Status.NEW,
+        )
+
+        data = {'PaymentId': 555, 'OrderId': 'order_555', 'Status': 'REJECTED', 'ErrorCode': '1051',
+                'Message': 'Недостаточно средств', 'Pan': '430000******0777', 'Token': 'token'}
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(reverse('payment-webhook'), data, format='json')
+
+        assert response.status_code == 200
+        payment = Payment.objects.get(payment_id='555')
+        assert payment.status == Payment.Status.REJECTED
+        assert payment.error_code == '1051'
+
+        event = PaymentEvent.objects.get(payment_id='555')
+        assert event.source == PaymentEvent.Source.WEBHOOK
+        assert event.status == 'rejected'
+        assert event.order_id == 'order_555'
+        assert event.data == data
+        assert len(bytes(event.payload)) < len(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+    def test_prune_respects_retention(self, settings):
+        """Удаляются только старые записи журнала и старые обработанные уведомления"""
+        from io import StringIO
+        from django.core.management import call_command
+        from django.utils import timezone
+        from apps.payments.models import PaymentEvent, PaymentNotification
+        from apps.payments.services.payment_events import record_payment_event
+
+        settings.PAYMENT_EVENT_RETENTION_DAYS = 180
+        old_event = record_payment_event(PaymentEvent.Source.STATE, {'PaymentId': '1', 'Status': 'CONFIRMED'})
+        fresh_event = record_payment_event(PaymentEvent.Source.STATE, {'PaymentId': '2', 'Status': 'NEW'})
+        PaymentEvent.objects.filter(pk=old_event.pk).update(created_at=timezone.now() - timedelta(days=181))
+
+        long_ago = timezone.now() - timedelta(days=60)
+        PaymentNotification.objects.create(payment_id='1', status='confirmed', payload={}, processed_at=long_ago)
+        PaymentNotification.objects.create(payment_id='2', status='confirmed', payload={})
+        PaymentNotification.objects.filter(payment_id__in=['1', '2']).update(received_at=long_ago)
+
+        out = StringIO()
+        call_command('prune_payment_events', '--dry-run', stdout=out)
+        assert PaymentEvent.objects.count() == 2
+
+        call_command('prune_payment_events', '--batch-size', '1', stdout=out)
+        assert list(PaymentEvent.objects.values_list('pk', flat=True)) == [fresh_event.pk]
+        # Необработанное уведомление остается в очереди
+        assert list(PaymentNotification.objects.values_list('payment_id', flat=True)) == ['2']
+
+
+@pytest.mark.django_db
+class TestReconcilePayments:
+    """Тесты сверки незавершенных платежей с Т-Банком"""
+
+    def test_reconciles_stuck_payments(self, booking, settings, monkeypatch):
+        """Оплаченный платеж применяется к брони, ошибка Т-Банка не прерывает сверку"""
+        from io import StringIO
+        from django.core.management import call_command
+        from apps.payments.models import Payment
+        from apps.payments.services import TBankService
+
+        settings.TBANK_TERMINAL_KEY = 'test_terminal'
+        settings.TBANK_PASSWORD = 'test_password'
+        Booking.objects.filter(pk=booking.pk).update(status=Booking.Status.RESERVED)
+        states = {'pay_paid': 'CONFIRMED', 'pay_waiting': 'FORM_SHOWED'}
+
+        def fake_get_payment_state(self, payment_id):
+            if payment_id not in states:
+                raise ConnectionError('Gateway timeout')
+            return {'Status': states[payment_id], 'PaymentId': payment_id, 'raw_response': {}}
+
+        monkeypatch.setattr(TBankService, 'get_payment_state', fake_get_payment_state)
+
+        for payment_id in ('pay_paid', 'pay_waiting', 'pay_error'):
+            Payment.objects.create(
+                booking=booking,
+                payment_id=payment_id,
+                order_id=f'order_{payment_id}',
+                amount=booking.deposit,
+                payment_type=Payment.PaymentType.DEPOSIT,
+                status=Payment.Status.NEW,
+            )
+
+        out = StringIO()
+        call_command('reconcile_payments', '--min-age', '0', '--rate', '0', '--batch-size', '2', stdout=out)
+
+        assert Payment.objects.get(payment_id='pay_paid').status == Payment.Status.CONFIRMED
+        assert Payment.objects.get(payment_id='pay_waiting').status == Payment.Status.FORM_SHOWED
+        assert Payment.objects.get(payment_id='pay_error').status == Payment.Status.NEW
+        assert Booking.objects.get(pk=booking.pk).status == Booking.Status.PENDING
+        assert 'Проверено: 3, изменился статус: 2, оплачено: 1, ошибок Т-Банка: 1' in out.getvalue()
+
+
+@pytest.mark.django_db
+class TestCachedPaymentStatus:
+    """Тесты check_status: статус из БД и обращения к Т-Банку только за устаревшими платежами"""
+
+    @pytest.fixture
+    def get_state_calls(self, settings, monkeypatch):
+        from django.core.cache import cache
+        from apps.payments.services import TBankService
+
+        cache.clear()
+        settings.TBANK_TERMINAL_KEY = 'test_terminal'
+        settings.TBANK_PASSWORD = 'test_password'
+        calls = []
+
+        def fake_get_payment_state(self, payment_id):
+            calls.append(payment_id)
+            return {'Status': 'FORM_SHOWED', 'PaymentId': payment_id, 'raw_response': {}}
+
+        monkeypatch.setattr(TBankService, 'get_payment_state', fake_get_payment_state)
+        return calls
+
+    def _payment(self, booking, status_value):
+        from apps.payments.models import Payment
+        return Payment.objects.create(
+            booking=booking,
+            payment_id=f'pay_{status_value}',
+            order_id=f'order_{status_value}',
+            amount=booking.deposit,
+            payment_type=Payment.PaymentType.DEPOSIT,
+            status=status_value,
+        )
+
+    def test_fresh_and_final_served_from_db(self, customer_client, booking, get_state_calls):
+        """Недавно обновленный и финальный статусы не запрашиваются у Т-Банка"""
+        from apps.payments.models import Payment
+        fresh = self._payment(booking, Payment.Status.NEW)
+        final = self._payment(booking, Payment.Status.REJECTED)
+
+        for payment in (fresh, final):
+            response = customer_client.get(reverse('payment-check-status', args=[payment.pk]))
+            assert response.status_code == status.HTTP_200_OK
+            assert response.data['status'] == payment.status
+        assert get_state_calls == []
+
+    def test_stale_payment_refreshed_once(self, customer_client, booking, get_state_calls):
+        """Устаревший незавершенный статус обновляется из Т-Банка, следующий опрос идет из БД"""
+        from django.utils import timezone
+        from apps.payments.models import Payment
+        payment = self._payment(booking, Payment.Status.NEW)
+        Payment.objects.filter(pk=payment.pk).update(updated_at=timezone.now() - timedelta(minutes=1))
+
+        url = reverse('payment-check-status', args=[payment.pk])
+        first = customer_client.get(url)
+        second = customer_client.get(url)
+
+        assert first.data['status'] == second.data['status'] == Payment.Status.FORM_SHOWED
+        assert get_state_calls == [payment.payment_id]
+
+    def test_concurrent_poll_waits_for_running_request(self, booking, get_state_calls, monkeypatch):
+        """Пока GetState выполняет другой запрос, опрос не обращается к Т-Банку повторно"""
+        from django.core.cache import cache
+        from django.utils import timezone
+        from apps.payments.models import Payment
+        from apps.payments.services import payment_status
+
+        monkeypatch.setattr(payment_status, 'REFRESH_LOCK_TIMEOUT', 0.2)
+        monkeypatch.setattr(payment_status, 'POLL_INTERVAL', 0.05)
+        payment = self._payment(booking, Payment.Status.NEW)
+        Payment.objects.filter(pk=payment.pk).update(updated_at=timezone.now() - timedelta(minutes=1))
+        payment.refresh_from_db()
+        cache.add(f'payment_state_refresh_{payment.pk}', True, 10)
+
+        result = payment_status.refresh_payment_status(payment)
+
+        assert result.status == Payment.Status.NEW
+        assert get_state_calls == []
+
+    def test_waiter_retries_when_running_request_fails(self, booking, get_state_calls, monkeypatch):
+        """Если GetState у первого запроса упал, ожидающий не ждет весь таймаут, а повторяет запрос сам"""
+        import time
+        from django.core.cache import cache
+        from django.utils import timezone
+        from apps.payments.models import Payment
+        from apps.payments.services import payment_status
+
+        payment = self._payment(booking, Payment.Status.NEW)
+        Payment.objects.filter(pk=payment.pk).update(updated_at=timezone.now() - timedelta(minutes=1))
+        payment.refresh_from_db()
+        lock_key = f'payment_state_refresh_{payment.pk}'
+        cache.add(lock_key, True, 10)
+
+        def holder_failed(seconds):
+            # Первый запрос получил ошибку GetState: строка не обновлена, блокировка снята в finally
+            cache.delete(lock_key)
+
+        monkeypatch.setattr(payment_status.time, 'sleep', holder_failed)
+        started = time.monotonic()
+        result = payment_status.refresh_payment_status(payment)
+
+        assert time.monotonic() - started < 1
+        assert result.status == Payment.Status.FORM_SHOWED
+        assert get_state_calls == [payment.payment_id]
+        assert cache.get(lock_key) is None
+
+
+class TestTBankSimulator:
+    """Тесты имитатора Т-Банка через настоящий TBankService"""
+
+    @pytest.fixture
+    def simulator(self, settings):
+        from apps.payments.services.tbank_simulator import TBankSimulator
+
+        settings.TBANK_TERMINAL_KEY = 'test_terminal'
+        settings.TBANK_PASSWORD = 'test_password'
+        simulator = TBankSimulator(port=0, send_webhooks=False)
+        simulator.start()
+        settings.TBANK_API_URL = f'{simulator.base_url}/v2'
+        yield simulator
+        simulator.shutdown()
+
+    def test_payment_lifecycle(self, simulator):
+        """Init, оплата, GetState и Cancel с проверкой подписи; уведомление проходит verify_notification"""
+        from decimal import Decimal
+        from apps.payments.services import TBankService
+
+        service = TBankService()
+        result = service.init_payment(
+            amount=Decimal('2000'),
+            order_id='booking_1_deposit_1',
+            description='Предоплата',
+            success_url='http://localhost/success',
+            fail_url='http://localhost/fail',
+        )
+        payment_id = result['PaymentId']
+        assert result['Status'] == 'NEW'
+        assert result['PaymentURL'].endswith(f'/pay/{payment_id}')
+
+        assert simulator.pay(payment_id) == 'CONFIRMED'
+        assert service.get_payment_state(payment_id)['Status'] == 'CONFIRMED'
+        assert service.verify_notification(simulator.build_notification(payment_id)) is True
+        assert service.cancel_payment(payment_id)['Status'] == 'REFUNDED'
+
+    def test_rejects_invalid_token(self, simulator, settings):
+        """Запрос с чужим паролем отклоняется как настоящий шлюз"""
+        from apps.payments.services import TBankService
+        from apps.payments.services.tbank_service import TBankAPIException
+
+        settings.TBANK_PASSWORD = 'wrong_password'
+        with pytest.raises(TBankAPIException, match='204'):
+            TBankService().get_payment_state('1')
+        assert simulator.summary()['invalid_tokens'] == 1
+
+
+@pytest.mark.django_db
+class TestBookingAvailabilityLink:
+    """Тесты привязки бронирования к рейсу (BoatAvailability)"""
+
+    def test_created_booking_linked_to_trip(self, customer_client, boat_with_pricing, boat_availability, tbank_init):
+        """Созданная бронь ссылается на рейс и занимает его места"""
+        url = reverse('bookings:booking-list')
+        response = customer_client.post(url, {
+            'trip_id': boat_availability.id,
+            'number_of_people': 3,
+            'guest_name': 'Клиент',
+            'guest_phone': '+79001234578'
+        }, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+
+        booking = Booking.objects.get(id=response.data['id'])
+        assert booking.availability_id == boat_availability.id
+        assert Booking.objects.occupied_seats(boat_availability) == 3
+        assert Booking.objects.occupied_seats_by_availability([boat_availability.id]) == {boat_availability.id: 3}
+
+    def test_backfill_matches_trip_by_boat_and_time(self, booking, boat_availability):
+        """Миграция находит рейс для старых броней по судну и времени"""
+        from importlib import import_module
+        from django.apps import apps as django_apps
+
+        migration = import_module('apps.bookings.migrations.0014_backfill_booking_availability')
+        # Бронь из фикстуры создана без рейса на то же время (завтра 11:00-13:00)
+        assert booking.availability_id is None
+
+        migration.backfill_booking_availability(django_apps, None)
+
+        booking.refresh_from_db()
+        assert booking.availability_id == boat_availability.id
+
+    def test_unlinked_booking_takes_seats(self, booking, boat_availability):
+        """Бронь без рейса на то же судно и время занимает места рейса"""
+        assert booking.availability_id is None
+        assert Booking.objects.occupied_seats(boat_availability) == 2
+        assert Booking.objects.occupied_seats_by_availability([boat_availability.id]) == {boat_availability.id: 2}
+
+        Booking.objects.filter(pk=booking.pk).update(status=Booking.Status.CANCELLED)
+        assert Booking.objects.occupied_seats(boat_availability) == 0
+
+    def test_admin_form_links_trip(self, booking, boat_availability):
+        """Форма админки подбирает рейс для активной брони, а без рейса в расписании не сохраняет ее"""
+        from django.forms.models import model_to_dict
+        from apps.bookings.admin import BookingAdminForm
+
+        data = {key: value for key, value in model_to_dict(booking).items() if value is not None}
+        form = BookingAdminForm(data=data, instance=booking)
+        assert form.is_valid(), form.errors
+        assert form.save().availability_id == boat_availability.id
+
+        data['start_datetime'] = booking.start_datetime + timedelta(hours=3)
+        data['end_datetime'] = booking.end_datetime + timedelta(hours=3)
+        form = BookingAdminForm(data=data, instance=Booking())
+        assert not form.is_valid()
+        assert 'availability' in form.errors
+
+
+@pytest.mark.django_db
+class TestExpireReservedBookings:
+    """Тесты команды отмены просроченных RESERVED бронирований"""
+
+    def test_expires_stale_reservations(self, booking, settings, monkeypatch):
+        """Просроченные брони отменяются, их платежи отменяются в Т-Банке"""
+        from io import StringIO
+        from django.core.management import call_command
+        from django.utils import timezone
+        from apps.payments.models import Payment
+        from apps.payments.services import TBankService
+
+        settings.TBANK_TERMINAL_KEY = 'test_terminal'
+        settings.TBANK_PASSWORD = 'test_password'
+        cancelled_payment_ids = []
+
+        def fake_cancel_payment(self, payment_id, amount=None):
+            cancelled_payment_ids.append(payment_id)
+            return {'Status': 'CANCELED', 'PaymentId': payment_id, 'raw_response': {}}
+
+        monkeypatch.setattr(TBankService, 'cancel_payment', fake_cancel_payment)
+
+        def reserve(hold_expires_at, payment_status):
+            booking.pk = None
+            booking.status = Booking.Status.RESERVED
+            booking.hold_expires_at = hold_expires_at
+            booking.save()
+            Payment.objects.create(
+                booking=booking,
+                payment_id=f'pay_{booking.pk}',
+                order_id=f'booking_{booking.pk}_deposit',
+                amount=booking.deposit,
+                payment_type=Payment.PaymentType.DEPOSIT,
+                status=payment_status,
+            )
+            return booking.pk
+
+        now = timezone.now()
+        expired_id = reserve(now - timedelta(minutes=1), Payment.Status.NEW)
+        active_id = reserve(now + timedelta(minutes=10), Payment.Status.NEW)
+        paying_id = reserve(now - timedelta(minutes=1), Payment.Status.AUTHORIZED)
+
+        call_command('expire_reserved_bookings', '--batch-size', '1', stdout=StringIO())
+
+        assert Booking.objects.get(pk=expired_id).status == Booking.Status.CANCELLED
+        assert Booking.objects.get(pk=active_id).status == Booking.Status.RESERVED
+        assert Booking.objects.get(pk=paying_id).status == Booking.Status.RESERVED
+        assert cancelled_payment_ids == [f'pay_{expired_id}']
+        assert Payment.objects.get(payment_id=f'pay_{expired_id}').status == Payment.Status.CANCELED
+
+
+@pytest.mark.django_db
+class TestArchiveBookings:
+    """Тесты переноса старых бронирований в архив"""
+
+    def test_archives_old_bookings_with_payments(self, booking):
+        """Старые завершенные брони с платежами переносятся в архив и остаются в отчетах"""
+        from io import StringIO
+        from django.core.management import call_command
+        from django.utils import timezone
+        from apps.bookings.models import ArchivedBooking
+        from apps.bookings.services.reporting import reporting_bookings, reporting_payments
+        from apps.payments.models import ArchivedPayment, Payment
+
+        old_start = timezone.now() - timedelta(days=400)
+        Booking.objects.filter(pk=booking.pk).update(
+            status=Booking.Status.COMPLETED,
+            start_datetime=old_start,
+            end_datetime=old_start + timedelta(hours=2),
+        )
+        Payment.objects.create(
+            booking=booking,
+            payment_id='pay_archived',
+            order_id=f'booking_{booking.pk}_deposit',
+            amount=booking.deposit,
+            payment_type=Payment.PaymentType.DEPOSIT,
+            status=Payment.Status.CONFIRMED,
+        )
+
+        booking.pk = None
+        booking.status = Booking.Status.CONFIRMED
+        booking.save()
+        recent_id = booking.pk
+        archived_id = Booking.objects.exclude(pk=recent_id).get().pk
+
+        call_command('archive_bookings', '--months', '12', stdout=StringIO())
+
+        assert list(Booking.objects.values_list('id', flat=True)) == [recent_id]
+        assert not Payment.objects.exists()
+        archived = ArchivedBooking.objects.get(pk=archived_id)
+        assert archived.status == Booking.Status.COMPLETED
+        assert ArchivedPayment.objects.get(payment_id='pay_archived').booking_id == archived_id
+
+        assert sorted(row['id'] for row in reporting_bookings(('id',))) == sorted([archived_id, recent_id])
+        assert [row['payment_id'] for row in reporting_payments(('payment_id',))] == ['pay_archived']
+
+
+@pytest.mark.django_db
+class TestBookingTransitions:
+    """Тесты переходов статусов бронирования"""
+
+    def test_transition_skips_repricing(self, booking):
+        """Переход меняет только статус, цены не пересчитываются"""
+        from decimal import Decimal
+        from apps.bookings.services.transitions import transition
+
+        Booking.objects.filter(pk=booking.pk).update(total_price=Decimal('7777'))
+        transition(booking, Booking.Status.CONFIRMED)
+
+        booking.refresh_from_db()
+        assert booking.status == Booking.Status.CONFIRMED
+        assert booking.total_price == Decimal('7777')
+
+    def test_invalid_transition_rejected(self, booking):
+        """Переход не из таблицы переходов запрещен"""
+        from apps.bookings.services.transitions import transition, BookingTransitionError
+
+        with pytest.raises(BookingTransitionError):
+            transition(booking, Booking.Status.COMPLETED)
+
+    def test_concurrent_transition_conflict(self, booking):
+        """Устаревший статус в объекте не перетирает параллельное изменение"""
+        from apps.bookings.services.transitions import transition, BookingTransitionConflict
+
+        stale = Booking.objects.get(pk=booking.pk)
+        transition(booking, Booking.Status.CANCELLED)
+
+        with pytest.raises(BookingTransitionConflict):
+            transition(stale, Booking.Status.CONFIRMED)
+        assert Booking.objects.get(pk=booking.pk).status == Booking.Status.CANCELLED
+
+    def test_check_in_completes_booking(self, boat_owner_client, booking):
+        """Посадка переводит подтвержденную бронь в COMPLETED"""
+        from apps.bookings.services.transitions import transition
+
+        transition(booking, Booking.Status.CONFIRMED)
+        url = reverse('bookings:booking-check-in', kwargs={'pk': booking.id})
+        response = boat_owner_client.post(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert Booking.objects.get(pk=booking.pk).status == Booking.Status.COMPLETED
+
+    def _admin_change(self, admin_client, booking, to_status):
+        """Сохраняет бронь в админке, меняя только статус"""
+        from django.forms.models import model_to_dict
+        from django.utils import timezone
+
+        booking = Booking.objects.get(pk=booking.pk)
+        data = {key: value for key, value in model_to_dict(booking).items() if value is not None}
+        for name in ('start_datetime', 'end_datetime'):
+            value = timezone.localtime(data.pop(name))
+            data[f'{name}_0'] = value.strftime('%Y-%m-%d')
+            data[f'{name}_1'] = value.strftime('%H:%M:%S')
+        data['status'] = to_status
+        url = reverse('admin:bookings_booking_change', args=[booking.pk])
+        return admin_client.post(url, data, follow=True)
+
+    def test_admin_rejects_invalid_transition(self, admin_client, booking, boat_availability):
+        """Недопустимый переход статуса в админке - ошибка формы, статус не меняется"""
+        Booking.objects.filter(pk=booking.pk).update(availability=boat_availability)
+
+        response = self._admin_change(admin_client, booking, Booking.Status.RESERVED)
+
+        assert response.status_code == 200
+        assert 'status' in response.context['adminform'].form.errors
+        assert Booking.objects.get(pk=booking.pk).status == Booking.Status.PENDING
+
+    def test_admin_reports_transition_conflict(self, admin_client, booking, boat_availability, monkeypatch):
+        """Если статус изменился параллельно, админка показывает ошибку вместо сообщения об успехе"""
+        from django.contrib import messages
+        from apps.bookings import admin as bookings_admin
+        from apps.bookings.services.transitions import transition
+
+        Booking.objects.filter(pk=booking.pk).update(availability=boat_availability)
+
+        def concurrent_transition(obj, to_status, **fields):
+            # Параллельный запрос успел отменить бронь
+            transition(Booking.objects.get(pk=obj.pk), Booking.Status.CANCELLED)
+            return transition(obj, to_status, **fields)
+
+        monkeypatch.setattr(bookings_admin, 'transition', concurrent_transition)
+        response = self._admin_change(admin_client, booking, Booking.Status.CONFIRMED)
+
+        levels = [message.level for message in response.context['messages']]
+        assert levels == [messages.ERROR]
+        assert response.redirect_chain[-1][0].endswith(f'/{booking.pk}/change/')
+        assert Booking.objects.get(pk=booking.pk).status == Booking.Status.CANCELLED
+
+
+@pytest.mark.django_db
+class TestCancelTrips:
+    """Тесты массовой отмены выходов владельцем судна"""
+
+    def test_cancel_day_cancels_bookings_and_closes_trips(self, boat_owner_client, booking, boat_availability):
+        """Все брони дня отменяются одним запросом, рейсы снимаются с продажи"""
+        _add_bookings_with_payments(booking, 3)
+
+        url = reverse('bookings:booking-cancel-trips')
+        response = boat_owner_client.post(url, {
+            'boat_id': booking.boat_id,
+            'date': boat_availability.departure_date.isoformat(),
+            'reason': 'Шторм'
+        }, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['cancelled_bookings'] == 4
+        assert response.data['trips_closed'] == 1
+        assert not Booking.objects.filter(boat=booking.boat).exclude(status=Booking.Status.CANCELLED).exists()
+        assert Booking.objects.get(pk=booking.pk).notes.endswith('Отменено: Шторм')
+        boat_availability.refresh_from_db()
+        assert boat_availability.is_active is False
+
+    def test_side_effects_refund_payments(self, booking, settings, monkeypatch):
+        """После отмены оплаченные платежи возвращаются в Т-Банке одной пачкой"""
+        from apps.bookings.services.bulk_cancel import cancel_bookings, process_bulk_cancellation
+        from apps.payments.models import Payment
+        from apps.payments.services import TBankService
+
+        settings.TBANK_TERMINAL_KEY = 'test_terminal'
+        settings.TBANK_PASSWORD = 'test_password'
+        cancelled_payment_ids = []
+
+        def fake_cancel_payment(self, payment_id, amount=None):
+            cancelled_payment_ids.append(payment_id)
+            return {'Status': 'REFUNDED', 'PaymentId': payment_id, 'raw_response': {}}
+
+        monkeypatch.setattr(TBankService, 'cancel_payment', fake_cancel_payment)
+        _add_bookings_with_payments(booking, 2)
+
+        booking_ids = cancel_bookings(Booking.objects.filter(boat=booking.boat), 'Шторм', run_async=False)
+        stats = process_bulk_cancellation(booking_ids, 'Шторм')
+
+        assert stats['payments'] == 2
+        assert sorted(cancelled_payment_ids) == sorted(
+            Payment.objects.filter(booking_id__in=booking_ids).values_list('payment_id', flat=True)
+        )
+        assert set(Payment.objects.values_list('status', flat=True)) == {Payment.Status.REFUNDED}
+
+    def test_failed_refund_retried_by_command(self, booking, settings, monkeypatch):
+        """Ошибка Cancel в Т-Банке оставляет возврат в очереди, команда повторяет его"""
+        from io import StringIO
+        from django.core.management import call_command
+        from apps.bookings.services.bulk_cancel import cancel_bookings, process_bulk_cancellation
+        from apps.payments.models import Payment, PaymentRefund
+        from apps.payments.services import TBankService
+
+        settings.TBANK_TERMINAL_KEY = 'test_terminal'
+        settings.TBANK_PASSWORD = 'test_password'
+
+        def failing_cancel_payment(self, payment_id, amount=None):
+            raise ConnectionError('Gateway timeout')
+
+        monkeypatch.setattr(TBankService, 'cancel_payment', failing_cancel_payment)
+        _add_bookings_with_payments(booking, 2)
+
+        booking_ids = cancel_bookings(Booking.objects.filter(boat=booking.boat), 'Шторм', run_async=False)
+        assert PaymentRefund.objects.count() == 2
+        assert process_bulk_cancellation(booking_ids, 'Шторм')['payments'] == 0
+        assert set(Payment.objects.values_list('status', flat=True)) == {Payment.Status.CONFIRMED}
+        assert all(
+            refund.processed_at is None and refund.attempts == 1 and refund.error
+            for refund in PaymentRefund.objects.all()
+        )
+
+        monkeypatch.setattr(
+            TBankService, 'cancel_payment',
+            lambda self, payment_id, amount=None: {'Status': 'REFUNDED', 'PaymentId': payment_id}
+        )
+        call_command('retry_payment_refunds', '--retry-delay', '0', stdout=StringIO())
+
+        assert set(Payment.objects.values_list('status', flat=True)) == {Payment.Status.REFUNDED}
+        assert not PaymentRefund.objects.filter(processed_at__isnull=True).exists()
+
+
+@pytest.mark.django_db
+class TestBulkBlockSeats:
+    """Тесты массовой блокировки и разблокировки мест"""
+
+    def _trips(self, boat_availability, count):
+        trips = [boat_availability]
+        for days in range(1, count):
+            trips.append(BoatAvailability.objects.create(
+                boat=boat_availability.boat,
+                departure_date=boat_availability.departure_date + timedelta(days=days),
+                departure_time=boat_availability.departure_time,
+                return_time=boat_availability.return_time,
+                is_active=True
+            ))
+        return trips
+
+    def test_block_many_trips_with_per_item_results(self, boat_owner_client, boat_availability):
+        """Блокировки создаются одним запросом, ошибка одного элемента не мешает остальным"""
+        trips = self._trips(boat_availability, 3)
+        capacity = boat_availability.effective_capacity
+
+        url = reverse('bookings:booking-block-seats-bulk')
+        response = boat_owner_client.post(url, {'items': [
+            {'trip_id': trips[0].id, 'number_of_people': 2},
+            {'trip_id': trips[1].id, 'number_of_people': 3},
+            {'trip_id': trips[2].id, 'number_of_people': capacity},
+            {'trip_id': trips[2].id, 'number_of_people': 1},
+        ]}, format='json')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        results = response.data['results']
+        assert all('booking_id' in result for result in results[:3])
+        assert 'Недостаточно свободных мест' in results[3]['error']
+        assert Booking.objects.occupied_seats(trips[1]) == 3
+
+    def test_unblock_bulk(self, boat_owner_client, boat_availability, booking):
+        """Массовая разблокировка отменяет блокировки и сообщает о чужих ID"""
+        trips = self._trips(boat_availability, 2)
+        url = reverse('bookings:booking-block-seats-bulk')
+        response = boat_owner_client.post(url, {'items': [
+            {'trip_id': trip.id, 'number_of_people': 2} for trip in trips
+        ]}, format='json')
+        block_ids = [result['booking_id'] for result in response.data['results']]
+
+        url = reverse('bookings:booking-unblock-bulk')
+        response = boat_owner_client.post(url, {'booking_ids': block_ids + [booking.id]}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['results'][-1]['error'] == 'Блокировка не найдена'
+        assert set(Booking.objects.filter(id__in=block_ids).values_list('status', flat=True)) == {Booking.Status.CANCELLED}
+        assert Booking.objects.get(pk=booking.pk).status == Booking.Status.PENDING
+
+
+@pytest.mark.django_db
+class TestDepartureManifest:
+    """Тесты списка посадки и массового check-in"""
+
+    def _prepare(self, booking, boat_availability):
+        from apps.bookings.serializers import BlockSeatsSerializer
+        Booking.objects.filter(pk=booking.pk).update(
+            availability=boat_availability, status=Booking.Status.CONFIRMED
+        )
+        BlockSeatsSerializer.build_block(boat_availability, 3).save()
+
+    def test_manifest_lists_bookings_blocks_and_totals(self, boat_owner_client, booking, boat_availability):
+        """Список посадки содержит брони, блокировки и итоги; повтор с ETag дает 304"""
+        self._prepare(booking, boat_availability)
+
+        url = reverse('bookings:booking-manifest')
+        response = boat_owner_client.get(url, {'trip_id': boat_availability.id})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['totals'] == {'booked': 2, 'blocked': 3, 'checked_in': 0}
+        assert [row['is_block'] for row in response.data['bookings']] == [False, True]
+
+        response = boat_owner_client.get(
+            url, {'trip_id': boat_availability.id}, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_check_in_bulk(self, boat_owner_client, booking, guide_booking, boat_availability):
+        """Оплаченные брони переводятся в COMPLETED, остальные возвращают ошибку"""
+        self._prepare(booking, boat_availability)
+
+        url = reverse('bookings:booking-check-in-bulk')
+        response = boat_owner_client.post(url, {'booking_ids': [booking.id, guide_booking.id, 0]}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        results = response.data['results']
+        assert results[0]['status'] == Booking.Status.COMPLETED
+        assert 'оплачено' in results[1]['error']
+        assert results[2]['error'] == 'Бронирование не найдено'
+        assert Booking.objects.get(pk=booking.pk).status == Booking.Status.COMPLETED
+        assert Booking.objects.get(pk=guide_booking.pk).status != Booking.Status.COMPLETED
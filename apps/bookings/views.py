@@ -3,19 +3,29 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import PermissionDenied, ValidationError
+from django.db import transaction
 from django.db.models import Q
 from django.utils import timezone
 from django.conf import settings
+from django.urls import reverse
 from datetime import datetime, timedelta
 from decimal import Decimal
+import hashlib
+import json
 import logging
 
 from .models import Booking, PromoCode
-from .serializers import BookingListSerializer, BookingDetailSerializer, BookingCreateSerializer, BlockSeatsSerializer, HotelBookingSerializer
+from .serializers import (
+    BookingListSerializer, BookingDetailSerializer, BookingCreateSerializer, BlockSeatsSerializer,
+    BulkBlockSeatsSerializer, BulkUnblockSeatsSerializer, BulkCheckInSerializer, HotelBookingSerializer
+)
 from .services.telegram_service import TelegramService
+from .services.idempotency import idempotent
+from .services.transitions import transition, BookingTransitionError
+from .services.bulk_cancel import cancel_bookings
 from apps.accounts.models import User
 from apps.payments.models import Payment
-from apps.payments.services import TBankService
+from apps.payments.services.payment_init import init_booking_payment
 from apps.boats.models import BoatAvailability, BoatPricing
 
 logger = logging.getLogger(__name__)
@@ -43,7 +53,7 @@ class BookingViewSet(viewsets.ModelViewSet):
         - Клиент: только его бронирования
         """
         user = self.request.user
-        queryset = Booking.objects.select_related('boat', 'guide', 'customer', 'boat__owner')
+        queryset = Booking.objects.for_listing()
         
         if user.role == User.Role.BOAT_OWNER:
             # Владелец видит все бронирования своих судов
@@ -101,10 +111,39 @@ class BookingViewSet(viewsets.ModelViewSet):
         
         return queryset.order_by('-created_at')
     
+    def _cancel_after_payment_init_error(self, booking, notes):
+        """Отменяет только что созданную RESERVED бронь, если не удалось создать платеж"""
+        try:
+            transition(booking, Booking.Status.CANCELLED, notes=notes, hold_expires_at=None)
+        except BookingTransitionError as e:
+            logger.error(f"Failed to cancel booking {booking.id} after payment init error: {str(e)}")
+    
+    def _wants_async_payment_init(self, request):
+        """
+        Init в Т-Банке в фоне: включается настройкой PAYMENT_INIT_ASYNC
+        или заголовком запроса "Prefer: respond-async"
+        """
+        prefer = request.META.get('HTTP_PREFER', '')
+        return getattr(settings, 'PAYMENT_INIT_ASYNC', False) or 'respond-async' in prefer.lower()
+    
+    def _payment_response_fields(self, payment):
+        """Поля платежа в ответе; пока Init выполняется в фоне, payment_url пустой"""
+        return {
+            'payment_url': payment.payment_url or None,
+            'payment_id': payment.payment_id,
+            'payment': {
+                'id': payment.pk,
+                'status': payment.status,
+                'status_url': reverse('payment-init-status', args=[payment.pk]),
+            },
+        }
+    
+    @idempotent('booking_create')
     def create(self, request, *args, **kwargs):
         """
         Создание бронирования с инициализацией оплаты предоплаты
         Если передан параметр preview=true, возвращает только расчет стоимости
+        Заголовок Idempotency-Key защищает от дублей при повторах запроса
         """
         logger.info("=== Starting booking creation ===")
         serializer = self.get_serializer(data=request.data)
@@ -139,60 +178,23 @@ class BookingViewSet(viewsets.ModelViewSet):
         logger.info(f"Booking {booking.id} created successfully")
         
         try:
-            # Инициализируем платеж для предоплаты через Т-Банк
-            logger.info("Initializing TBankService...")
-            tbank_service = TBankService()
-            
-            # Генерируем уникальный order_id
-            order_id = f"booking_{booking.id}_deposit_{int(timezone.now().timestamp())}"
-            logger.info(f"Order ID: {order_id}")
-            
-            # Формируем описание платежа
-            description = f"Предоплата за бронирование #{booking.id} - {booking.boat.name} на {booking.start_datetime.strftime('%d.%m.%Y %H:%M')}"
-            logger.info(f"Description: {description}")
-            
-            # Получаем URLs для перенаправления
-            success_url = f"{settings.PAYMENT_SUCCESS_URL}?booking_id={booking.id}&type=deposit"
-            fail_url = f"{settings.PAYMENT_FAIL_URL}?booking_id={booking.id}&type=deposit"
-            logger.info(f"Success URL: {success_url}")
-            logger.info(f"Fail URL: {fail_url}")
-            
-            # Инициализируем платеж (с чеком 54-ФЗ)
-            logger.info(f"Calling init_payment with amount: {booking.deposit}")
-            payment_result = tbank_service.init_payment(
+            # Инициализируем платеж для предоплаты через Т-Банк (с чеком 54-ФЗ)
+            payment = init_booking_payment(
+                booking,
+                payment_type=Payment.PaymentType.DEPOSIT,
                 amount=booking.deposit,
-                order_id=order_id,
-                description=description,
-                success_url=success_url,
-                fail_url=fail_url,
+                description=f"Предоплата за бронирование #{booking.id} - {booking.boat.name} на {booking.start_datetime.strftime('%d.%m.%Y %H:%M')}",
+                order_suffix='deposit',
                 customer_email=request.user.email if request.user.email else None,
-                customer_phone=booking.guest_phone,
                 payment_method='full_prepayment',
+                redirect_due_date=booking.hold_expires_at,
+                run_async=self._wants_async_payment_init(request),
             )
-            logger.info(f"Payment result: {payment_result}")
-            
-            # Сохраняем платеж в БД
-            payment = Payment.objects.create(
-                booking=booking,
-                payment_id=payment_result['PaymentId'],
-                order_id=order_id,
-                amount=booking.deposit,
-                payment_type=Payment.PaymentType.DEPOSIT,
-                status=payment_result['Status'].lower(),
-                payment_url=payment_result['PaymentURL'],
-                success_url=success_url,
-                fail_url=fail_url,
-                raw_response=payment_result['raw_response']
-            )
-            
-            logger.info(f"Payment initialized for booking {booking.id}: {payment.payment_id}")
+            logger.info(f"Payment {payment.pk} for booking {booking.id}: {payment.payment_id} ({payment.status})")
             
             # Возвращаем данные бронирования с URL оплаты
             booking_data = BookingDetailSerializer(booking).data
-            booking_data['payment_url'] = payment.payment_url
-            booking_data['payment_id'] = payment.payment_id
-            
-            logger.info(f"Returning response with payment_url: {payment.payment_url}")
+            booking_data.update(self._payment_response_fields(payment))
             
             headers = self.get_success_headers(serializer.data)
             return Response(booking_data, status=status.HTTP_201_CREATED, headers=headers)
@@ -200,9 +202,7 @@ class BookingViewSet(viewsets.ModelViewSet):
         except Exception as e:
             logger.error(f"Error initializing payment for booking {booking.id}: {str(e)}", exc_info=True)
             # Если не удалось создать платеж, отменяем бронирование
-            booking.status = Booking.Status.CANCELLED
-            booking.notes = f"Ошибка инициализации оплаты: {str(e)}"
-            booking.save()
+            self._cancel_after_payment_init_error(booking, f"Ошибка инициализации оплаты: {str(e)}")
             
             return Response(
                 {
@@ -292,25 +292,20 @@ class BookingViewSet(viewsets.ModelViewSet):
             if time_until_trip.total_seconds() > 72 * 3600:  # Более 72 часов
                 refund_deposit = True
         
-        # Удаляем событие из Google Calendar перед отменой
-        if booking.google_calendar_event_id:
-            try:
-                from apps.bookings.services.google_calendar_service import GoogleCalendarService
-                calendar_service = GoogleCalendarService()
-                result = calendar_service.delete_event(booking)
-                if result:
-                    logger.info(f"✅ Google Calendar event deleted for booking {booking.id}")
-                    # Очищаем event_id после успешного удаления
-                    booking.google_calendar_event_id = None
-                else:
-                    logger.warning(f"⚠️ Failed to delete Google Calendar event for booking {booking.id}")
-            except Exception as e:
-                logger.error(f"❌ Failed to delete Google Calendar event for booking {booking.id}: {str(e)}", exc_info=True)
+        # Обновляем статус (условный UPDATE: параллельная оплата/отмена не перетрется)
+        fields = {'hold_expires_at': None}
+        if reason:
+            fields['notes'] = f"{booking.notes}\nОтменено: {reason}".strip()
+        try:
+            transition(booking, Booking.Status.CANCELLED, **fields)
+        except BookingTransitionError as e:
+            logger.warning(f"Cancel rejected for booking {booking.id}: {str(e)}")
+            return Response(
+                {'error': 'Статус бронирования изменился, обновите данные и повторите попытку'},
+                status=status.HTTP_409_CONFLICT
+            )
         
-        # Обновляем статус
-        booking.status = Booking.Status.CANCELLED
-        booking.notes = f"{booking.notes}\nОтменено: {reason}".strip() if reason else booking.notes
-        booking.save()
+        # Событие в Google Calendar удаляется обработчиком booking_status_changed
         
         return Response({
             'message': 'Бронирование отменено',
@@ -318,6 +313,66 @@ class BookingViewSet(viewsets.ModelViewSet):
             'deposit_amount': float(booking.deposit) if refund_deposit else 0
         }, status=status.HTTP_200_OK)
     
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def cancel_trips(self, request):
+        """
+        Массовая отмена выходов владельцем судна (например, по погоде)
+        Body:
+            - trip_id: отменить один рейс или
+            - boat_id + date ("2025-11-22"): отменить все рейсы судна за день
+            - reason: причина отмены
+        Все брони отменяются одним UPDATE, рейсы снимаются с продажи.
+        Возвраты в Т-Банке, удаление событий календаря и уведомления выполняются в фоне.
+        """
+        user = request.user
+        
+        if user.role != User.Role.BOAT_OWNER:
+            raise PermissionDenied("Только владелец судна может отменять выходы")
+        
+        trip_id = request.data.get('trip_id')
+        boat_id = request.data.get('boat_id')
+        date = request.data.get('date')
+        reason = request.data.get('reason', '')
+        
+        if trip_id:
+            availabilities = BoatAvailability.objects.filter(id=trip_id, boat__owner=user)
+            if not availabilities.exists():
+                return Response({'error': 'Рейс не найден'}, status=status.HTTP_404_NOT_FOUND)
+            bookings = Booking.objects.filter(availability_id=trip_id)
+        elif boat_id and date:
+            try:
+                date_obj = datetime.strptime(date, '%Y-%m-%d').date()
+            except (ValueError, TypeError):
+                return Response(
+                    {'error': 'Неверный формат даты. Используйте YYYY-MM-DD'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if not user.boats.filter(id=boat_id).exists():
+                return Response({'error': 'Судно не найдено'}, status=status.HTTP_404_NOT_FOUND)
+            availabilities = BoatAvailability.objects.filter(boat_id=boat_id, departure_date=date_obj)
+            bookings = Booking.objects.filter(boat_id=boat_id, start_datetime__date=date_obj)
+        else:
+            return Response(
+                {'error': 'Необходимо указать trip_id или boat_id и date'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        with transaction.atomic():
+            trips_closed = availabilities.filter(is_active=True).update(is_active=False)
+            cancelled_ids = cancel_bookings(bookings, reason)
+        
+        logger.info(
+            f"Owner {user.id} cancelled trips: trip_id={trip_id}, boat_id={boat_id}, date={date}, "
+            f"bookings={len(cancelled_ids)}, trips closed={trips_closed}"
+        )
+        
+        return Response({
+            'message': 'Выходы отменены',
+            'cancelled_bookings': len(cancelled_ids),
+            'booking_ids': cancelled_ids,
+            'trips_closed': trips_closed
+        }, status=status.HTTP_200_OK)
+    
     @action(detail=True, methods=['post'])
     def pay_remaining(self, request, pk=None):
         """
@@ -363,52 +418,24 @@ class BookingViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            # Инициализируем платеж для остатка через Т-Банк
-            tbank_service = TBankService()
-            
-            # Генерируем уникальный order_id
-            order_id = f"booking_{booking.id}_remaining_{int(timezone.now().timestamp())}"
-            
-            # Формируем описание платежа
-            description = f"Оплата остатка за бронирование #{booking.id} - {booking.boat.name} на {booking.start_datetime.strftime('%d.%m.%Y %H:%M')}"
-            
-            # Получаем URLs для перенаправления
-            success_url = f"{settings.PAYMENT_SUCCESS_URL}?booking_id={booking.id}&type=remaining"
-            fail_url = f"{settings.PAYMENT_FAIL_URL}?booking_id={booking.id}&type=remaining"
-            
-            # Инициализируем платеж (с чеком 54-ФЗ)
-            payment_result = tbank_service.init_payment(
+            # Инициализируем платеж для остатка через Т-Банк (с чеком 54-ФЗ)
+            payment = init_booking_payment(
+                booking,
+                payment_type=Payment.PaymentType.REMAINING,
                 amount=booking.remaining_amount,
-                order_id=order_id,
-                description=description,
-                success_url=success_url,
-                fail_url=fail_url,
+                description=f"Оплата остатка за бронирование #{booking.id} - {booking.boat.name} на {booking.start_datetime.strftime('%d.%m.%Y %H:%M')}",
+                order_suffix='remaining',
                 customer_email=user.email if user.email else None,
-                customer_phone=booking.guest_phone,
                 payment_method='full_payment',
+                run_async=self._wants_async_payment_init(request),
             )
             
-            # Сохраняем платеж в БД
-            payment = Payment.objects.create(
-                booking=booking,
-                payment_id=payment_result['PaymentId'],
-                order_id=order_id,
-                amount=booking.remaining_amount,
-                payment_type=Payment.PaymentType.REMAINING,
-                status=payment_result['Status'].lower(),
-                payment_url=payment_result['PaymentURL'],
-                success_url=success_url,
-                fail_url=fail_url,
-                raw_response=payment_result['raw_response']
-            )
-            
-            logger.info(f"Remaining payment initialized for booking {booking.id}: {payment.payment_id}")
+            logger.info(f"Remaining payment {payment.pk} for booking {booking.id}: {payment.payment_id} ({payment.status})")
             
             # Возвращаем URL для оплаты
             return Response({
                 'message': 'Платеж инициализирован',
-                'payment_url': payment.payment_url,
-                'payment_id': payment.payment_id,
+                **self._payment_response_fields(payment),
                 'amount': float(booking.remaining_amount),
                 'booking_id': booking.id
             }, status=status.HTTP_200_OK)
@@ -443,8 +470,14 @@ class BookingViewSet(viewsets.ModelViewSet):
             )
         
         # Обновляем статус
-        booking.status = Booking.Status.COMPLETED
-        booking.save()
+        try:
+            transition(booking, Booking.Status.COMPLETED)
+        except BookingTransitionError as e:
+            logger.warning(f"Check-in rejected for booking {booking.id}: {str(e)}")
+            return Response(
+                {'error': 'Статус бронирования изменился, обновите данные и повторите попытку'},
+                status=status.HTTP_409_CONFLICT
+            )
         
         return Response({
             'message': 'Посадка подтверждена',
@@ -453,6 +486,102 @@ class BookingViewSet(viewsets.ModelViewSet):
             'status': 'boarding_allowed'
         }, status=status.HTTP_200_OK)
     
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def check_in_bulk(self, request):
+        """
+        Посадка нескольких бронирований одним запросом - для капитана/владельца судна
+        Body: {"booking_ids": [1, 2, 3]}
+        """
+        user = request.user
+        
+        # Только владелец судна может выполнять check-in
+        if user.role != User.Role.BOAT_OWNER:
+            raise PermissionDenied("Только владелец судна может выполнять посадку")
+        
+        serializer = BulkCheckInSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        results = serializer.save()
+        
+        checked_in = sum(1 for result in results if 'error' not in result)
+        return Response({
+            'message': f'Посадка подтверждена: {checked_in} из {len(results)}',
+            'results': results
+        }, status=status.HTTP_200_OK if checked_in else status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def manifest(self, request):
+        """
+        Список посадки на рейс для капитана: все брони, блокировки и количество людей
+        Query params:
+            - trip_id: ID рейса (BoatAvailability)
+        Ответ компактный и с ETag: приложение хранит его для работы без сети
+        и повторно запрашивает с If-None-Match (304, если ничего не изменилось).
+        """
+        user = request.user
+        
+        if user.role != User.Role.BOAT_OWNER:
+            raise PermissionDenied("Только владелец судна может просматривать список посадки")
+        
+        trip_id = request.query_params.get('trip_id')
+        try:
+            availability = BoatAvailability.objects.select_related('boat').get(id=trip_id, boat__owner=user)
+        except (BoatAvailability.DoesNotExist, ValueError, TypeError):
+            return Response({'error': 'Рейс не найден'}, status=status.HTTP_404_NOT_FOUND)
+        
+        # Все участники рейса одним запросом; RESERVED не оплачены и на посадку не допускаются
+        rows = Booking.objects.filter(
+            availability=availability,
+            status__in=[Booking.Status.PENDING, Booking.Status.CONFIRMED, Booking.Status.COMPLETED]
+        ).order_by('start_datetime', 'id').values_list(
+            'id', 'status', 'guest_name', 'guest_phone', 'number_of_people',
+            'remaining_amount', 'payment_method', 'notes', 'guide__first_name', 'guide__last_name'
+        )
+        
+        bookings = []
+        totals = {'booked': 0, 'blocked': 0, 'checked_in': 0}
+        for (pk, booking_status, guest_name, guest_phone, number_of_people,
+             remaining_amount, payment_method, notes, guide_first_name, guide_last_name) in rows:
+            is_block = bool(notes and notes.startswith("[БЛОКИРОВКА]"))
+            if is_block:
+                totals['blocked'] += number_of_people
+            else:
+                totals['booked'] += number_of_people
+            if booking_status == Booking.Status.COMPLETED:
+                totals['checked_in'] += number_of_people
+            bookings.append({
+                'id': pk,
+                'status': booking_status,
+                'guest_name': guest_name,
+                'guest_phone': guest_phone,
+                'people': number_of_people,
+                'remaining_amount': str(remaining_amount),
+                'payment_method': payment_method,
+                'is_block': is_block,
+                'guide': f"{guide_first_name or ''} {guide_last_name or ''}".strip() or None,
+            })
+        
+        data = {
+            'trip': {
+                'id': availability.id,
+                'boat': availability.boat.name,
+                'departure_date': availability.departure_date.isoformat(),
+                'departure_time': availability.departure_time.strftime('%H:%M'),
+                'return_time': availability.return_time.strftime('%H:%M'),
+                'capacity': availability.effective_capacity,
+            },
+            'totals': totals,
+            'bookings': bookings,
+        }
+        
+        etag = '"' + hashlib.md5(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest() + '"'
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data, status=status.HTTP_200_OK)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+    
     @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
     def block_seats(self, request):
         """
@@ -495,7 +624,7 @@ class BookingViewSet(viewsets.ModelViewSet):
             guide__isnull=True,
             notes__startswith="[БЛОКИРОВКА]",
             status=Booking.Status.CONFIRMED
-        ).select_related('boat').order_by('-start_datetime')
+        ).for_listing().order_by('-start_datetime')
         
         # Фильтрация по boat_id если указан
         boat_id = request.query_params.get('boat_id')
@@ -546,8 +675,14 @@ class BookingViewSet(viewsets.ModelViewSet):
             )
         
         # Разблокируем (меняем статус на CANCELLED)
-        booking.status = Booking.Status.CANCELLED
-        booking.save()
+        try:
+            transition(booking, Booking.Status.CANCELLED)
+        except BookingTransitionError as e:
+            logger.warning(f"Unblock rejected for booking {booking.id}: {str(e)}")
+            return Response(
+                {'error': 'Места уже разблокированы'},
+                status=status.HTTP_409_CONFLICT
+            )
         
         return Response({
             'message': 'Места успешно разблокированы',
@@ -555,6 +690,51 @@ class BookingViewSet(viewsets.ModelViewSet):
             'number_of_people': booking.number_of_people
         }, status=status.HTTP_200_OK)
     
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def block_seats_bulk(self, request):
+        """
+        Массовая блокировка мест на нескольких рейсах
+        Body: {"items": [{"trip_id": 1, "number_of_people": 3}, ...]}
+        Возвращает результат по каждому элементу (booking_id или error)
+        """
+        user = request.user
+        
+        # Только владелец судна может блокировать места
+        if user.role != User.Role.BOAT_OWNER:
+            raise PermissionDenied("Только владелец судна может блокировать места")
+        
+        serializer = BulkBlockSeatsSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        results = serializer.save()
+        
+        blocked = sum(1 for result in results if 'booking_id' in result)
+        return Response({
+            'message': f'Заблокировано рейсов: {blocked} из {len(results)}',
+            'results': results
+        }, status=status.HTTP_201_CREATED if blocked else status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def unblock_bulk(self, request):
+        """
+        Массовая разблокировка мест
+        Body: {"booking_ids": [1, 2, 3]}
+        """
+        user = request.user
+        
+        # Только владелец судна может разблокировать места
+        if user.role != User.Role.BOAT_OWNER:
+            raise PermissionDenied("Только владелец судна может разблокировать места")
+        
+        serializer = BulkUnblockSeatsSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        results = serializer.save()
+        
+        unblocked = sum(1 for result in results if 'error' not in result)
+        return Response({
+            'message': f'Разблокировано: {unblocked} из {len(results)}',
+            'results': results
+        }, status=status.HTTP_200_OK if unblocked else status.HTTP_400_BAD_REQUEST)
+    
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def create_full_payment_link(self, request, pk=None):
         """
@@ -619,68 +799,34 @@ class BookingViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        # Проверяем, что сумма больше 0
+        if payment_amount <= 0:
+            return Response(
+                {'error': 'Сумма для оплаты должна быть больше 0'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
         try:
-            # Инициализируем платеж через Т-Банк
+            # Инициализируем платеж через Т-Банк (с чеком 54-ФЗ)
             logger.info(f"Creating payment link for hotel booking {booking.id}...")
             logger.info(f"Payment amount: {payment_amount}, Type: {payment_type}")
-            tbank_service = TBankService()
-            
-            # Генерируем уникальный order_id
-            order_id = f"booking_{booking.id}_{order_id_suffix}_{int(timezone.now().timestamp())}"
-            logger.info(f"Order ID: {order_id}")
-            
-            # Формируем описание платежа
-            description = payment_description
-            logger.info(f"Description: {description}")
-            
-            # Получаем URLs для перенаправления
-            success_url = f"{settings.PAYMENT_SUCCESS_URL}?booking_id={booking.id}&type={order_id_suffix}"
-            fail_url = f"{settings.PAYMENT_FAIL_URL}?booking_id={booking.id}&type={order_id_suffix}"
-            logger.info(f"Success URL: {success_url}")
-            logger.info(f"Fail URL: {fail_url}")
-            
-            # Проверяем, что сумма больше 0
-            if payment_amount <= 0:
-                return Response(
-                    {'error': 'Сумма для оплаты должна быть больше 0'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Инициализируем платеж (с чеком 54-ФЗ)
-            logger.info(f"Calling init_payment with amount: {payment_amount}")
-            payment_result = tbank_service.init_payment(
+            payment = init_booking_payment(
+                booking,
+                payment_type=payment_type,
                 amount=payment_amount,
-                order_id=order_id,
-                description=description,
-                success_url=success_url,
-                fail_url=fail_url,
+                description=payment_description,
+                order_suffix=order_id_suffix,
                 customer_email=booking.customer.email if booking.customer and booking.customer.email else None,
-                customer_phone=booking.guest_phone,
                 payment_method='full_payment',
+                run_async=self._wants_async_payment_init(request),
             )
-            logger.info(f"Payment result: {payment_result}")
             
-            # Сохраняем платеж в БД
-            payment = Payment.objects.create(
-                booking=booking,
-                payment_id=payment_result['PaymentId'],
-                order_id=order_id,
-                amount=payment_amount,
-                payment_type=payment_type,
-                status=payment_result['Status'].lower(),
-                payment_url=payment_result['PaymentURL'],
-                success_url=success_url,
-                fail_url=fail_url,
-                raw_response=payment_result['raw_response']
-            )
-            
-            logger.info(f"Payment link created for hotel booking {booking.id}: {payment.payment_id}")
+            logger.info(f"Payment link {payment.pk} for hotel booking {booking.id}: {payment.payment_id} ({payment.status})")
             
             # Возвращаем URL для оплаты
             return Response({
                 'message': 'Ссылка на оплату создана',
-                'payment_url': payment.payment_url,
-                'payment_id': payment.payment_id,
+                **self._payment_response_fields(payment),
                 'amount': float(payment_amount),
                 'booking_id': booking.id
             }, status=status.HTTP_200_OK)
@@ -696,9 +842,11 @@ class BookingViewSet(viewsets.ModelViewSet):
             )
     
     @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    @idempotent('hotel_booking_create')
     def create_hotel_booking(self, request):
         """
         Создание бронирования от гостиницы и генерация ссылки для оплаты гостем
+        Поддерживает заголовок Idempotency-Key (повтор вернет ту же бронь и ссылку)
         
         POST /api/bookings/create_hotel_booking/
         {
@@ -731,9 +879,7 @@ class BookingViewSet(viewsets.ModelViewSet):
         # Проверяем, что deposit больше 0
         if booking.deposit <= 0:
             logger.error(f"Invalid deposit amount for booking {booking.id}: {booking.deposit}")
-            booking.status = Booking.Status.CANCELLED
-            booking.notes = f"Ошибка: сумма предоплаты должна быть больше 0"
-            booking.save()
+            self._cancel_after_payment_init_error(booking, "Ошибка: сумма предоплаты должна быть больше 0")
             return Response(
                 {
                     'error': 'Ошибка расчета предоплаты',
@@ -743,69 +889,30 @@ class BookingViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            # Инициализируем платеж для предоплаты через Т-Банк
-            logger.info("Initializing TBankService...")
-            tbank_service = TBankService()
-            
-            # Генерируем уникальный order_id
-            order_id = f"booking_{booking.id}_deposit_{int(timezone.now().timestamp())}"
-            logger.info(f"Order ID: {order_id}")
-            
-            # Формируем описание платежа
-            description = f"Предоплата за бронирование #{booking.id} - {booking.boat.name} на {booking.start_datetime.strftime('%d.%m.%Y %H:%M')}"
-            logger.info(f"Description: {description}")
-            
-            # Получаем URLs для перенаправления
-            success_url = f"{settings.PAYMENT_SUCCESS_URL}?booking_id={booking.id}&type=deposit"
-            fail_url = f"{settings.PAYMENT_FAIL_URL}?booking_id={booking.id}&type=deposit"
-            logger.info(f"Success URL: {success_url}")
-            logger.info(f"Fail URL: {fail_url}")
-            
-            # Инициализируем платеж для предоплаты (с чеком 54-ФЗ)
-            logger.info(f"Calling init_payment with amount: {booking.deposit}")
-            payment_result = tbank_service.init_payment(
+            # Инициализируем платеж для предоплаты через Т-Банк (с чеком 54-ФЗ)
+            payment = init_booking_payment(
+                booking,
+                payment_type=Payment.PaymentType.DEPOSIT,
                 amount=booking.deposit,
-                order_id=order_id,
-                description=description,
-                success_url=success_url,
-                fail_url=fail_url,
+                description=f"Предоплата за бронирование #{booking.id} - {booking.boat.name} на {booking.start_datetime.strftime('%d.%m.%Y %H:%M')}",
+                order_suffix='deposit',
                 customer_email=booking.customer.email if booking.customer and booking.customer.email else None,
-                customer_phone=booking.guest_phone,
                 payment_method='full_prepayment',
+                redirect_due_date=booking.hold_expires_at,
+                run_async=self._wants_async_payment_init(request),
             )
-            logger.info(f"Payment result: {payment_result}")
-            
-            # Сохраняем платеж в БД
-            payment = Payment.objects.create(
-                booking=booking,
-                payment_id=payment_result['PaymentId'],
-                order_id=order_id,
-                amount=booking.deposit,
-                payment_type=Payment.PaymentType.DEPOSIT,
-                status=payment_result['Status'].lower(),
-                payment_url=payment_result['PaymentURL'],
-                success_url=success_url,
-                fail_url=fail_url,
-                raw_response=payment_result['raw_response']
-            )
-            
-            logger.info(f"Payment initialized for hotel booking {booking.id}: {payment.payment_id}")
+            logger.info(f"Payment {payment.pk} for hotel booking {booking.id}: {payment.payment_id} ({payment.status})")
             
             # Возвращаем данные бронирования с URL оплаты
             booking_data = BookingDetailSerializer(booking, context={'request': request}).data
-            booking_data['payment_url'] = payment.payment_url
-            booking_data['payment_id'] = payment.payment_id
-            
-            logger.info(f"Returning response with payment_url: {payment.payment_url}")
+            booking_data.update(self._payment_response_fields(payment))
             
             return Response(booking_data, status=status.HTTP_201_CREATED)
             
         except Exception as e:
             logger.error(f"Error initializing payment for hotel booking {booking.id}: {str(e)}", exc_info=True)
             # Если не удалось создать платеж, отменяем бронирование
-            booking.status = Booking.Status.CANCELLED
-            booking.notes = f"Ошибка инициализации оплаты: {str(e)}"
-            booking.save()
+            self._cancel_after_payment_init_error(booking, f"Ошибка инициализации оплаты: {str(e)}")
             
             return Response(
                 {
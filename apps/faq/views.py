@@ -5,6 +5,8 @@ from rest_framework.permissions import AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 
+from apps.search.filters import FullTextSearchFilter
+from apps.search.models import SearchDocument
 from .models import FAQPage
 from .serializers import FAQPageListSerializer, FAQPageDetailSerializer
 
@@ -15,8 +17,9 @@ class FAQPageViewSet(viewsets.ReadOnlyModelViewSet):
     """
     queryset = FAQPage.objects.filter(is_published=True)
     lookup_field = 'slug'
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     search_fields = ['title', 'excerpt', 'content']
+    search_kind = SearchDocument.Kind.FAQ
     ordering_fields = ['published_at', 'created_at', 'views_count']
     ordering = ['-published_at']
     permission_classes = [AllowAny]
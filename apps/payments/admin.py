@@ -1,5 +1,8 @@
+import json
+
 from django.contrib import admin
-from .models import Payment
+from django.utils.html import format_html, format_html_join
+from .models import ArchivedPayment, Payment, PaymentEvent, PaymentNotification, PaymentRefund
 
 
 @admin.register(Payment)
@@ -19,7 +22,7 @@ class PaymentAdmin(admin.ModelAdmin):
         'payment_id',
         'order_id',
         'payment_url',
-        'raw_response',
+        'events_log',
         'created_at',
         'updated_at',
         'paid_at'
@@ -40,7 +43,7 @@ class PaymentAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('Отладка', {
-            'fields': ('raw_response',),
+            'fields': ('events_log',),
             'classes': ('collapse',)
         }),
         ('Временные метки', {
@@ -48,3 +51,86 @@ class PaymentAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+    
+    @admin.display(description='Журнал Т-Банка')
+    def events_log(self, obj):
+        """Последние ответы и уведомления Т-Банка по платежу"""
+        if not obj.payment_id:
+            return '-'
+        events = PaymentEvent.objects.filter(payment_id=obj.payment_id).order_by('-created_at')[:20]
+        return format_html_join(
+            '',
+            '<p><b>{} {}</b> {}</p><pre>{}</pre>',
+            (
+                (event.created_at.strftime('%d.%m.%Y %H:%M:%S'), event.get_source_display(), event.status,
+                 json.dumps(event.data, ensure_ascii=False, indent=2))
+                for event in events
+            )
+        ) or '-'
+
+@admin.register(ArchivedPayment)
+class ArchivedPaymentAdmin(admin.ModelAdmin):
+    """Архив платежей - только просмотр"""
+    list_display = ['order_id', 'booking', 'payment_type', 'amount', 'status', 'created_at', 'paid_at']
+    list_filter = ['payment_type', 'status', 'created_at']
+    search_fields = ['order_id', 'payment_id', 'booking__guest_name']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PaymentNotification)
+class PaymentNotificationAdmin(admin.ModelAdmin):
+    """Очередь уведомлений Т-Банка - только просмотр"""
+    list_display = ['payment_id', 'status', 'received_at', 'processed_at', 'attempts', 'error']
+    list_filter = ['status', 'processed_at', 'received_at']
+    search_fields = ['payment_id']
+    readonly_fields = ['payment_id', 'status', 'payload', 'received_at', 'processed_at', 'attempts', 'error']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PaymentRefund)
+class PaymentRefundAdmin(admin.ModelAdmin):
+    """Очередь возвратов после массовой отмены - только просмотр"""
+    list_display = ['payment', 'reason', 'created_at', 'processed_at', 'attempts', 'last_attempt_at', 'error']
+    list_filter = ['processed_at', 'created_at']
+    search_fields = ['payment__payment_id', 'payment__order_id']
+    readonly_fields = ['payment', 'reason', 'created_at', 'processed_at', 'attempts', 'last_attempt_at', 'error']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PaymentEvent)
+class PaymentEventAdmin(admin.ModelAdmin):
+    """Журнал ответов Т-Банка - только просмотр"""
+    list_display = ['payment_id', 'order_id', 'source', 'status', 'created_at']
+    list_filter = ['source', 'status', 'created_at']
+    search_fields = ['payment_id', 'order_id']
+    fields = ['payment_id', 'order_id', 'source', 'status', 'created_at', 'payload_json']
+    readonly_fields = fields
+
+    @admin.display(description='Данные')
+    def payload_json(self, obj):
+        return format_html('<pre>{}</pre>', json.dumps(obj.data, ensure_ascii=False, indent=2))
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,45 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.payments.services.notifications import pending_payment_ids, process_payment_notifications, queue_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Дообрабатывает уведомления Т-Банка, оставшиеся в очереди (после перезапуска или ошибки), и выводит метрики очереди'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than',
+            type=int,
+            default=60,
+            help='Брать уведомления, ожидающие дольше N секунд (свежие обрабатывает фоновый обработчик)'
+        )
+        parser.add_argument('--metrics-only', action='store_true', help='Только вывести метрики очереди')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        if not options['metrics_only']:
+            payment_ids = pending_payment_ids(older_than_seconds=options['older_than'])
+            processed = 0
+            for payment_id in payment_ids:
+                processed += process_payment_notifications(payment_id)
+
+            if payment_ids:
+                summary = (
+                    f"Платежей: {len(payment_ids)}, обработано уведомлений: {processed}. "
+                    f"Время: {time.monotonic() - started:.2f} с"
+                )
+                logger.info(f"process_payment_notifications: {summary}")
+                self.stdout.write(self.style.SUCCESS(f'Готово! {summary}'))
+
+        metrics = queue_metrics()
+        self.stdout.write(
+            f"Очередь: {metrics['queue_depth']} (старейшее {metrics['oldest_pending_seconds']} с), "
+            f"с ошибками: {metrics['failed']}, обработано за {metrics['window_minutes']} мин: {metrics['processed']}, "
+            f"задержка ср. {metrics['avg_lag_seconds']} с / макс. {metrics['max_lag_seconds']} с"
+        )
@@ -0,0 +1,44 @@
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.payments.services.payment_events import prune_payment_events
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Удаляет старые записи журнала ответов Т-Банка (PaymentEvent) и обработанные уведомления'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=getattr(settings, 'PAYMENT_EVENT_RETENTION_DAYS', 180),
+            help='Удалять записи журнала старше N дней'
+        )
+        parser.add_argument(
+            '--notification-days',
+            type=int,
+            default=getattr(settings, 'PAYMENT_NOTIFICATION_RETENTION_DAYS', 30),
+            help='Удалять обработанные уведомления старше N дней'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки удаления')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать, ничего не удалять')
+
+    def handle(self, *args, **options):
+        deleted = prune_payment_events(
+            days=options['days'],
+            notification_days=options['notification_days'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+
+        summary = f"записей журнала: {deleted['events']}, уведомлений: {deleted['notifications']}"
+        if options['dry_run']:
+            self.stdout.write(f'Будет удалено {summary} (dry-run)')
+            return
+
+        logger.info(f"prune_payment_events: deleted {deleted}")
+        self.stdout.write(self.style.SUCCESS(f'Готово! Удалено {summary}'))
@@ -0,0 +1,158 @@
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.payments.models import Payment, PaymentEvent
+from apps.payments.services import TBankService
+from apps.payments.services.payment_init import fail_stale_initializing
+from apps.payments.services.payment_status import apply_payment_status
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Не больше rate запросов в секунду суммарно на все потоки"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class Command(BaseCommand):
+    help = 'Сверяет незавершенные платежи с Т-Банком (GetState) и применяет изменившиеся статусы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Параллельных запросов GetState')
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=getattr(settings, 'PAYMENT_RECONCILE_RATE', 20),
+            help='Не больше N запросов в секунду (0 - без ограничения)'
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=5,
+            help='Проверять платежи, созданные раньше чем N минут назад'
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='Размер пачки платежей')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать, ничего не менять')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        started = time.monotonic()
+
+        candidates = Payment.objects.filter(
+            status__in=Payment.NON_FINAL_STATUSES,
+            payment_id__isnull=False,
+            created_at__lte=timezone.now() - timedelta(minutes=options['min_age']),
+        )
+
+        if options['dry_run']:
+            self.stdout.write(f"Незавершенных платежей: {candidates.count()} (dry-run, без запросов в Т-Банк)")
+            return
+
+        # Платежи без payment_id, чей фоновый Init потерян, GetState не проверить
+        init_failed = fail_stale_initializing()
+        if init_failed:
+            self.stdout.write(f"Зависших в инициализации платежей переведено в init_failed: {init_failed}")
+
+        try:
+            tbank_service = TBankService()
+        except ValueError as e:
+            self.stdout.write(self.style.ERROR(f'❌ Т-Банк не настроен: {e}'))
+            return
+
+        limiter = RateLimiter(options['rate'])
+
+        def get_state(payment):
+            pk, payment_id = payment
+            limiter.wait()
+            try:
+                result = tbank_service.get_payment_state(payment_id)
+                return pk, (result.get('Status') or '').lower(), result['raw_response']
+            except Exception as e:
+                logger.error(f"Failed to get T-Bank state for payment {payment_id}: {str(e)}")
+                return pk, None, None
+
+        stats = Counter()
+        transitions = Counter()
+        tbank_seconds = 0.0
+        db_seconds = 0.0
+        last_id = 0
+
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as executor:
+            while True:
+                payments = list(
+                    candidates.filter(id__gt=last_id).order_by('id').values_list('id', 'payment_id')[:batch_size]
+                )
+                if not payments:
+                    break
+                last_id = payments[-1][0]
+
+                tbank_started = time.monotonic()
+                results = list(executor.map(get_state, payments))
+                tbank_seconds += time.monotonic() - tbank_started
+
+                db_started = time.monotonic()
+                for pk, new_status, raw_response in results:
+                    stats['checked'] += 1
+                    if not new_status:
+                        stats['errors'] += 1
+                        continue
+                    if new_status not in Payment.Status.values:
+                        logger.warning(f"Unknown T-Bank status for payment {pk}: {new_status}")
+                        stats['errors'] += 1
+                        continue
+
+                    with transaction.atomic():
+                        # Та же блокировка, что у обработчика webhook и check_status
+                        payment = Payment.objects.select_for_update().select_related('booking').get(pk=pk)
+                        if payment.status == new_status:
+                            continue
+                        was_paid = bool(payment.paid_at)
+                        old_status = apply_payment_status(payment, new_status, raw_response, PaymentEvent.Source.STATE)
+                        if payment.status != new_status:
+                            # Устаревший статус не применен
+                            continue
+
+                    stats['changed'] += 1
+                    transitions[f'{old_status} -> {new_status}'] += 1
+                    if payment.paid_at and not was_paid:
+                        stats['paid'] += 1
+                db_seconds += time.monotonic() - db_started
+
+                self.stdout.write(f"Проверено платежей: {stats['checked']}, изменилось: {stats['changed']}")
+
+                if len(payments) < batch_size:
+                    break
+
+        total_seconds = time.monotonic() - started
+        summary = (
+            f"Проверено: {stats['checked']}, изменился статус: {stats['changed']}, "
+            f"оплачено: {stats['paid']}, ошибок Т-Банка: {stats['errors']}. "
+            f"Время: всего {total_seconds:.2f} с, Т-Банк {tbank_seconds:.2f} с, БД {db_seconds:.2f} с"
+        )
+        logger.info(f"reconcile_payments: {summary}; {dict(transitions)}")
+        for transition_name, count in transitions.most_common():
+            self.stdout.write(f"  {transition_name}: {count}")
+        self.stdout.write(self.style.SUCCESS(f'Готово! {summary}'))
@@ -0,0 +1,87 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.payments.services.tbank_simulator import TBankSimulator
+
+
+def _parse_latency(value):
+    """'50' или '20-200' (мс) -> (min, max) в секундах"""
+    try:
+        low, _, high = value.partition('-')
+        low_ms = float(low)
+        high_ms = float(high) if high else low_ms
+    except ValueError:
+        raise CommandError(f'Некорректная задержка: {value} (ожидается "50" или "20-200")')
+    return low_ms / 1000, max(low_ms, high_ms) / 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Запускает локальный имитатор API Т-Банка (Init, GetState, Confirm, Cancel) с webhook-уведомлениями. '
+        'Для работы приложения с имитатором: TBANK_API_URL=http://<host>:<port>/v2'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', default='0', help='Задержка ответа, мс: "50" или диапазон "20-200"')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов с ошибкой API (0..1)')
+        parser.add_argument('--http-error-rate', type=float, default=0.0, help='Доля ответов HTTP 503 (0..1)')
+        parser.add_argument(
+            '--webhook-url',
+            default=None,
+            help='URL для уведомлений (по умолчанию NotificationURL из Init, т.е. TBANK_NOTIFICATION_URL)'
+        )
+        parser.add_argument('--no-webhooks', action='store_true', help='Не отправлять уведомления')
+        parser.add_argument(
+            '--auto-pay',
+            type=float,
+            default=None,
+            help='Оплачивать платеж через N секунд после Init (без перехода по ссылке)'
+        )
+        parser.add_argument('--decline-rate', type=float, default=0.0, help='Доля оплат с отказом REJECTED (0..1)')
+        parser.add_argument('--two-stage', action='store_true', help='Двухстадийная оплата: AUTHORIZED, затем Confirm')
+        parser.add_argument('--webhook-workers', type=int, default=4, help='Параллельных отправок уведомлений')
+        parser.add_argument(
+            '--webhook-duplicates',
+            type=int,
+            default=1,
+            help='Отправлять каждое уведомление N раз (проверка дедупликации)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            simulator = TBankSimulator(
+                host=options['host'],
+                port=options['port'],
+                latency=_parse_latency(options['latency']),
+                error_rate=options['error_rate'],
+                http_error_rate=options['http_error_rate'],
+                webhook_url=options['webhook_url'],
+                send_webhooks=not options['no_webhooks'],
+                auto_pay_after=options['auto_pay'],
+                decline_rate=options['decline_rate'],
+                two_stage=options['two_stage'],
+                webhook_workers=options['webhook_workers'],
+                webhook_duplicates=options['webhook_duplicates'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f'Имитатор Т-Банка: {simulator.base_url}/v2'))
+        if not settings.TBANK_API_URL.startswith(simulator.base_url):
+            self.stdout.write(self.style.WARNING(
+                f'⚠️ TBANK_API_URL сейчас {settings.TBANK_API_URL}; '
+                f'для работы с имитатором задайте TBANK_API_URL={simulator.base_url}/v2'
+            ))
+        self.stdout.write('Остановка: Ctrl+C')
+
+        try:
+            simulator.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            simulator.shutdown()
+            self.stdout.write('')
+            for name, value in sorted(simulator.summary().items()):
+                self.stdout.write(f'  {name}: {value}')
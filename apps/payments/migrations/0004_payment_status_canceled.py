@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_alter_payment_cache_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='status',
+            field=models.CharField(choices=[('new', 'Создан'), ('form_showed', 'Форма показана'), ('authorizing', 'Авторизация'), ('authorized', 'Авторизован'), ('confirming', 'Подтверждение'), ('confirmed', 'Подтвержден'), ('reversing', 'Отмена'), ('reversed', 'Отменен'), ('refunding', 'Возврат'), ('partial_refunded', 'Частичный возврат'), ('refunded', 'Возвращен'), ('rejected', 'Отклонен'), ('canceled', 'Отменен до оплаты'), ('deadline_expired', 'Истек срок')], default='new', max_length=30, verbose_name='Статус'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0015_archivedbooking'),
+        ('payments', '0004_payment_status_canceled'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPayment',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False, verbose_name='ID платежа')),
+                ('payment_id', models.CharField(max_length=100, verbose_name='ID платежа в Т-Банке')),
+                ('order_id', models.CharField(max_length=255, verbose_name='ID заказа')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Сумма платежа (₽)')),
+                ('payment_type', models.CharField(choices=[('deposit', 'Предоплата'), ('remaining', 'Остаток'), ('full', 'Полная оплата')], max_length=20, verbose_name='Тип платежа')),
+                ('status', models.CharField(choices=[('new', 'Создан'), ('form_showed', 'Форма показана'), ('authorizing', 'Авторизация'), ('authorized', 'Авторизован'), ('confirming', 'Подтверждение'), ('confirmed', 'Подтвержден'), ('reversing', 'Отмена'), ('reversed', 'Отменен'), ('refunding', 'Возврат'), ('partial_refunded', 'Частичный возврат'), ('refunded', 'Возвращен'), ('rejected', 'Отклонен'), ('canceled', 'Отменен до оплаты'), ('deadline_expired', 'Истек срок')], max_length=20, verbose_name='Статус платежа')),
+                ('error_code', models.CharField(blank=True, max_length=50, verbose_name='Код ошибки')),
+                ('error_message', models.TextField(blank=True, verbose_name='Сообщение об ошибке')),
+                ('raw_response', models.JSONField(blank=True, null=True, verbose_name='Полный ответ от Т-Банка')),
+                ('created_at', models.DateTimeField(verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(verbose_name='Дата обновления')),
+                ('paid_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата оплаты')),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='bookings.archivedbooking', verbose_name='Архивное бронирование')),
+            ],
+            options={
+                'verbose_name': 'Архивный платеж',
+                'verbose_name_plural': 'Архив платежей',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['payment_id'], name='payments_ar_payment_f9a2e6_idx'), models.Index(fields=['created_at'], name='payments_ar_created_866e78_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_archivedpayment'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedpayment',
+            name='payment_id',
+            field=models.CharField(blank=True, max_length=100, null=True, verbose_name='ID платежа в Т-Банке'),
+        ),
+        migrations.AlterField(
+            model_name='archivedpayment',
+            name='status',
+            field=models.CharField(choices=[('new', 'Создан'), ('form_showed', 'Форма показана'), ('authorizing', 'Авторизация'), ('authorized', 'Авторизован'), ('confirming', 'Подтверждение'), ('confirmed', 'Подтвержден'), ('reversing', 'Отмена'), ('reversed', 'Отменен'), ('refunding', 'Возврат'), ('partial_refunded', 'Частичный возврат'), ('refunded', 'Возвращен'), ('rejected', 'Отклонен'), ('canceled', 'Отменен до оплаты'), ('deadline_expired', 'Истек срок'), ('initializing', 'Инициализация'), ('init_failed', 'Ошибка инициализации')], max_length=20, verbose_name='Статус платежа'),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='payment_id',
+            field=models.CharField(blank=True, help_text='PaymentId, возвращаемый API Т-Банка (пустой, пока Init выполняется в фоне)', max_length=100, null=True, unique=True, verbose_name='ID платежа в Т-Банке'),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='status',
+            field=models.CharField(choices=[('new', 'Создан'), ('form_showed', 'Форма показана'), ('authorizing', 'Авторизация'), ('authorized', 'Авторизован'), ('confirming', 'Подтверждение'), ('confirmed', 'Подтвержден'), ('reversing', 'Отмена'), ('reversed', 'Отменен'), ('refunding', 'Возврат'), ('partial_refunded', 'Частичный возврат'), ('refunded', 'Возвращен'), ('rejected', 'Отклонен'), ('canceled', 'Отменен до оплаты'), ('deadline_expired', 'Истек срок'), ('initializing', 'Инициализация'), ('init_failed', 'Ошибка инициализации')], default='new', max_length=30, verbose_name='Статус'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0006_payment_async_init'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payment_id', models.CharField(max_length=100, verbose_name='ID платежа в Т-Банке')),
+                ('status', models.CharField(max_length=30, verbose_name='Статус из уведомления')),
+                ('payload', models.JSONField(verbose_name='Уведомление')),
+                ('received_at', models.DateTimeField(auto_now_add=True, verbose_name='Получено')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='Обработано')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток обработки')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка обработки')),
+            ],
+            options={
+                'verbose_name': 'Уведомление Т-Банка',
+                'verbose_name_plural': 'Уведомления Т-Банка',
+                'ordering': ['-received_at'],
+                'indexes': [models.Index(fields=['processed_at', 'received_at'], name='payments_pa_process_1e2c0e_idx')],
+                'unique_together': {('payment_id', 'status')},
+            },
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:34
+
+import json
+import zlib
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 500
+
+
+def move_raw_responses(apps, schema_editor):
+    """Переносит raw_response платежей (в т.ч. архивных) в журнал PaymentEvent пачками"""
+    PaymentEvent = apps.get_model('payments', 'PaymentEvent')
+    for model_name in ('Payment', 'ArchivedPayment'):
+        model = apps.get_model('payments', model_name)
+        rows = model.objects.exclude(raw_response__isnull=True).values_list(
+            'payment_id', 'order_id', 'status', 'raw_response'
+        )
+        events = []
+        for payment_id, order_id, status, raw in rows.iterator(chunk_size=BATCH_SIZE):
+            events.append(PaymentEvent(
+                payment_id=payment_id or '',
+                order_id=order_id,
+                source='legacy',
+                status=status,
+                payload=zlib.compress(json.dumps(raw, ensure_ascii=False, separators=(',', ':')).encode('utf-8')),
+            ))
+            if len(events) >= BATCH_SIZE:
+                PaymentEvent.objects.bulk_create(events)
+                events = []
+        PaymentEvent.objects.bulk_create(events)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0007_paymentnotification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payment_id', models.CharField(blank=True, max_length=100, verbose_name='ID платежа в Т-Банке')),
+                ('order_id', models.CharField(blank=True, max_length=255, verbose_name='ID заказа')),
+                ('source', models.CharField(choices=[('init', 'Init'), ('state', 'GetState'), ('webhook', 'Уведомление'), ('legacy', 'Перенесено из платежа')], max_length=20, verbose_name='Источник')),
+                ('status', models.CharField(blank=True, max_length=30, verbose_name='Статус')),
+                ('payload', models.BinaryField(verbose_name='Данные (JSON, zlib)')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата')),
+            ],
+            options={
+                'verbose_name': 'Событие платежа',
+                'verbose_name_plural': 'Журнал платежей Т-Банка',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['payment_id', 'created_at'], name='payments_pa_payment_ec2b3d_idx'), models.Index(fields=['created_at'], name='payments_pa_created_4b9611_idx')],
+            },
+        ),
+        migrations.RunPython(move_raw_responses, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='archivedpayment',
+            name='raw_response',
+        ),
+        migrations.RemoveField(
+            model_name='payment',
+            name='raw_response',
+        ),
+    ]
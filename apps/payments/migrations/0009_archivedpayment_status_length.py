@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0008_payment_event_log'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedpayment',
+            name='status',
+            field=models.CharField(choices=[('new', 'Создан'), ('form_showed', 'Форма показана'), ('authorizing', 'Авторизация'), ('authorized', 'Авторизован'), ('confirming', 'Подтверждение'), ('confirmed', 'Подтвержден'), ('reversing', 'Отмена'), ('reversed', 'Отменен'), ('refunding', 'Возврат'), ('partial_refunded', 'Частичный возврат'), ('refunded', 'Возвращен'), ('rejected', 'Отклонен'), ('canceled', 'Отменен до оплаты'), ('deadline_expired', 'Истек срок'), ('initializing', 'Инициализация'), ('init_failed', 'Ошибка инициализации')], max_length=30, verbose_name='Статус платежа'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0009_archivedpayment_status_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentRefund',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reason', models.CharField(blank=True, max_length=255, verbose_name='Причина')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='Выполнено')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+                ('last_attempt_at', models.DateTimeField(blank=True, null=True, verbose_name='Последняя попытка')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='refunds', to='payments.payment', verbose_name='Платеж')),
+            ],
+            options={
+                'verbose_name': 'Возврат платежа',
+                'verbose_name_plural': 'Очередь возвратов платежей',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['processed_at', 'created_at'], name='payments_pa_process_d79c4a_idx')],
+            },
+        ),
+    ]
@@ -1,6 +1,9 @@
+import json
+import zlib
+
 from django.db import models
 from django.core.validators import MinValueValidator
-from apps.bookings.models import Booking
+from apps.bookings.models import ArchivedBooking, Booking
 
 
 class Payment(models.Model):
@@ -19,7 +22,44 @@ class Payment(models.Model):
         PARTIAL_REFUNDED = 'partial_refunded', 'Частичный возврат'
         REFUNDED = 'refunded', 'Возвращен'
         REJECTED = 'rejected', 'Отклонен'
+        CANCELED = 'canceled', 'Отменен до оплаты'
         DEADLINE_EXPIRED = 'deadline_expired', 'Истек срок'
+        # Внутренние статусы: платеж создан у нас, Init в Т-Банке выполняется в фоне
+        INITIALIZING = 'initializing', 'Инициализация'
+        INIT_FAILED = 'init_failed', 'Ошибка инициализации'
+    
+    # Статусы Т-Банка, из которых платеж еще может перейти в другой без нашего участия
+    NON_FINAL_STATUSES = [
+        Status.NEW,
+        Status.FORM_SHOWED,
+        Status.AUTHORIZING,
+        Status.AUTHORIZED,
+        Status.CONFIRMING,
+        Status.REVERSING,
+        Status.REFUNDING,
+    ]
+    
+    # Порядок статусов в жизненном цикле платежа. Уведомления и ответы GetState могут прийти
+    # не по порядку - переход в статус с меньшим рангом (AUTHORIZED после CONFIRMED) не применяется
+    STATUS_RANK = {
+        Status.INITIALIZING: 0,
+        Status.NEW: 1,
+        Status.FORM_SHOWED: 2,
+        Status.AUTHORIZING: 3,
+        Status.AUTHORIZED: 4,
+        Status.CONFIRMING: 5,
+        Status.REVERSING: 5,
+        Status.CONFIRMED: 6,
+        Status.REVERSED: 6,
+        Status.REJECTED: 6,
+        Status.CANCELED: 6,
+        Status.DEADLINE_EXPIRED: 6,
+        Status.INIT_FAILED: 6,
+        # Частичных возвратов может быть несколько: PARTIAL_REFUNDED -> REFUNDING -> ...
+        Status.REFUNDING: 7,
+        Status.PARTIAL_REFUNDED: 7,
+        Status.REFUNDED: 8,
+    }
     
     class PaymentType(models.TextChoices):
         DEPOSIT = 'deposit', 'Предоплата'
@@ -38,8 +78,10 @@ class Payment(models.Model):
     payment_id = models.CharField(
         max_length=100,
         unique=True,
+        null=True,
+        blank=True,
         verbose_name='ID платежа в Т-Банке',
-        help_text='PaymentId, возвращаемый API Т-Банка'
+        help_text='PaymentId, возвращаемый API Т-Банка (пустой, пока Init выполняется в фоне)'
     )
     order_id = models.CharField(
         max_length=255,
@@ -89,12 +131,6 @@ class Payment(models.Model):
         blank=True,
         verbose_name='Сообщение об ошибке'
     )
-    raw_response = models.JSONField(
-        null=True,
-        blank=True,
-        verbose_name='Полный ответ от Т-Банка',
-        help_text='JSON ответ от API для отладки'
-    )
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Дата создания'
@@ -139,5 +175,150 @@ class Payment(models.Model):
         return self.status in [
             self.Status.REJECTED,
             self.Status.REVERSED,
-            self.Status.DEADLINE_EXPIRED
+            self.Status.CANCELED,
+            self.Status.DEADLINE_EXPIRED,
+            self.Status.INIT_FAILED,
+        ]
+    
+    def is_stale_status(self, new_status):
+        """Статус устарел: платеж уже прошел дальше по жизненному циклу"""
+        rank = self.STATUS_RANK.get(new_status)
+        current_rank = self.STATUS_RANK.get(self.status)
+        return rank is not None and current_rank is not None and rank < current_rank
+
+
+class ArchivedPayment(models.Model):
+    """Архив платежей архивных бронирований (переносятся вместе с бронированием)"""
+    id = models.IntegerField(primary_key=True, verbose_name='ID платежа')
+    booking = models.ForeignKey(
+        ArchivedBooking,
+        on_delete=models.CASCADE,
+        related_name='payments',
+        verbose_name='Архивное бронирование'
+    )
+    payment_id = models.CharField(max_length=100, null=True, blank=True, verbose_name='ID платежа в Т-Банке')
+    order_id = models.CharField(max_length=255, verbose_name='ID заказа')
+    amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Сумма платежа (₽)')
+    payment_type = models.CharField(max_length=20, choices=Payment.PaymentType.choices, verbose_name='Тип платежа')
+    status = models.CharField(max_length=30, choices=Payment.Status.choices, verbose_name='Статус платежа')
+    error_code = models.CharField(max_length=50, blank=True, verbose_name='Код ошибки')
+    error_message = models.TextField(blank=True, verbose_name='Сообщение об ошибке')
+    created_at = models.DateTimeField(verbose_name='Дата создания')
+    updated_at = models.DateTimeField(verbose_name='Дата обновления')
+    paid_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата оплаты')
+
+    class Meta:
+        verbose_name = 'Архивный платеж'
+        verbose_name_plural = 'Архив платежей'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['payment_id']),
+            models.Index(fields=['created_at']),
         ]
+
+    def __str__(self):
+        return f"Архив: платеж {self.order_id} - {self.amount} ₽"
+
+
+class PaymentNotification(models.Model):
+    """
+    Уведомление (webhook) Т-Банка, принятое к обработке.
+    Webhook только проверяет подпись и сохраняет уведомление; статус платежа
+    и бронирования обновляет фоновый обработчик по порядку поступления.
+    """
+    payment_id = models.CharField(max_length=100, verbose_name='ID платежа в Т-Банке')
+    status = models.CharField(max_length=30, verbose_name='Статус из уведомления')
+    payload = models.JSONField(verbose_name='Уведомление')
+    received_at = models.DateTimeField(auto_now_add=True, verbose_name='Получено')
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name='Обработано')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Попыток обработки')
+    error = models.TextField(blank=True, verbose_name='Ошибка обработки')
+
+    class Meta:
+        verbose_name = 'Уведомление Т-Банка'
+        verbose_name_plural = 'Уведомления Т-Банка'
+        ordering = ['-received_at']
+        # Повторная доставка того же статуса - дубль, не обрабатывается второй раз
+        unique_together = [['payment_id', 'status']]
+        indexes = [
+            # Очередь: необработанные по времени получения
+            models.Index(fields=['processed_at', 'received_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.payment_id}: {self.status}"
+
+
+class PaymentRefund(models.Model):
+    """
+    Отмена/возврат платежа в Т-Банке после массовой отмены бронирований.
+    Строка создается в одной транзакции с отменой брони: если фоновый поток
+    не выполнится (перезапуск воркера) или Т-Банк вернет ошибку, возврат
+    повторит команда retry_payment_refunds.
+    """
+    payment = models.ForeignKey(
+        Payment,
+        on_delete=models.CASCADE,
+        related_name='refunds',
+        verbose_name='Платеж'
+    )
+    reason = models.CharField(max_length=255, blank=True, verbose_name='Причина')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name='Выполнено')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')
+    last_attempt_at = models.DateTimeField(null=True, blank=True, verbose_name='Последняя попытка')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+
+    class Meta:
+        verbose_name = 'Возврат платежа'
+        verbose_name_plural = 'Очередь возвратов платежей'
+        ordering = ['-created_at']
+        indexes = [
+            # Очередь: невыполненные по времени создания
+            models.Index(fields=['processed_at', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Возврат платежа {self.payment_id} ({'выполнен' if self.processed_at else 'ожидает'})"
+
+
+class PaymentEvent(models.Model):
+    """
+    Журнал ответов и уведомлений Т-Банка (только добавление).
+    В Payment хранятся только нужные поля (статус, ссылка, ошибка), полный JSON -
+    здесь, в сжатом виде. Старые записи удаляет команда prune_payment_events.
+    """
+
+    class Source(models.TextChoices):
+        INIT = 'init', 'Init'
+        STATE = 'state', 'GetState'
+        WEBHOOK = 'webhook', 'Уведомление'
+        LEGACY = 'legacy', 'Перенесено из платежа'
+
+    payment_id = models.CharField(max_length=100, blank=True, verbose_name='ID платежа в Т-Банке')
+    order_id = models.CharField(max_length=255, blank=True, verbose_name='ID заказа')
+    source = models.CharField(max_length=20, choices=Source.choices, verbose_name='Источник')
+    status = models.CharField(max_length=30, blank=True, verbose_name='Статус')
+    payload = models.BinaryField(verbose_name='Данные (JSON, zlib)')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата')
+
+    class Meta:
+        verbose_name = 'Событие платежа'
+        verbose_name_plural = 'Журнал платежей Т-Банка'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['payment_id', 'created_at']),
+            # Удаление по сроку хранения
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.payment_id} {self.get_source_display()}: {self.status}"
+
+    @staticmethod
+    def pack(data):
+        return zlib.compress(json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8'))
+
+    @property
+    def data(self):
+        return json.loads(zlib.decompress(bytes(self.payload)).decode('utf-8'))
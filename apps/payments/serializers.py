@@ -51,3 +51,29 @@ class PaymentStatusSerializer(serializers.Serializer):
     status_display = serializers.CharField()
     is_paid = serializers.BooleanField()
     is_failed = serializers.BooleanField()
+
+
+class PaymentInitStatusSerializer(serializers.ModelSerializer):
+    """Сериализатор для опроса готовности ссылки на оплату (асинхронный Init)"""
+    
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    is_ready = serializers.SerializerMethodField()
+    is_failed = serializers.BooleanField(read_only=True)
+    
+    class Meta:
+        model = Payment
+        fields = [
+            'id',
+            'booking',
+            'payment_id',
+            'status',
+            'status_display',
+            'payment_url',
+            'is_ready',
+            'is_failed',
+            'error_message',
+        ]
+        read_only_fields = fields
+    
+    def get_is_ready(self, obj):
+        return bool(obj.payment_url)
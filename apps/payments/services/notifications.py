@@ -0,0 +1,172 @@
+"""
+Очередь уведомлений (webhook) Т-Банка.
+
+Webhook проверяет подпись, сохраняет уведомление с ключом дедупликации
+(PaymentId, Status) и сразу отвечает "OK". Обработка (статус платежа, эффекты
+оплаты, уведомления в мессенджеры и календарь) выполняется в фоне.
+
+Уведомления одного платежа всегда попадают в один и тот же однопоточный
+обработчик (шард по PaymentId), поэтому применяются строго в порядке получения.
+Необработанные после сбоя уведомления дообрабатывает команда
+process_payment_notifications.
+"""
+import logging
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import Payment, PaymentEvent, PaymentNotification
+from .payment_status import apply_payment_status
+
+logger = logging.getLogger(__name__)
+
+# После стольких неудачных попыток уведомление остается в очереди только для разбора вручную
+MAX_ATTEMPTS = 5
+
+_shards = {}
+_shards_lock = threading.Lock()
+
+
+def _get_shard(payment_id, workers):
+    index = zlib.crc32(str(payment_id).encode('utf-8')) % workers
+    with _shards_lock:
+        if index not in _shards:
+            _shards[index] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'tbank-webhook-{index}')
+        return _shards[index]
+
+
+def _run_in_worker(payment_id):
+    from django.db import connection
+
+    try:
+        process_payment_notifications(payment_id)
+    except Exception as e:
+        logger.error(f"❌ Error processing notifications for payment {payment_id}: {str(e)}", exc_info=True)
+    finally:
+        connection.close()
+
+
+def schedule_processing(payment_id):
+    """Ставит обработку уведомлений платежа в его шард (PAYMENT_WEBHOOK_WORKERS=0 - сразу в текущем потоке)"""
+    workers = getattr(settings, 'PAYMENT_WEBHOOK_WORKERS', 2)
+    if workers <= 0:
+        process_payment_notifications(payment_id)
+    else:
+        _get_shard(payment_id, workers).submit(_run_in_worker, payment_id)
+
+
+def enqueue_notification(notification_data):
+    """
+    Сохраняет проверенное уведомление и планирует его обработку.
+
+    Returns:
+        bool: False, если такое уведомление (PaymentId, Status) уже было получено
+    """
+    payment_id = str(notification_data['PaymentId'])
+    try:
+        with transaction.atomic():
+            PaymentNotification.objects.create(
+                payment_id=payment_id,
+                status=notification_data.get('Status', '').lower(),
+                payload=notification_data,
+            )
+    except IntegrityError:
+        logger.info(f"Duplicate webhook notification ignored: {payment_id} {notification_data.get('Status')}")
+        return False
+
+    transaction.on_commit(lambda: schedule_processing(payment_id))
+    return True
+
+
+def process_payment_notifications(payment_id):
+    """
+    Применяет все необработанные уведомления платежа по порядку получения
+    под блокировкой строки Payment.
+
+    Returns:
+        int: число обработанных уведомлений
+    """
+    pending = PaymentNotification.objects.filter(
+        payment_id=payment_id, processed_at__isnull=True, attempts__lt=MAX_ATTEMPTS
+    ).order_by('id')
+
+    try:
+        with transaction.atomic():
+            payment = Payment.objects.select_for_update().select_related('booking').filter(
+                payment_id=payment_id
+            ).first()
+            notifications = list(pending)
+            if not notifications:
+                return 0
+            if payment is None:
+                raise Payment.DoesNotExist(f'Payment not found: {payment_id}')
+
+            for notification in notifications:
+                data = notification.payload
+                apply_payment_status(
+                    payment,
+                    notification.status,
+                    data,
+                    PaymentEvent.Source.WEBHOOK,
+                    error_code=data.get('ErrorCode'),
+                    error_message=data.get('Message', ''),
+                )
+
+            PaymentNotification.objects.filter(id__in=[n.id for n in notifications]).update(
+                processed_at=timezone.now(),
+                attempts=F('attempts') + 1,
+                error='',
+            )
+    except Exception as e:
+        # Транзакция откатилась целиком - уведомления останутся в очереди для повторной попытки
+        logger.error(f"Failed to process notifications for payment {payment_id}: {str(e)}")
+        pending.update(attempts=F('attempts') + 1, error=str(e))
+        return 0
+
+    return len(notifications)
+
+
+def pending_payment_ids(older_than_seconds=0):
+    """PaymentId с необработанными уведомлениями (для дообработки командой)"""
+    queryset = PaymentNotification.objects.filter(processed_at__isnull=True, attempts__lt=MAX_ATTEMPTS)
+    if older_than_seconds:
+        queryset = queryset.filter(received_at__lte=timezone.now() - timedelta(seconds=older_than_seconds))
+    return list(queryset.order_by('payment_id').values_list('payment_id', flat=True).distinct())
+
+
+def queue_metrics(window_minutes=60):
+    """
+    Метрики очереди уведомлений.
+
+    Returns:
+        dict: queue_depth - ждут обработки; oldest_pending_seconds - возраст самого старого;
+        failed - исчерпали попытки; processed, avg_lag_seconds, max_lag_seconds -
+        обработанные за последние window_minutes минут и задержка от получения до обработки
+    """
+    now = timezone.now()
+    pending = PaymentNotification.objects.filter(processed_at__isnull=True)
+    queue = pending.filter(attempts__lt=MAX_ATTEMPTS)
+    oldest = queue.order_by('received_at').values_list('received_at', flat=True).first()
+
+    lags = [
+        (processed_at - received_at).total_seconds()
+        for received_at, processed_at in PaymentNotification.objects.filter(
+            processed_at__gte=now - timedelta(minutes=window_minutes)
+        ).values_list('received_at', 'processed_at')
+    ]
+
+    return {
+        'queue_depth': queue.count(),
+        'oldest_pending_seconds': round((now - oldest).total_seconds(), 1) if oldest else 0,
+        'failed': pending.filter(attempts__gte=MAX_ATTEMPTS).count(),
+        'window_minutes': window_minutes,
+        'processed': len(lags),
+        'avg_lag_seconds': round(sum(lags) / len(lags), 3) if lags else 0,
+        'max_lag_seconds': round(max(lags), 3) if lags else 0,
+    }
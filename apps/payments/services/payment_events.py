@@ -0,0 +1,72 @@
+"""
+Журнал ответов и уведомлений Т-Банка (PaymentEvent).
+
+В Payment хранятся только используемые поля (статус, ссылка на оплату, ошибка).
+Полные ответы Init / GetState и уведомления пишутся отдельными сжатыми записями,
+которые команда prune_payment_events удаляет по истечении срока хранения.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import PaymentEvent, PaymentNotification
+
+logger = logging.getLogger(__name__)
+
+
+def record_payment_event(source, data, payment_id='', order_id='', status=''):
+    """Добавляет запись в журнал. Ошибка записи не должна ломать обработку платежа"""
+    data = data or {}
+    try:
+        # Точка сохранения: ошибка вставки не должна ломать внешнюю транзакцию обработки платежа
+        with transaction.atomic():
+            return PaymentEvent.objects.create(
+                payment_id=str(payment_id or data.get('PaymentId') or ''),
+                order_id=order_id or data.get('OrderId') or '',
+                source=source,
+                status=(status or data.get('Status') or '').lower(),
+                payload=PaymentEvent.pack(data),
+            )
+    except Exception as e:
+        logger.error(f"Failed to record payment event {source} for {payment_id}: {str(e)}")
+        return None
+
+
+def _delete_in_batches(queryset, batch_size):
+    deleted = 0
+    while True:
+        ids = list(queryset.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += queryset.model.objects.filter(id__in=ids).delete()[0]
+
+
+def prune_payment_events(days=None, notification_days=None, batch_size=1000, dry_run=False):
+    """
+    Удаляет записи журнала старше days дней и обработанные уведомления старше notification_days.
+
+    Returns:
+        dict: events, notifications - удалено (при dry_run - будет удалено)
+    """
+    if days is None:
+        days = getattr(settings, 'PAYMENT_EVENT_RETENTION_DAYS', 180)
+    if notification_days is None:
+        notification_days = getattr(settings, 'PAYMENT_NOTIFICATION_RETENTION_DAYS', 30)
+
+    now = timezone.now()
+    events = PaymentEvent.objects.filter(created_at__lt=now - timedelta(days=days))
+    # Необработанные уведомления не удаляем - они нужны для дообработки и разбора ошибок
+    notifications = PaymentNotification.objects.filter(
+        processed_at__isnull=False, received_at__lt=now - timedelta(days=notification_days)
+    )
+
+    if dry_run:
+        return {'events': events.count(), 'notifications': notifications.count()}
+
+    return {
+        'events': _delete_in_batches(events.order_by('id'), batch_size),
+        'notifications': _delete_in_batches(notifications.order_by('id'), batch_size),
+    }
@@ -0,0 +1,202 @@
+"""
+Создание платежа по бронированию: Init в Т-Банке и сохранение Payment.
+
+Синхронный режим вызывает Init прямо в запросе (до 30 сек при проблемах шлюза).
+В асинхронном режиме Payment сохраняется сразу со статусом INITIALIZING,
+а Init выполняется после коммита в пуле фоновых потоков; клиент получает
+ID платежа и опрашивает /api/payments/{id}/init_status/, пока не появится ссылка.
+Задача Init живет только в памяти процесса: платежи, зависшие в INITIALIZING
+после перезапуска, reconcile_payments переводит в INIT_FAILED (fail_stale_initializing).
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import Payment, PaymentEvent
+from .payment_events import record_payment_event
+from .tbank_service import TBankService
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'PAYMENT_INIT_WORKERS', 4),
+                thread_name_prefix='payment-init'
+            )
+        return _executor
+
+
+def _run_in_worker(payment_pk, init_kwargs):
+    from django.db import connection
+
+    try:
+        process_payment_init(payment_pk, init_kwargs)
+    finally:
+        connection.close()
+
+
+def _submit(payment_pk, init_kwargs):
+    # PAYMENT_INIT_WORKERS=0 - Init выполняется сразу после коммита в текущем потоке
+    if getattr(settings, 'PAYMENT_INIT_WORKERS', 4) <= 0:
+        process_payment_init(payment_pk, init_kwargs)
+    else:
+        _get_executor().submit(_run_in_worker, payment_pk, init_kwargs)
+
+
+def init_booking_payment(booking, payment_type, amount, description, order_suffix,
+                         customer_email=None, payment_method='full_prepayment',
+                         redirect_due_date=None, run_async=False):
+    """
+    Создает платеж по бронированию.
+
+    Args:
+        order_suffix: часть order_id и параметр type в URL возврата (deposit / remaining / full)
+        run_async: True - вернуть Payment в статусе INITIALIZING, Init выполнить в фоне
+
+    Returns:
+        Payment
+
+    Raises:
+        Exception: ошибки Т-Банка в синхронном режиме
+    """
+    order_id = f"booking_{booking.id}_{order_suffix}_{int(timezone.now().timestamp())}"
+    success_url = f"{settings.PAYMENT_SUCCESS_URL}?booking_id={booking.id}&type={order_suffix}"
+    fail_url = f"{settings.PAYMENT_FAIL_URL}?booking_id={booking.id}&type={order_suffix}"
+
+    init_kwargs = {
+        'amount': amount,
+        'order_id': order_id,
+        'description': description,
+        'success_url': success_url,
+        'fail_url': fail_url,
+        'customer_email': customer_email,
+        'customer_phone': booking.guest_phone,
+        'payment_method': payment_method,
+        'redirect_due_date': redirect_due_date,
+    }
+
+    if run_async:
+        payment = Payment.objects.create(
+            booking=booking,
+            order_id=order_id,
+            amount=amount,
+            payment_type=payment_type,
+            status=Payment.Status.INITIALIZING,
+            success_url=success_url,
+            fail_url=fail_url,
+        )
+        logger.info(f"Payment {payment.pk} for booking {booking.id} queued for T-Bank Init")
+        transaction.on_commit(lambda: _submit(payment.pk, init_kwargs))
+        return payment
+
+    logger.info(f"Calling init_payment with amount: {amount}, order_id: {order_id}")
+    payment_result = TBankService().init_payment(**init_kwargs)
+    record_payment_event(PaymentEvent.Source.INIT, payment_result['raw_response'], order_id=order_id)
+
+    return Payment.objects.create(
+        booking=booking,
+        payment_id=payment_result['PaymentId'],
+        order_id=order_id,
+        amount=amount,
+        payment_type=payment_type,
+        status=payment_result['Status'].lower(),
+        payment_url=payment_result['PaymentURL'],
+        success_url=success_url,
+        fail_url=fail_url,
+    )
+
+
+def process_payment_init(payment_pk, init_kwargs):
+    """Выполняет Init для платежа в статусе INITIALIZING и сохраняет результат"""
+    from apps.bookings.models import Booking
+
+    payment = Payment.objects.select_related('booking').filter(
+        pk=payment_pk, status=Payment.Status.INITIALIZING
+    ).first()
+    if payment is None:
+        return
+
+    booking = payment.booking
+    if booking.status == Booking.Status.CANCELLED:
+        _mark_init_failed(payment, 'Бронирование отменено до создания платежа')
+        return
+
+    try:
+        payment_result = TBankService().init_payment(**init_kwargs)
+    except Exception as e:
+        logger.error(f"Error initializing payment {payment_pk} for booking {booking.id}: {str(e)}", exc_info=True)
+        _mark_init_failed(payment, str(e))
+        if payment.payment_type == Payment.PaymentType.DEPOSIT:
+            _cancel_reserved_booking(booking, f"Ошибка инициализации оплаты: {str(e)}")
+        return
+
+    updated = Payment.objects.filter(pk=payment_pk, status=Payment.Status.INITIALIZING).update(
+        payment_id=payment_result['PaymentId'],
+        status=payment_result['Status'].lower(),
+        payment_url=payment_result['PaymentURL'],
+        updated_at=timezone.now(),
+    )
+    record_payment_event(PaymentEvent.Source.INIT, payment_result['raw_response'], order_id=payment.order_id)
+    if updated:
+        logger.info(f"✅ Payment {payment_pk} initialized for booking {booking.id}: {payment_result['PaymentId']}")
+
+
+def fail_stale_initializing(max_age=None):
+    """
+    Переводит в INIT_FAILED платежи, которые дольше max_age секунд остаются в INITIALIZING
+    (задача Init потеряна при перезапуске процесса). RESERVED-бронь под предоплату
+    отменяется, как при ошибке Init.
+
+    Returns:
+        int: число переведенных платежей
+    """
+    if max_age is None:
+        max_age = getattr(settings, 'PAYMENT_INIT_TIMEOUT', 300)
+    stale = Payment.objects.select_related('booking').filter(
+        status=Payment.Status.INITIALIZING,
+        created_at__lte=timezone.now() - timedelta(seconds=max_age),
+    )
+
+    failed = 0
+    for payment in stale:
+        # Условный UPDATE: платеж, который фоновый Init успел обновить, не трогаем
+        if not _mark_init_failed(payment, 'Платеж не инициализирован: задача Init потеряна'):
+            continue
+        failed += 1
+        logger.warning(f"⚠️ Payment {payment.pk} stuck in INITIALIZING, marked as init_failed")
+        if payment.booking and payment.payment_type == Payment.PaymentType.DEPOSIT:
+            _cancel_reserved_booking(payment.booking, 'Ошибка инициализации оплаты: платеж не создан')
+    return failed
+
+
+def _mark_init_failed(payment, message):
+    return Payment.objects.filter(pk=payment.pk, status=Payment.Status.INITIALIZING).update(
+        status=Payment.Status.INIT_FAILED,
+        error_message=message,
+        updated_at=timezone.now(),
+    )
+
+
+def _cancel_reserved_booking(booking, notes):
+    """Неоплаченная бронь без платежной ссылки не должна держать места"""
+    from apps.bookings.models import Booking
+    from apps.bookings.services.transitions import transition, BookingTransitionError
+
+    if booking.status != Booking.Status.RESERVED:
+        return
+    try:
+        transition(booking, Booking.Status.CANCELLED, notes=notes, hold_expires_at=None)
+    except BookingTransitionError as e:
+        logger.error(f"Failed to cancel booking {booking.id} after payment init error: {str(e)}")
@@ -0,0 +1,230 @@
+"""
+Применение статуса платежа Т-Банка: обновление Payment и побочные эффекты оплаты.
+
+Используется обработчиком уведомлений (webhook), сверкой и проверкой статуса (check_status).
+Вызывающий код держит блокировку строки Payment (select_for_update) в транзакции,
+поэтому эффекты оплаты применяются ровно один раз.
+
+check_status отдает статус из БД, если он финальный или недавно обновлялся,
+и ходит в Т-Банк (GetState) только за устаревшими незавершенными платежами.
+Одновременные опросы одного платежа объединяются в один запрос через блокировку в кэше.
+"""
+import logging
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from apps.bookings.models import Booking
+from apps.bookings.services.transitions import transition, BookingTransitionError
+from ..models import Payment, PaymentEvent
+from .payment_events import record_payment_event
+from .tbank_service import TBankService
+
+logger = logging.getLogger(__name__)
+
+
+def apply_payment_status(payment, new_status, raw_response, source, error_code=None, error_message=''):
+    """
+    Обновляет статус заблокированного платежа и сохраняет его.
+    Полный ответ Т-Банка (raw_response) записывается в журнал PaymentEvent.
+
+    Устаревший статус (например, AUTHORIZED, пришедший после CONFIRMED) только
+    записывается в журнал: статус платежа назад не откатывается.
+
+    Returns:
+        str: предыдущий статус
+    """
+    old_status = payment.status
+    record_payment_event(source, raw_response, payment_id=payment.payment_id, order_id=payment.order_id, status=new_status)
+
+    if payment.is_stale_status(new_status):
+        logger.info(f"Payment {payment.payment_id}: ignoring stale status {new_status} (current {old_status})")
+        # Отмечаем время проверки, чтобы check_status не опрашивал Т-Банк повторно
+        payment.save(update_fields=['updated_at'])
+        return old_status
+
+    payment.status = new_status
+
+    # Обрабатываем ошибки
+    if error_code:
+        payment.error_code = error_code
+        payment.error_message = error_message
+
+    # Если платеж успешно оплачен и еще не обработан - применяем эффекты ровно один раз
+    if payment.is_paid() and not payment.paid_at:
+        payment.paid_at = timezone.now()
+        apply_paid_booking_effects(payment)
+    elif payment.is_failed():
+        logger.warning(f"Payment {payment.payment_id} failed with status {new_status}")
+
+    payment.save()
+
+    if old_status != new_status:
+        logger.info(f"Payment {payment.payment_id} status updated: {old_status} -> {new_status}")
+    return old_status
+
+
+# Сколько держим блокировку опроса Т-Банка (GetState до 30 сек)
+REFRESH_LOCK_TIMEOUT = 35
+# Интервал чтения БД при ожидании результата чужого запроса / webhook
+POLL_INTERVAL = 0.5
+
+
+def needs_refresh(payment, max_age=None):
+    """Статус в БД устарел: платеж не финальный и не обновлялся дольше max_age секунд"""
+    if payment.status not in Payment.NON_FINAL_STATUSES or not payment.payment_id:
+        return False
+    if max_age is None:
+        max_age = getattr(settings, 'PAYMENT_STATUS_MAX_AGE', 10)
+    return payment.updated_at < timezone.now() - timedelta(seconds=max_age)
+
+
+def wait_for_payment(payment, changed, timeout):
+    """
+    Перечитывает платеж из БД, пока changed(свежий платеж) не станет True или не выйдет timeout.
+    Возвращает последнее прочитанное состояние.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        fresh = Payment.objects.filter(pk=payment.pk).first()
+        if fresh is None:
+            break
+        payment = fresh
+        if changed(payment):
+            break
+    return payment
+
+
+def refresh_payment_status(payment, max_age=None):
+    """
+    Актуальный статус платежа для check_status.
+
+    Свежий или финальный статус отдается из БД без запроса в Т-Банк. Иначе GetState
+    выполняет только первый из одновременных запросов, остальные ждут обновления строки.
+    Если блокировка снята без обновления (GetState у первого запроса упал), ожидающий
+    сам берет блокировку и повторяет GetState.
+
+    Raises:
+        Exception: ошибка Т-Банка у запроса, который выполнял GetState
+    """
+    if not needs_refresh(payment, max_age):
+        return payment
+
+    lock_key = f'payment_state_refresh_{payment.pk}'
+    if not cache.add(lock_key, True, REFRESH_LOCK_TIMEOUT):
+        # GetState по этому платежу уже выполняется - ждем его результат или снятия блокировки
+        checked_at = payment.updated_at
+        payment = wait_for_payment(
+            payment,
+            lambda fresh: fresh.updated_at > checked_at or cache.get(lock_key) is None,
+            REFRESH_LOCK_TIMEOUT,
+        )
+        if payment.updated_at > checked_at or not cache.add(lock_key, True, REFRESH_LOCK_TIMEOUT):
+            return payment
+        logger.warning(f"⚠️ Payment {payment.pk} state refresh lock released without update, retrying GetState")
+
+    try:
+        result = TBankService().get_payment_state(payment.payment_id)
+        new_status = result['Status'].lower()
+
+        with transaction.atomic():
+            # Блокируем платеж, чтобы обработчик webhook/check_status не применяли побочные эффекты параллельно
+            payment = Payment.objects.select_for_update().select_related('booking').get(pk=payment.pk)
+            if payment.status != new_status:
+                apply_payment_status(payment, new_status, result['raw_response'], PaymentEvent.Source.STATE)
+            else:
+                # Статус не изменился - отмечаем время проверки
+                payment.updated_at = timezone.now()
+                Payment.objects.filter(pk=payment.pk).update(updated_at=payment.updated_at)
+        return payment
+    finally:
+        cache.delete(lock_key)
+
+
+def send_payment_confirmed_notifications(booking):
+    """Отправка уведомлений о полной оплате бронирования.
+    Одна персона = одно сообщение (без дублей, если владелец = клиент)."""
+    try:
+        from apps.bookings.services.telegram_service import TelegramService
+        from apps.bookings.services.max_service import MaxService
+        from apps.bookings.signals import _format_booking_message
+
+        telegram_service = TelegramService()
+        max_service = MaxService()
+        seen_user_ids = set()
+
+        def send_if_new(user, prefix, role_name):
+            has_any_chat = bool(getattr(user, 'telegram_chat_id', None) or getattr(user, 'max_chat_id', None))
+            if user and has_any_chat and user.id not in seen_user_ids:
+                seen_user_ids.add(user.id)
+                logger.info(f"Sending payment confirmation to {role_name} {user.email}")
+                message = prefix + _format_booking_message(booking)
+                telegram_service.send_to_user(user, message)
+                max_service.send_to_user(user, message)
+
+        send_if_new(booking.customer, "✅ Оплата прошла успешно! Ждем вас на борту.\n\n", "customer")
+        send_if_new(booking.boat.owner, "💰 Бронирование полностью оплачено!\n\n", "boat_owner")
+
+    except Exception as e:
+        logger.error(f"Error sending payment confirmation notifications: {str(e)}", exc_info=True)
+
+
+def apply_paid_booking_effects(payment):
+    """
+    Применяет побочные эффекты успешной оплаты ровно один раз под блокировкой Payment.
+    Статус брони меняется условным UPDATE (services.transitions) без пересчета цен.
+    """
+    booking = payment.booking
+
+    if payment.payment_type == Payment.PaymentType.DEPOSIT:
+        # Предоплата внесена - меняем статус с RESERVED на PENDING
+        fields = {}
+        if booking.deposit != payment.amount:
+            fields['deposit'] = payment.amount
+            fields['remaining_amount'] = booking.total_price - payment.amount
+
+        if booking.status == Booking.Status.RESERVED:
+            # Удержание мест превращается в занятые места в той же транзакции,
+            # в которой заблокирован платеж (webhook / check_status)
+            try:
+                transition(booking, Booking.Status.PENDING, hold_expires_at=None, **fields)
+                logger.info(f"Deposit paid for booking {booking.id}, status changed to {booking.status}")
+            except BookingTransitionError as e:
+                logger.error(f"Deposit paid for booking {booking.id}, but status was not changed: {str(e)}")
+        elif fields:
+            Booking.objects.filter(pk=booking.pk).update(updated_at=timezone.now(), **fields)
+            logger.info(f"Deposit amount updated for booking {booking.id}")
+
+    elif payment.payment_type in (Payment.PaymentType.REMAINING, Payment.PaymentType.FULL):
+        # Остаток оплачен / полная оплата (от гостиницы) - подтверждаем бронь
+        fields = {
+            'deposit': booking.total_price,
+            'remaining_amount': Decimal('0'),
+            'payment_method': Booking.PaymentMethod.ONLINE,
+        }
+        if payment.payment_type == Payment.PaymentType.REMAINING:
+            logger.info(f"Remaining amount paid for booking {booking.id}")
+        else:
+            logger.info(f"Full payment completed for hotel booking {booking.id}")
+            logger.info(f"Hotel cashback: {booking.hotel_cashback_percent}% = {booking.hotel_cashback_amount} RUB")
+            fields['hold_expires_at'] = None
+
+        if booking.status == Booking.Status.CONFIRMED:
+            Booking.objects.filter(pk=booking.pk).update(updated_at=timezone.now(), **fields)
+            for name, value in fields.items():
+                setattr(booking, name, value)
+        else:
+            try:
+                transition(booking, Booking.Status.CONFIRMED, **fields)
+            except BookingTransitionError as e:
+                logger.error(f"Payment {payment.payment_id} paid for booking {booking.id}, but status was not changed: {str(e)}")
+                return
+
+        # Отправляем уведомления о полной оплате только в рамках первого успешного применения
+        send_payment_confirmed_notifications(booking)
@@ -4,10 +4,13 @@
 """
 
 import hashlib
+import time
 import requests
+from datetime import datetime
 from decimal import Decimal
 from typing import Dict, Optional
 from django.conf import settings
+from django.utils import timezone
 import logging
 
 logger = logging.getLogger(__name__)
@@ -70,7 +73,6 @@ class TBankService:
         token = hashlib.sha256(concatenated.encode('utf-8')).hexdigest()
         
         logger.debug(f"Generated token for fields: {list(token_data.keys())}")
-        logger.debug(f"Token concatenated string: {concatenated}")
         return token
     
     def _make_request(self, endpoint: str, data: Dict) -> Dict:
@@ -93,12 +95,8 @@ class TBankService:
         data['TerminalKey'] = self.terminal_key
         data['Token'] = self.generate_token(data)
         
+        started = time.monotonic()
         try:
-            logger.info(f"Making request to T-Bank API: {endpoint}")
-            # Логируем данные без пароля для безопасности
-            safe_data = {k: v for k, v in data.items() if k not in ['Token']}
-            logger.info(f"Request data: {safe_data}")
-            
             response = requests.post(
                 url,
                 json=data,
@@ -106,19 +104,21 @@ class TBankService:
                 timeout=30
             )
             
-            logger.info(f"Response status: {response.status_code}")
-            logger.info(f"Response text: {response.text}")
-            
             response.raise_for_status()
             
             result = response.json()
             
+            # Одна строка на запрос; полный ответ сохраняется в журнал PaymentEvent
+            logger.info(
+                f"T-Bank {endpoint}: HTTP {response.status_code}, Status={result.get('Status')}, "
+                f"ErrorCode={result.get('ErrorCode')}, {(time.monotonic() - started) * 1000:.0f} ms"
+            )
+            
             # Проверяем успешность операции
             if not result.get('Success', False):
                 error_code = result.get('ErrorCode', 'UNKNOWN')
                 error_message = result.get('Message', 'Unknown error') or result.get('Details', 'No details')
                 logger.error(f"T-Bank API error: {error_code} - {error_message}")
-                logger.error(f"Full response: {result}")
                 raise TBankAPIException(f"T-Bank API Error [{error_code}]: {error_message}")
             
             return result
@@ -194,6 +194,7 @@ class TBankService:
         customer_phone: Optional[str] = None,
         receipt_item_name: Optional[str] = None,
         payment_method: str = 'full_prepayment',
+        redirect_due_date: Optional[datetime] = None,
     ) -> Dict:
         """
         Инициализация платежа (метод Init)
@@ -208,6 +209,7 @@ class TBankService:
             customer_phone: Телефон клиента (для чека 54-ФЗ)
             receipt_item_name: Название в чеке (опционально)
             payment_method: full_prepayment / full_payment для чека
+            redirect_due_date: Срок жизни платежной ссылки (например, до конца удержания мест)
             
         Returns:
             Словарь с данными платежа
@@ -232,6 +234,10 @@ class TBankService:
         if fail_url:
             data['FailURL'] = fail_url
 
+        if redirect_due_date:
+            # Формат Т-Банка: YYYY-MM-DDTHH:MM:SS+03:00
+            data['RedirectDueDate'] = timezone.localtime(redirect_due_date).isoformat(timespec='seconds')
+
         # Объект Receipt (чек 54-ФЗ) — обязателен для боевого режима
         receipt = self._build_receipt(
             amount_in_kopecks=amount_in_kopecks,
@@ -355,8 +361,7 @@ class TBankService:
         
         is_valid = received_token == expected_token
         if not is_valid:
-            logger.warning(f"Invalid notification token. Expected: {expected_token}, got: {received_token}")
-            logger.debug(f"Notification data: {notification_data}")
+            logger.warning(f"Invalid notification token for payment {notification_data.get('PaymentId')}")
         
         return is_valid
     
\ No newline at end of file
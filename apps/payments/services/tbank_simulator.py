@@ -0,0 +1,324 @@
+"""
+Локальный имитатор API Т-Банка для нагрузочного и интеграционного тестирования.
+
+Реализует Init, GetState, Confirm и Cancel с проверкой Token (тот же алгоритм
+подписи, что в TBankService) и отправляет подписанные уведомления на webhook
+(PaymentViewSet.webhook). Задержка ответов, доля ошибок и автоматическая
+"оплата" после Init настраиваются. Запускается командой tbank_simulator;
+для работы с ним достаточно указать TBANK_API_URL=http://<host>:<port>/v2.
+"""
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import requests
+
+from .tbank_service import TBankService
+
+logger = logging.getLogger(__name__)
+
+# Переходы статусов по методам: текущий статус -> новый
+CONFIRM_TRANSITIONS = {'AUTHORIZED': 'CONFIRMED'}
+CANCEL_TRANSITIONS = {
+    'NEW': 'CANCELED',
+    'FORM_SHOWED': 'CANCELED',
+    'AUTHORIZED': 'REVERSED',
+    'CONFIRMED': 'REFUNDED',
+}
+
+
+class TBankSimulator:
+    """
+    Имитатор шлюза: хранит платежи в памяти и обслуживает HTTP в пуле потоков.
+
+    Args:
+        latency: (min, max) задержка ответа в секундах
+        error_rate: доля запросов, на которые отвечаем ошибкой API (Success=false)
+        http_error_rate: доля запросов, на которые отвечаем HTTP 503
+        webhook_url: куда отправлять уведомления (None - NotificationURL из Init)
+        send_webhooks: отправлять ли уведомления
+        auto_pay_after: через сколько секунд после Init платеж "оплачивается" (None - только по ссылке)
+        decline_rate: доля оплат, которые завершаются отказом (REJECTED)
+        two_stage: оплата переводит платеж в AUTHORIZED (нужен Confirm), иначе сразу CONFIRMED
+        webhook_workers: параллельных отправок уведомлений (разных платежей)
+        webhook_duplicates: сколько раз отправлять каждое уведомление (проверка дедупликации)
+    """
+
+    def __init__(self, host='127.0.0.1', port=8765, latency=(0, 0), error_rate=0.0, http_error_rate=0.0,
+                 webhook_url=None, send_webhooks=True, auto_pay_after=None, decline_rate=0.0,
+                 two_stage=False, webhook_workers=4, webhook_duplicates=1):
+        self.signer = TBankService()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.http_error_rate = http_error_rate
+        self.webhook_url = webhook_url
+        self.send_webhooks = send_webhooks
+        self.auto_pay_after = auto_pay_after
+        self.decline_rate = decline_rate
+        self.two_stage = two_stage
+        self.webhook_duplicates = max(1, webhook_duplicates)
+
+        self.payments = {}
+        self.stats = Counter()
+        self.webhook_seconds = 0.0
+        self._lock = threading.Lock()
+        self._webhooks = ThreadPoolExecutor(max_workers=max(1, webhook_workers), thread_name_prefix='tbank-sim-webhook')
+
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def start(self):
+        """Запуск в фоновом потоке (для тестов)"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self._webhooks.shutdown(wait=True)
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    # === API ===
+
+    def handle_api(self, method, data):
+        """Обработка вызова API. Возвращает (HTTP статус, тело ответа)"""
+        self._count(f'api_{method}')
+
+        if self.latency[1] > 0:
+            time.sleep(random.uniform(*self.latency))
+
+        if self.http_error_rate and random.random() < self.http_error_rate:
+            self._count('injected_http_errors')
+            return 503, {'Success': False, 'ErrorCode': '503', 'Message': 'Service unavailable (simulated)'}
+
+        if data.get('TerminalKey') != self.signer.terminal_key:
+            return 200, self._error('202', 'Терминал не найден')
+        if data.get('Token') != self.signer.generate_token(data):
+            self._count('invalid_tokens')
+            return 200, self._error('204', 'Неверный токен. Проверьте пару TerminalKey/SecretKey')
+
+        if self.error_rate and random.random() < self.error_rate:
+            self._count('injected_api_errors')
+            return 200, self._error('9999', 'Внутренняя ошибка системы (имитация)')
+
+        handler = {
+            'Init': self._init,
+            'GetState': self._get_state,
+            'Confirm': self._confirm,
+            'Cancel': self._cancel,
+        }.get(method)
+        if handler is None:
+            return 404, self._error('404', f'Метод {method} не поддерживается имитатором')
+        return 200, handler(data)
+
+    def _error(self, code, message):
+        return {
+            'Success': False,
+            'ErrorCode': code,
+            'Message': message,
+            'TerminalKey': self.signer.terminal_key,
+        }
+
+    def _response(self, payment, **extra):
+        return {
+            'Success': True,
+            'ErrorCode': '0',
+            'TerminalKey': self.signer.terminal_key,
+            'Status': payment['Status'],
+            'PaymentId': payment['PaymentId'],
+            'OrderId': payment['OrderId'],
+            'Amount': payment['Amount'],
+            **extra,
+        }
+
+    def _init(self, data):
+        payment_id = str(uuid.uuid4().int % 10 ** 12)
+        payment = {
+            'PaymentId': payment_id,
+            'OrderId': data.get('OrderId'),
+            'Amount': int(data.get('Amount', 0)),
+            'Status': 'NEW',
+            'SuccessURL': data.get('SuccessURL'),
+            'FailURL': data.get('FailURL'),
+            'NotificationURL': data.get('NotificationURL'),
+        }
+        with self._lock:
+            self.payments[payment_id] = payment
+
+        if self.auto_pay_after is not None:
+            timer = threading.Timer(self.auto_pay_after, self.pay, args=(payment_id,))
+            timer.daemon = True
+            timer.start()
+
+        return self._response(payment, PaymentURL=f'{self.base_url}/pay/{payment_id}')
+
+    def _get_state(self, data):
+        payment = self.payments.get(str(data.get('PaymentId')))
+        if payment is None:
+            return self._error('7', 'Неверный статус транзакции / платеж не найден')
+        return self._response(payment)
+
+    def _confirm(self, data):
+        return self._change_status(data, CONFIRM_TRANSITIONS)
+
+    def _cancel(self, data):
+        payment = self.payments.get(str(data.get('PaymentId')))
+        original_amount = payment['Amount'] if payment else 0
+        result = self._change_status(data, CANCEL_TRANSITIONS)
+        if result.get('Success'):
+            result.update(OriginalAmount=original_amount, NewAmount=0)
+        return result
+
+    def _change_status(self, data, transitions):
+        payment_id = str(data.get('PaymentId'))
+        with self._lock:
+            payment = self.payments.get(payment_id)
+            if payment is None:
+                return self._error('7', 'Платеж не найден')
+            new_status = transitions.get(payment['Status'])
+            if new_status is None:
+                return self._error('8', f"Неверный статус транзакции: {payment['Status']}")
+            payment['Status'] = new_status
+        self.notify(payment_id)
+        return self._response(payment)
+
+    # === Оплата и уведомления ===
+
+    def pay(self, payment_id):
+        """Имитация оплаты картой. Возвращает итоговый статус или None"""
+        with self._lock:
+            payment = self.payments.get(payment_id)
+            if payment is None or payment['Status'] not in ('NEW', 'FORM_SHOWED'):
+                return None
+            if self.decline_rate and random.random() < self.decline_rate:
+                payment['Status'] = 'REJECTED'
+            else:
+                payment['Status'] = 'AUTHORIZED' if self.two_stage else 'CONFIRMED'
+            status = payment['Status']
+
+        self._count(f'paid_{status.lower()}')
+        # Как в боевом шлюзе: сначала AUTHORIZED, затем CONFIRMED
+        self.notify(payment_id, statuses=('AUTHORIZED', status) if status == 'CONFIRMED' else (status,))
+        return status
+
+    def build_notification(self, payment_id, status=None):
+        """Уведомление в формате Т-Банка с Token"""
+        payment = self.payments[payment_id]
+        status = status or payment['Status']
+        notification = {
+            'TerminalKey': self.signer.terminal_key,
+            'OrderId': payment['OrderId'],
+            'Success': status not in ('REJECTED',),
+            'Status': status,
+            'PaymentId': int(payment_id),
+            'ErrorCode': '0' if status != 'REJECTED' else '1051',
+            'Amount': payment['Amount'],
+            'CardId': 100500,
+            'Pan': '430000******0777',
+            'ExpDate': '1230',
+        }
+        notification['Token'] = self.signer.generate_token(notification)
+        return notification
+
+    def notify(self, payment_id, statuses=(None,)):
+        url = self.webhook_url or self.payments[payment_id].get('NotificationURL')
+        if not self.send_webhooks or not url:
+            return
+        notifications = [self.build_notification(payment_id, status) for status in statuses]
+        # Уведомления одного платежа (и их дубли) отправляются по порядку одной задачей пула:
+        # параллельно идут только уведомления разных платежей
+        self._webhooks.submit(self._send_webhooks, url, notifications)
+
+    def _send_webhooks(self, url, notifications):
+        for notification in notifications:
+            for _ in range(self.webhook_duplicates):
+                self._send_webhook(url, notification)
+
+    def _send_webhook(self, url, notification):
+        started = time.monotonic()
+        try:
+            response = requests.post(url, json=notification, timeout=30)
+            ok = response.status_code == 200 and response.text.strip() == 'OK'
+        except requests.RequestException as e:
+            logger.warning(f"Simulator webhook failed: {str(e)}")
+            ok = False
+        with self._lock:
+            self.webhook_seconds += time.monotonic() - started
+            self.stats['webhooks_ok' if ok else 'webhooks_failed'] += 1
+
+    def summary(self):
+        sent = self.stats['webhooks_ok'] + self.stats['webhooks_failed']
+        avg_webhook = self.webhook_seconds / sent if sent else 0
+        return {
+            **dict(self.stats),
+            'payments': len(self.payments),
+            'avg_webhook_seconds': round(avg_webhook, 4),
+        }
+
+    # === HTTP ===
+
+    def _handler_class(self):
+        simulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _send(self, status_code, body, content_type='application/json'):
+                payload = body if isinstance(body, bytes) else json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(status_code)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                method = urlparse(self.path).path.rstrip('/').rsplit('/', 1)[-1]
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    data = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    self._send(400, simulator._error('400', 'Некорректный JSON'))
+                    return
+                status_code, body = simulator.handle_api(method, data)
+                self._send(status_code, body)
+
+            def do_GET(self):
+                # Платежная форма: GET /pay/<PaymentId> "оплачивает" и перенаправляет на SuccessURL / FailURL
+                parts = urlparse(self.path).path.strip('/').split('/')
+                if len(parts) != 2 or parts[0] != 'pay' or parts[1] not in simulator.payments:
+                    self._send(404, b'Not found', 'text/plain')
+                    return
+                status = simulator.pay(parts[1])
+                payment = simulator.payments[parts[1]]
+                target = payment['FailURL'] if status == 'REJECTED' else payment['SuccessURL']
+                if target:
+                    self.send_response(302)
+                    self.send_header('Location', target)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                else:
+                    self._send(200, {'Status': payment['Status']})
+
+            def log_message(self, format, *args):
+                logger.debug(f"Simulator: {format % args}")
+
+        return Handler
@@ -0,0 +1,18 @@
+from django.contrib import admin
+
+from .models import SearchDocument
+
+
+@admin.register(SearchDocument)
+class SearchDocumentAdmin(admin.ModelAdmin):
+    """Поисковый индекс только для просмотра: документы обновляются сигналами и rebuild_search_index"""
+    list_display = ['title', 'kind', 'object_id', 'updated_at']
+    list_filter = ['kind']
+    search_fields = ['title']
+    readonly_fields = ['kind', 'object_id', 'slug', 'title', 'body', 'updated_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
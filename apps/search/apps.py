@@ -0,0 +1,22 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def create_search_index(sender, using, **kwargs):
+    """Индекс создается миграцией 0002; здесь - для БД, созданных без миграций (тесты с --nomigrations)"""
+    from django.db import connections
+    from .services.index import ensure_index_schema
+
+    with connections[using].schema_editor() as schema_editor:
+        ensure_index_schema(schema_editor)
+
+
+class SearchConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.search'
+    verbose_name = 'Поиск'
+
+    def ready(self):
+        """Импортируем signals при загрузке приложения"""
+        import apps.search.signals
+        post_migrate.connect(create_search_index, sender=self)
@@ -0,0 +1,19 @@
+from rest_framework import filters
+
+from .services.index import search_object_ids
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    Параметр ?search= по полнотекстовому индексу (с учетом словоформ) вместо icontains по HTML.
+
+    Тип документов задается атрибутом search_kind во ViewSet; search_fields
+    остаются для описания схемы API.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        kind = getattr(view, 'search_kind', None)
+        if not query or kind is None:
+            return queryset
+        return queryset.filter(pk__in=search_object_ids(kind, query))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.search.services.index import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Полностью перестраивает поисковый индекс судов, статей блога и страниц FAQ'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Размер пачки документов')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        counts = rebuild_index(batch_size=options['batch_size'])
+        for kind, count in counts.items():
+            self.stdout.write(f'  {kind}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово! Документов в индексе: {sum(counts.values())}, время {time.monotonic() - started:.2f} с'
+        ))
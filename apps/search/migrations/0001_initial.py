@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('boat', 'Судно'), ('article', 'Статья блога'), ('faq', 'Страница FAQ')], max_length=20, verbose_name='Тип')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='ID объекта')),
+                ('slug', models.CharField(blank=True, max_length=300, verbose_name='URL-адрес')),
+                ('title', models.CharField(max_length=300, verbose_name='Заголовок')),
+                ('body', models.TextField(blank=True, verbose_name='Текст')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Документ поискового индекса',
+                'verbose_name_plural': 'Поисковый индекс',
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_search_document')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    """FTS5 в SQLite, tsvector + GIN в Postgres; на прочих СУБД поиск работает через icontains"""
+    from apps.search.services.index import ensure_index_schema
+    ensure_index_schema(schema_editor)
+
+
+def drop_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS search_fts')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS search_document_vector_gin')
+        schema_editor.execute('ALTER TABLE search_searchdocument DROP COLUMN IF EXISTS search_vector')
+
+
+def fill_index(apps, schema_editor):
+    """Индексируем уже существующие суда, статьи и страницы FAQ"""
+    from apps.search.services.index import rebuild_index
+    rebuild_index(get_model=apps.get_model, document_model=apps.get_model('search', 'SearchDocument'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0001_initial'),
+        ('boats', '0015_image_variants'),
+        ('blog', '0002_image_variants'),
+        ('faq', '0002_faq_richtext_uploading'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+        migrations.RunPython(fill_index, migrations.RunPython.noop),
+    ]
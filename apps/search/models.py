@@ -0,0 +1,32 @@
+from django.db import models
+
+
+class SearchDocument(models.Model):
+    """
+    Документ полнотекстового индекса: очищенный от HTML текст судна, статьи или страницы FAQ.
+
+    Сам индекс хранится рядом: виртуальная таблица FTS5 search_fts в SQLite
+    или столбец search_vector (tsvector) с GIN-индексом в Postgres, см. миграцию 0002.
+    """
+
+    class Kind(models.TextChoices):
+        BOAT = 'boat', 'Судно'
+        ARTICLE = 'article', 'Статья блога'
+        FAQ = 'faq', 'Страница FAQ'
+
+    kind = models.CharField(max_length=20, choices=Kind.choices, verbose_name='Тип')
+    object_id = models.PositiveBigIntegerField(verbose_name='ID объекта')
+    slug = models.CharField(max_length=300, blank=True, verbose_name='URL-адрес')
+    title = models.CharField(max_length=300, verbose_name='Заголовок')
+    body = models.TextField(blank=True, verbose_name='Текст')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    class Meta:
+        verbose_name = 'Документ поискового индекса'
+        verbose_name_plural = 'Поисковый индекс'
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_document'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_kind_display()}: {self.title}'
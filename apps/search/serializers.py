@@ -0,0 +1,13 @@
+from rest_framework import serializers
+
+from .models import SearchDocument
+
+
+class SearchResultSerializer(serializers.Serializer):
+    """Результат поиска: судно, статья блога или страница FAQ"""
+    type = serializers.ChoiceField(choices=SearchDocument.Kind.choices)
+    id = serializers.IntegerField()
+    slug = serializers.CharField()
+    title = serializers.CharField()
+    snippet = serializers.CharField(help_text='Фрагмент текста, совпадения обернуты в <mark>')
+    rank = serializers.FloatField()
@@ -0,0 +1,341 @@
+"""
+Полнотекстовый индекс судов, статей блога и страниц FAQ.
+
+Текст объекта (без HTML) хранится в SearchDocument и синхронизируется сигналами
+при сохранении. Индекс зависит от СУБД:
+- SQLite: виртуальная таблица FTS5 search_fts (rowid = id документа), в которую
+  пишутся основы слов (russian_stemmer); ранжирование bm25, заголовок весит больше текста;
+- Postgres: генерируемый столбец search_vector (to_tsvector('russian', ...)) с GIN-индексом,
+  ранжирование ts_rank.
+Фрагменты с подсветкой (<mark>) строятся в Python одинаково для обеих СУБД.
+"""
+import html
+import logging
+import re
+
+from django.apps import apps as django_apps
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.html import escape, strip_tags
+
+from ..models import SearchDocument
+from .russian_stemmer import stem, stem_text, tokenize
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'search_fts'
+# Веса bm25 для столбцов title и body
+FTS_WEIGHTS = (10.0, 1.0)
+SNIPPET_WORDS = 30
+MAX_FILTER_RESULTS = 1000
+
+WHITESPACE_RE = re.compile(r'\s+')
+SPLIT_WORDS_RE = re.compile(r'(\w+)')
+
+
+def html_to_text(value):
+    """HTML (CKEditor) -> текст без тегов и сущностей в одну строку"""
+    return WHITESPACE_RE.sub(' ', html.unescape(strip_tags(value or ''))).strip()
+
+
+def _boat_document(boat):
+    if not boat.is_active:
+        return None
+    return {'title': boat.name, 'slug': '', 'body': html_to_text(boat.description)}
+
+
+def _page_document(page):
+    """Статья блога или страница FAQ"""
+    if not page.is_published:
+        return None
+    body = ' '.join(part for part in (html_to_text(page.excerpt), html_to_text(page.content)) if part)
+    return {'title': page.title, 'slug': page.slug, 'body': body}
+
+
+# Индексируемые модели: label -> (тип документа, построение документа, поля, влияющие на документ)
+SOURCES = {
+    'boats.Boat': (SearchDocument.Kind.BOAT, _boat_document, {'name', 'description', 'is_active'}),
+    'blog.Article': (
+        SearchDocument.Kind.ARTICLE, _page_document, {'title', 'slug', 'excerpt', 'content', 'is_published'}
+    ),
+    'faq.FAQPage': (
+        SearchDocument.Kind.FAQ, _page_document, {'title', 'slug', 'excerpt', 'content', 'is_published'}
+    ),
+}
+
+
+FTS_CREATE_SQLITE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+    f"USING fts5(title, body, tokenize = 'unicode61 remove_diacritics 0')"
+)
+VECTOR_CREATE_POSTGRES = [
+    "ALTER TABLE search_searchdocument ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(body, '')), 'B')"
+    ") STORED",
+    'CREATE INDEX IF NOT EXISTS search_document_vector_gin ON search_searchdocument USING GIN (search_vector)',
+]
+
+
+def _vendor():
+    return connection.vendor
+
+
+def ensure_index_schema(schema_editor):
+    """
+    Создает FTS5-таблицу (SQLite) или столбец tsvector с GIN-индексом (Postgres), если их еще нет.
+    Вызывается миграцией и по post_migrate (тестовая БД создается без миграций).
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(FTS_CREATE_SQLITE)
+    elif vendor == 'postgresql':
+        for sql in VECTOR_CREATE_POSTGRES:
+            schema_editor.execute(sql)
+
+
+# === Запись в индекс ===
+
+def _fts_delete(cursor, document_ids):
+    if document_ids:
+        placeholders = ', '.join(['%s'] * len(document_ids))
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', list(document_ids))
+
+
+def _fts_insert(cursor, documents):
+    cursor.executemany(
+        f'INSERT INTO {FTS_TABLE} (rowid, title, body) VALUES (%s, %s, %s)',
+        [(document.id, stem_text(document.title), stem_text(document.body)) for document in documents],
+    )
+
+
+def index_instance(instance, update_fields=None):
+    """
+    Добавляет, обновляет или удаляет документ объекта.
+    Неопубликованные (неактивные) объекты из индекса удаляются.
+    """
+    source = SOURCES.get(instance._meta.label)
+    if source is None:
+        return
+    kind, build_document, fields = source
+    if update_fields is not None and not fields.intersection(update_fields):
+        # Например, счетчик просмотров - текст не изменился
+        return
+
+    try:
+        with transaction.atomic():
+            data = build_document(instance)
+            if data is None:
+                _remove(kind, instance.pk)
+                return
+            document, _ = SearchDocument.objects.update_or_create(kind=kind, object_id=instance.pk, defaults=data)
+            if _vendor() == 'sqlite':
+                with connection.cursor() as cursor:
+                    _fts_delete(cursor, [document.id])
+                    _fts_insert(cursor, [document])
+    except Exception as e:
+        logger.error(f"❌ Failed to index {instance._meta.label} {instance.pk}: {str(e)}")
+
+
+def remove_instance(instance):
+    source = SOURCES.get(instance._meta.label)
+    if source is None:
+        return
+    try:
+        with transaction.atomic():
+            _remove(source[0], instance.pk)
+    except Exception as e:
+        logger.error(f"❌ Failed to remove {instance._meta.label} {instance.pk} from search index: {str(e)}")
+
+
+def _remove(kind, object_id):
+    document_ids = list(
+        SearchDocument.objects.filter(kind=kind, object_id=object_id).values_list('id', flat=True)
+    )
+    if not document_ids:
+        return
+    if _vendor() == 'sqlite':
+        with connection.cursor() as cursor:
+            _fts_delete(cursor, document_ids)
+    SearchDocument.objects.filter(id__in=document_ids).delete()
+
+
+def rebuild_index(get_model=None, document_model=None, batch_size=500):
+    """
+    Полная переиндексация всех источников.
+
+    get_model / document_model позволяют вызывать функцию из миграции с историческими моделями.
+
+    Returns:
+        dict: {тип документа: количество документов}
+    """
+    get_model = get_model or django_apps.get_model
+    document_model = document_model or SearchDocument
+    sqlite = _vendor() == 'sqlite'
+    counts = {}
+
+    with transaction.atomic():
+        document_model.objects.all().delete()
+        if sqlite:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+        for label, (kind, build_document, _) in SOURCES.items():
+            counts[kind] = 0
+            batch = []
+            for instance in get_model(label).objects.order_by('pk').iterator(chunk_size=batch_size):
+                data = build_document(instance)
+                if data is not None:
+                    batch.append(document_model(kind=kind, object_id=instance.pk, **data))
+                if len(batch) >= batch_size:
+                    counts[kind] += _save_batch(document_model, batch, sqlite)
+                    batch = []
+            counts[kind] += _save_batch(document_model, batch, sqlite)
+
+    return counts
+
+
+def _save_batch(document_model, batch, sqlite):
+    if not batch:
+        return 0
+    documents = document_model.objects.bulk_create(batch)
+    if sqlite:
+        with connection.cursor() as cursor:
+            _fts_insert(cursor, documents)
+    return len(documents)
+
+
+# === Поиск ===
+
+def query_stems(query):
+    """Основы слов запроса (без повторов, в исходном порядке)"""
+    return list(dict.fromkeys(stem(word) for word in tokenize(query)))
+
+
+def _search_sqlite(stems, kinds, limit):
+    # Каждая основа - префиксный запрос ("катер"*), основы объединяются через AND
+    match = ' '.join(f'"{value}"*' for value in stems)
+    sql = (
+        f'SELECT d.id, bm25({FTS_TABLE}, %s, %s) AS score FROM {FTS_TABLE} '
+        f'JOIN search_searchdocument d ON d.id = {FTS_TABLE}.rowid '
+        f'WHERE {FTS_TABLE} MATCH %s'
+    )
+    params = [*FTS_WEIGHTS, match]
+    if kinds:
+        sql += f" AND d.kind IN ({', '.join(['%s'] * len(kinds))})"
+        params += list(kinds)
+    sql += ' ORDER BY score LIMIT %s'
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        # bm25 тем меньше, чем документ релевантнее
+        return [(document_id, -score) for document_id, score in cursor.fetchall()]
+
+
+def _search_postgres(query, kinds, limit):
+    # to_tsquery('russian', 'катерами:*') сам приводит слово к основе
+    tsquery = ' & '.join(f'{word}:*' for word in dict.fromkeys(tokenize(query)))
+    sql = (
+        "SELECT id, ts_rank(search_vector, q) AS rank "
+        "FROM search_searchdocument, to_tsquery('russian', %s) q WHERE search_vector @@ q"
+    )
+    params = [tsquery]
+    if kinds:
+        sql += ' AND kind = ANY(%s)'
+        params.append(list(kinds))
+    sql += ' ORDER BY rank DESC LIMIT %s'
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _search_fallback(stems, kinds, limit):
+    """Прочие СУБД: совпадение всех основ в заголовке или тексте, без ранжирования"""
+    documents = SearchDocument.objects.all()
+    if kinds:
+        documents = documents.filter(kind__in=kinds)
+    for value in stems:
+        documents = documents.filter(Q(title__icontains=value) | Q(body__icontains=value))
+    return [(document_id, 0.0) for document_id in documents.values_list('id', flat=True)[:limit]]
+
+
+def _ranked_ids(query, kinds, limit):
+    stems = query_stems(query)
+    if not stems:
+        return [], stems
+    vendor = _vendor()
+    if vendor == 'sqlite':
+        return _search_sqlite(stems, kinds, limit), stems
+    if vendor == 'postgresql':
+        return _search_postgres(query, kinds, limit), stems
+    return _search_fallback(stems, kinds, limit), stems
+
+
+def highlight(text, stems, max_words=SNIPPET_WORDS):
+    """
+    Фрагмент текста вокруг первого совпадения, найденные слова обернуты в <mark>.
+    Текст экранируется, результат можно выводить как HTML.
+    """
+    parts = SPLIT_WORDS_RE.split(text or '')
+    # Слова стоят на нечетных позициях, разделители - на четных
+    word_positions = range(1, len(parts), 2)
+
+    def matches(word):
+        word_stem = stem(word)
+        return any(word_stem.startswith(value) for value in stems)
+
+    matched = {position for position in word_positions if matches(parts[position])}
+    first = min(matched) if matched else 1
+    # Несколько слов контекста перед первым совпадением
+    start = max(1, first - 2 * (max_words // 4))
+    end = min(len(parts), start + 2 * max_words - 1)
+
+    snippet = []
+    for position in range(start, end):
+        part = escape(parts[position])
+        snippet.append(f'<mark>{part}</mark>' if position in matched else part)
+    result = ''.join(snippet).strip()
+    if start > 1:
+        result = f'… {result}'
+    if end < len(parts) - 1:
+        result = f'{result} …'
+    return result
+
+
+def search(query, kinds=None, limit=20):
+    """
+    Ранжированный поиск по индексу.
+
+    Returns:
+        list[dict]: type, id, slug, title, snippet, rank - от более релевантных к менее
+    """
+    ranked, stems = _ranked_ids(query, kinds, limit)
+    if not ranked:
+        return []
+    documents = SearchDocument.objects.in_bulk([document_id for document_id, _ in ranked])
+    results = []
+    for document_id, rank in ranked:
+        document = documents.get(document_id)
+        if document is None:
+            continue
+        results.append({
+            'type': document.kind,
+            'id': document.object_id,
+            'slug': document.slug,
+            'title': document.title,
+            'snippet': highlight(document.body, stems),
+            'rank': round(float(rank), 4),
+        })
+    return results
+
+
+def search_object_ids(kind, query, limit=MAX_FILTER_RESULTS):
+    """ID объектов одного типа, подходящих под запрос, по убыванию релевантности"""
+    ranked, _ = _ranked_ids(query, [kind], limit)
+    if not ranked:
+        return []
+    object_ids = dict(
+        SearchDocument.objects.filter(id__in=[document_id for document_id, _ in ranked]).values_list('id', 'object_id')
+    )
+    return [object_ids[document_id] for document_id, _ in ranked if document_id in object_ids]
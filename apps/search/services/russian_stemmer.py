@@ -0,0 +1,136 @@
+"""
+Стеммер русского языка (алгоритм Snowball Russian).
+
+Используется для индекса SQLite FTS5: в индекс и в поисковый запрос попадают
+основы слов, поэтому "катер", "катера" и "катером" находят друг друга. В Postgres
+стемминг выполняет сам to_tsvector('russian', ...).
+"""
+import re
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (('в', 'вши', 'вшись'), ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'))
+ADJECTIVE = (
+    (),
+    (
+        'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом', 'его', 'ого',
+        'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею',
+    ),
+)
+PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+REFLEXIVE = ((), ('ся', 'сь'))
+VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+    (
+        'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым', 'ен',
+        'ило', 'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю',
+    ),
+)
+NOUN = (
+    (),
+    (
+        'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и', 'ией', 'ей', 'ой', 'ий', 'й',
+        'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+        'ья', 'я',
+    ),
+)
+DERIVATIONAL = ('ость', 'ост')
+SUPERLATIVE = ('ейше', 'ейш')
+
+WORD_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile(r'[а-я]')
+
+
+def _sorted_endings(group):
+    """[(окончание, нужно ли а/я перед ним)] от длинных к коротким"""
+    endings = [(ending, True) for ending in group[0]] + [(ending, False) for ending in group[1]]
+    return sorted(endings, key=lambda item: len(item[0]), reverse=True)
+
+
+PERFECTIVE_GERUND, ADJECTIVE, PARTICIPLE, REFLEXIVE, VERB, NOUN = (
+    _sorted_endings(group) for group in (PERFECTIVE_GERUND, ADJECTIVE, PARTICIPLE, REFLEXIVE, VERB, NOUN)
+)
+
+
+def _remove_ending(rv, endings):
+    """Отрезает самое длинное подходящее окончание. Returns: (rv, отрезано ли)"""
+    for ending, after_a in endings:
+        if not rv.endswith(ending):
+            continue
+        stem = rv[:-len(ending)]
+        if after_a and not stem.endswith(('а', 'я')):
+            continue
+        return stem, True
+    return rv, False
+
+
+def _regions(word):
+    """Начало областей RV и R2 (индексы в слове)"""
+    rv = next((i + 1 for i, ch in enumerate(word) if ch in VOWELS), len(word))
+
+    def after_vowel_consonant(start):
+        for i in range(max(start, 1), len(word)):
+            if word[i] not in VOWELS and word[i - 1] in VOWELS:
+                return i + 1
+        return len(word)
+
+    r1 = after_vowel_consonant(1)
+    return rv, after_vowel_consonant(r1 + 1)
+
+
+def stem(word):
+    """Основа русского слова. Слова не на кириллице возвращаются в нижнем регистре как есть"""
+    word = word.lower().replace('ё', 'е')
+    if not CYRILLIC_RE.search(word):
+        return word
+
+    rv_start, r2_start = _regions(word)
+    prefix, rv = word[:rv_start], word[rv_start:]
+
+    # Шаг 1: деепричастие, иначе возвратная частица + прилагательное/причастие, глагол или существительное
+    rv, removed = _remove_ending(rv, PERFECTIVE_GERUND)
+    if not removed:
+        rv, _ = _remove_ending(rv, REFLEXIVE)
+        rv, removed = _remove_ending(rv, ADJECTIVE)
+        if removed:
+            rv, _ = _remove_ending(rv, PARTICIPLE)
+        else:
+            rv, removed = _remove_ending(rv, VERB)
+            if not removed:
+                rv, _ = _remove_ending(rv, NOUN)
+
+    # Шаг 2
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    # Шаг 3: словообразовательное окончание в R2
+    r2 = rv[max(r2_start - rv_start, 0):]
+    for ending in DERIVATIONAL:
+        if r2.endswith(ending):
+            rv = rv[:-len(ending)]
+            break
+
+    # Шаг 4
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        for ending in SUPERLATIVE:
+            if rv.endswith(ending):
+                rv = rv[:-len(ending)]
+                break
+        if rv.endswith('нн'):
+            rv = rv[:-1]
+        elif rv.endswith('ь'):
+            rv = rv[:-1]
+
+    return prefix + rv
+
+
+def tokenize(text):
+    """Слова текста в нижнем регистре"""
+    return WORD_RE.findall((text or '').lower().replace('ё', 'е'))
+
+
+def stem_text(text):
+    """Текст из основ слов через пробел (для индекса FTS5)"""
+    return ' '.join(stem(word) for word in tokenize(text))
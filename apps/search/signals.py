@@ -0,0 +1,25 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.blog.models import Article
+from apps.boats.models import Boat
+from apps.faq.models import FAQPage
+from .services.index import index_instance, remove_instance
+
+
+@receiver(post_save, sender=Boat)
+@receiver(post_save, sender=Article)
+@receiver(post_save, sender=FAQPage)
+def update_search_document(sender, instance, update_fields=None, raw=False, **kwargs):
+    """Синхронизация поискового индекса при сохранении судна, статьи или страницы FAQ"""
+    if raw:
+        return
+    index_instance(instance, update_fields=update_fields)
+
+
+@receiver(post_delete, sender=Boat)
+@receiver(post_delete, sender=Article)
+@receiver(post_delete, sender=FAQPage)
+def delete_search_document(sender, instance, **kwargs):
+    """Удаление документа из поискового индекса"""
+    remove_instance(instance)
@@ -0,0 +1,98 @@
+"""
+Тесты полнотекстового поиска
+"""
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+
+from apps.blog.models import Article
+from apps.faq.models import FAQPage
+from apps.search.models import SearchDocument
+from apps.search.services.russian_stemmer import stem
+
+
+@pytest.fixture
+def article(db):
+    """Опубликованная статья блога с HTML"""
+    return Article.objects.create(
+        title='Где посмотреть китов в Териберке',
+        slug='kity-teriberka',
+        excerpt='Морские прогулки к китам',
+        content='<p>Летом в Баренцевом море часто встречаются <strong>горбатые киты</strong> &amp; косатки.</p>',
+        is_published=True,
+    )
+
+
+@pytest.mark.django_db
+class TestSearch:
+    """Тесты индекса и endpoint поиска"""
+
+    def test_stemmer(self):
+        """Словоформы приводятся к одной основе"""
+        assert stem('катера') == stem('катером') == stem('катер')
+        assert stem('китов') == stem('киты')
+        assert stem('Teriberka') == 'teriberka'
+
+    def test_document_synced_on_save(self, article):
+        """Документ хранит текст без HTML и удаляется при снятии с публикации"""
+        document = SearchDocument.objects.get(kind=SearchDocument.Kind.ARTICLE, object_id=article.pk)
+        assert '<' not in document.body
+        assert 'горбатые киты & косатки' in document.body
+
+        article.is_published = False
+        article.save()
+        assert not SearchDocument.objects.filter(kind=SearchDocument.Kind.ARTICLE, object_id=article.pk).exists()
+
+    def test_views_count_does_not_reindex(self, api_client, article):
+        """Просмотр статьи (save с update_fields=['views_count']) не трогает индекс"""
+        document = SearchDocument.objects.get(kind=SearchDocument.Kind.ARTICLE, object_id=article.pk)
+        url = reverse('blog:article-detail', kwargs={'slug': article.slug})
+        response = api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert Article.objects.get(pk=article.pk).views_count == 1
+        assert SearchDocument.objects.get(pk=document.pk).updated_at == document.updated_at
+
+    def test_search_ranked_with_snippet(self, api_client, article, boat):
+        """Поиск по словоформам, совпадение в заголовке выше, фрагмент с подсветкой"""
+        FAQPage.objects.create(
+            title='Как оплатить прогулку',
+            slug='oplata',
+            content='<p>Если повезет, на прогулке можно увидеть кита.</p>',
+            is_published=True,
+        )
+        url = reverse('search:search')
+        response = api_client.get(url, {'q': 'кит'})
+        assert response.status_code == status.HTTP_200_OK
+        assert [item['type'] for item in response.data['results']] == ['article', 'faq']
+        assert '<mark>киты</mark>' in response.data['results'][0]['snippet']
+
+        response = api_client.get(url, {'q': 'катерами', 'type': 'boat'})
+        assert [item['id'] for item in response.data['results']] == [boat.pk]
+        assert '<mark>катера</mark>' in response.data['results'][0]['snippet']
+
+    def test_search_validation(self, api_client):
+        url = reverse('search:search')
+        assert api_client.get(url).status_code == status.HTTP_400_BAD_REQUEST
+        assert api_client.get(url, {'q': 'кит', 'type': 'dock'}).status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_viewset_search_filter(self, api_client, article):
+        """?search= в списке статей использует индекс и находит другие словоформы"""
+        Article.objects.create(title='Рыбалка', slug='rybalka', content='<p>Треска и палтус</p>', is_published=True)
+        url = reverse('blog:article-list')
+        response = api_client.get(url, {'search': 'китами'})
+        assert response.status_code == status.HTTP_200_OK
+        assert [item['slug'] for item in response.data['results']] == [article.slug]
+
+    def test_inactive_boat_not_found(self, api_client, boat):
+        boat.is_active = False
+        boat.save()
+        response = api_client.get(reverse('search:search'), {'q': 'катер'})
+        assert response.data['results'] == []
+
+    def test_rebuild_command(self, article, boat):
+        SearchDocument.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        assert set(SearchDocument.objects.values_list('kind', flat=True)) == {'article', 'boat'}
@@ -0,0 +1,53 @@
+from rest_framework import views, status
+from rest_framework.response import Response
+from rest_framework.permissions import AllowAny
+
+from .models import SearchDocument
+from .serializers import SearchResultSerializer
+from .services.index import search
+
+MAX_LIMIT = 50
+
+
+class SearchView(views.APIView):
+    """
+    Полнотекстовый поиск по судам, статьям блога и страницам FAQ
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        """
+        Query params:
+            - q: поисковый запрос (обязательно)
+            - type: boat | article | faq, можно несколько через запятую
+            - limit: количество результатов (по умолчанию 20, максимум 50)
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {'error': 'Параметр q обязателен'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        kinds = [kind for kind in request.query_params.get('type', '').split(',') if kind]
+        unknown = set(kinds) - set(SearchDocument.Kind.values)
+        if unknown:
+            return Response(
+                {'error': f"Неизвестный тип: {', '.join(sorted(unknown))}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), MAX_LIMIT)
+        except ValueError:
+            return Response(
+                {'error': 'limit должен быть числом'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = search(query, kinds=kinds, limit=limit)
+        return Response({
+            'query': query,
+            'count': len(results),
+            'results': SearchResultSerializer(results, many=True).data,
+        })
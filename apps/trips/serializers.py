@@ -1,9 +1,10 @@
 from rest_framework import serializers
 from datetime import datetime
 from decimal import Decimal
-from apps.boats.models import BoatAvailability, Boat, BoatPricing, GuideBoatDiscount, TripType
+from apps.boats.models import BoatAvailability, Boat, BoatPricing, TripType
 from apps.boats.serializers import BoatShortSerializer, BoatDetailSerializer, SailingZoneSerializer as RouteSerializer
 from apps.accounts.models import User
+from apps.boats.services.partner_rates import get_partner_rates
 
 
 class AvailableTripSerializer(serializers.Serializer):
@@ -29,34 +30,9 @@ class AvailableTripSerializer(serializers.Serializer):
         if raw_price is None:
             return None
         base_price = Decimal(str(raw_price))
-        request = self.context.get('request')
-        
-        # Если пользователь не авторизован, возвращаем базовую цену
-        if not request or not request.user.is_authenticated:
-            return base_price
-        
-        user = request.user
-        # Если пользователь не является верифицированным гидом, возвращаем базовую цену
-        if user.role != User.Role.GUIDE or not user.is_verified:
-            return base_price
-        
-        # Ищем скидку для данного гида и владельца судна
-        boat = obj['availability'].boat
-        boat_owner = boat.owner
-        
-        try:
-            discount_obj = GuideBoatDiscount.objects.get(
-                guide=user,
-                boat_owner=boat_owner,
-                is_active=True
-            )
-            # Применяем скидку
-            discount_percent = discount_obj.discount_percent
-            discounted_price = base_price * (1 - discount_percent / 100)
-            return discounted_price.quantize(Decimal('0.01'))
-        except GuideBoatDiscount.DoesNotExist:
-            # Если скидка не найдена, возвращаем базовую цену
-            return base_price
+        # Скидка верифицированного гида от владельца судна (скидки пользователя загружаются раз за запрос)
+        rates = get_partner_rates(self.context.get('request'))
+        return rates.guide_price(base_price, obj['availability'].boat.owner_id)
     
     def get_charter_total_price(self, obj):
         """Возвращает стоимость чарта (для индивидуальных рейсов)"""
@@ -121,34 +97,9 @@ class TripDetailSerializer(serializers.Serializer):
         if raw_price is None:
             return None
         base_price = Decimal(str(raw_price))
-        request = self.context.get('request')
-        
-        # Если пользователь не авторизован, возвращаем базовую цену
-        if not request or not request.user.is_authenticated:
-            return base_price
-        
-        user = request.user
-        # Если пользователь не является верифицированным гидом, возвращаем базовую цену
-        if user.role != User.Role.GUIDE or not user.is_verified:
-            return base_price
-        
-        # Ищем скидку для данного гида и владельца судна
-        boat = obj['availability'].boat
-        boat_owner = boat.owner
-        
-        try:
-            discount_obj = GuideBoatDiscount.objects.get(
-                guide=user,
-                boat_owner=boat_owner,
-                is_active=True
-            )
-            # Применяем скидку
-            discount_percent = discount_obj.discount_percent
-            discounted_price = base_price * (1 - discount_percent / 100)
-            return discounted_price.quantize(Decimal('0.01'))
-        except GuideBoatDiscount.DoesNotExist:
-            # Если скидка не найдена, возвращаем базовую цену
-            return base_price
+        # Скидка верифицированного гида от владельца судна (скидки пользователя загружаются раз за запрос)
+        rates = get_partner_rates(self.context.get('request'))
+        return rates.guide_price(base_price, obj['availability'].boat.owner_id)
     
     def get_charter_total_price(self, obj):
         """Возвращает стоимость чарта (для индивидуальных рейсов)"""
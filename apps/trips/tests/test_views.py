@@ -64,3 +64,68 @@ class TestAvailableTrips:
         })
         assert response.status_code == status.HTTP_200_OK
 
+
+
+@pytest.mark.django_db
+class TestTripSearchQueries:
+    """Количество запросов поиска рейсов не зависит от числа найденных рейсов"""
+
+    def test_boat_images_prefetched(self, api_client, boat_with_pricing):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from apps.boats.models import BoatAvailability, BoatImage
+
+        tomorrow = (datetime.now() + timedelta(days=1)).date()
+        for hour in (10, 13, 16):
+            BoatAvailability.objects.create(
+                boat=boat_with_pricing,
+                departure_date=tomorrow,
+                departure_time=datetime.strptime(f'{hour}:00', '%H:%M').time(),
+                return_time=datetime.strptime(f'{hour + 2}:00', '%H:%M').time(),
+                is_active=True
+            )
+        for name in ('first', 'second'):
+            path = f'boats/gallery/{name}.jpg'
+            BoatImage.objects.create(
+                boat=boat_with_pricing,
+                image=path,
+                image_variants={'source': path, '400': f'/media/cache/{name}.jpg', '400@2x': f'/media/cache/{name}@2x.jpg'},
+            )
+
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get(reverse('trips:available-trips'), {'date': tomorrow.isoformat()})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data) == 3
+        image_queries = [q for q in queries.captured_queries if 'boats_boatimage' in q['sql']]
+        assert len(image_queries) == 1
+        boat = response.data[0]['boat']
+        assert boat['first_image'] == 'http://testserver/media/cache/first.jpg'
+        assert [image['url_2x'] for image in boat['images']] == [
+            'http://testserver/media/cache/first@2x.jpg', 'http://testserver/media/cache/second@2x.jpg'
+        ]
+
+    def test_guide_discounts_loaded_once(self, guide_client, boat_with_pricing, guide_discount):
+        """Скидки гида загружаются одним запросом на весь поиск"""
+        from decimal import Decimal
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from apps.boats.models import BoatAvailability
+
+        tomorrow = (datetime.now() + timedelta(days=1)).date()
+        for hour in (10, 13, 16):
+            BoatAvailability.objects.create(
+                boat=boat_with_pricing,
+                departure_date=tomorrow,
+                departure_time=datetime.strptime(f'{hour}:00', '%H:%M').time(),
+                return_time=datetime.strptime(f'{hour + 2}:00', '%H:%M').time(),
+                is_active=True
+            )
+
+        with CaptureQueriesContext(connection) as queries:
+            response = guide_client.get(reverse('trips:available-trips'), {'date': tomorrow.isoformat()})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [Decimal(trip['price_per_person']) for trip in response.data] == [Decimal('3400.00')] * 3
+        discount_queries = [q for q in queries.captured_queries if 'boats_guideboatdiscount' in q['sql']]
+        assert len(discount_queries) == 1
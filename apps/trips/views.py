@@ -50,7 +50,10 @@ class AvailableTripsView(views.APIView):
         
         # Получаем доступные слоты
         # По умолчанию показываем только групповые рейсы (individual доступны только по прямой ссылке)
-        availabilities = BoatAvailability.objects.filter(is_active=True, trip_type=TripType.GROUP).select_related('boat')
+        # Владелец, причал и фото судна - для BoatShortSerializer без запросов на каждый рейс
+        availabilities = BoatAvailability.objects.filter(
+            is_active=True, trip_type=TripType.GROUP
+        ).select_related('boat', 'boat__owner', 'boat__dock').prefetch_related('boat__images')
         
         # Фильтрация по дате
         if date:
@@ -114,6 +117,12 @@ class AvailableTripsView(views.APIView):
         now = timezone.now()
         min_departure_time = now + timedelta(minutes=20)
         
+        # Занятые места по всем найденным рейсам - одним GROUP BY запросом
+        availabilities = list(availabilities)
+        occupied_by_trip = Booking.objects.occupied_seats_by_availability(
+            [availability.id for availability in availabilities]
+        )
+        
         # Формируем результат
         results = []
         for availability in availabilities:
@@ -144,7 +153,11 @@ class AvailableTripsView(views.APIView):
                 continue  # Пропускаем если нет цены
             
             # Рассчитываем доступные места
-            available_spots = self._calculate_available_spots(availability, number_of_people)
+            available_spots = self._calculate_available_spots(
+                availability,
+                number_of_people,
+                occupied_places=occupied_by_trip.get(availability.id, 0)
+            )
             
             # Пропускаем если недостаточно мест
             if number_of_people and available_spots < int(number_of_people):
@@ -163,48 +176,18 @@ class AvailableTripsView(views.APIView):
         
         return Response(results, status=status.HTTP_200_OK)
     
-    def _calculate_available_spots(self, availability, requested_people=None):
-        """Рассчитывает доступные места на рейс"""
-        boat = availability.boat
-        start_datetime = datetime.combine(availability.departure_date, availability.departure_time)
-        end_datetime = datetime.combine(availability.departure_date, availability.return_time)
-        
-        # Если время возвращения меньше времени отправления, значит рейс через полночь
-        if availability.return_time < availability.departure_time:
-            end_datetime += timedelta(days=1)
-        
-        # Подсчитываем уже забронированные места (обычные бронирования)
-        # Учитываем ТОЛЬКО PENDING и CONFIRMED - места заблокированы после оплаты предоплаты
-        # RESERVED не учитываем - неоплаченные бронирования не занимают места
-        # ИСКЛЮЧАЕМ заблокированные места (customer=None, guide=None, notes содержит "[БЛОКИРОВКА]")
-        # чтобы не считать их дважды
-        existing_bookings = Booking.objects.filter(
-            boat=boat,
-            status__in=[Booking.Status.PENDING, Booking.Status.CONFIRMED],
-            start_datetime__lt=end_datetime,
-            end_datetime__gt=start_datetime
-        ).exclude(
-            customer__isnull=True,
-            guide__isnull=True,
-            notes__startswith="[БЛОКИРОВКА]"
-        )
-        
-        # Подсчитываем заблокированные места капитаном (Booking с customer=None, guide=None, notes содержит "[БЛОКИРОВКА]")
-        blocked_bookings = Booking.objects.filter(
-            boat=boat,
-            customer__isnull=True,
-            guide__isnull=True,
-            notes__startswith="[БЛОКИРОВКА]",
-            status=Booking.Status.CONFIRMED,
-            start_datetime__lt=end_datetime,
-            end_datetime__gt=start_datetime
-        )
+    def _calculate_available_spots(self, availability, requested_people=None, occupied_places=None):
+        """
+        Рассчитывает доступные места на рейс.
+        occupied_places - занятые места, если уже посчитаны для списка рейсов одним запросом
+        """
+        # Занятые места: PENDING и CONFIRMED (в т.ч. блокировки капитана)
+        # и RESERVED с действующим удержанием мест
+        if occupied_places is None:
+            occupied_places = Booking.objects.occupied_seats(availability)
         
-        booked_places = sum(booking.number_of_people for booking in existing_bookings)
-        blocked_places = sum(booking.number_of_people for booking in blocked_bookings)
         # Используем effective_capacity из availability, если указано ограничение
-        effective_capacity = availability.effective_capacity
-        available_spots = effective_capacity - booked_places - blocked_places
+        available_spots = availability.effective_capacity - occupied_places
         
         return max(0, available_spots)
 
@@ -277,45 +260,11 @@ class TripDetailView(views.APIView):
     
     def _calculate_available_spots(self, availability, requested_people=None):
         """Рассчитывает доступные места на рейс"""
-        boat = availability.boat
-        start_datetime = datetime.combine(availability.departure_date, availability.departure_time)
-        end_datetime = datetime.combine(availability.departure_date, availability.return_time)
-        
-        # Если время возвращения меньше времени отправления, значит рейс через полночь
-        if availability.return_time < availability.departure_time:
-            end_datetime += timedelta(days=1)
-        
-        # Подсчитываем уже забронированные места (обычные бронирования)
-        # Учитываем ТОЛЬКО PENDING и CONFIRMED - места заблокированы после оплаты предоплаты
-        # RESERVED не учитываем - неоплаченные бронирования не занимают места
-        # ИСКЛЮЧАЕМ заблокированные места (customer=None, guide=None, notes содержит "[БЛОКИРОВКА]")
-        # чтобы не считать их дважды
-        existing_bookings = Booking.objects.filter(
-            boat=boat,
-            status__in=[Booking.Status.PENDING, Booking.Status.CONFIRMED],
-            start_datetime__lt=end_datetime,
-            end_datetime__gt=start_datetime
-        ).exclude(
-            customer__isnull=True,
-            guide__isnull=True,
-            notes__startswith="[БЛОКИРОВКА]"
-        )
-        
-        # Подсчитываем заблокированные места капитаном (Booking с customer=None, guide=None, notes содержит "[БЛОКИРОВКА]")
-        blocked_bookings = Booking.objects.filter(
-            boat=boat,
-            customer__isnull=True,
-            guide__isnull=True,
-            notes__startswith="[БЛОКИРОВКА]",
-            status=Booking.Status.CONFIRMED,
-            start_datetime__lt=end_datetime,
-            end_datetime__gt=start_datetime
-        )
+        # Занятые места: PENDING и CONFIRMED (в т.ч. блокировки капитана)
+        # и RESERVED с действующим удержанием мест
+        occupied_places = Booking.objects.occupied_seats(availability)
         
-        booked_places = sum(booking.number_of_people for booking in existing_bookings)
-        blocked_places = sum(booking.number_of_people for booking in blocked_bookings)
         # Используем effective_capacity из availability, если указано ограничение
-        effective_capacity = availability.effective_capacity
-        available_spots = effective_capacity - booked_places - blocked_places
+        available_spots = availability.effective_capacity - occupied_places
         
         return max(0, available_spots)
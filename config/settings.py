@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import os
 from dotenv import load_dotenv
+from django.core.exceptions import ImproperlyConfigured
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -62,6 +64,7 @@ INSTALLED_APPS = [
     'apps.blog',
     'apps.faq',
     'apps.site_settings',
+    'apps.search',
     'apps.telegram',
     'apps.max',
 
@@ -110,6 +113,25 @@ DATABASES = {
 }
 
 
+# Cache
+# В продакшене кеш должен быть общим для всех воркеров: на нем работают блокировки опроса
+# статусов платежей, кеш страницы «Причал» и коды подтверждения телефона. По умолчанию -
+# таблица в БД (создается командой createcachetable), можно указать Redis/Memcached.
+# Локальный кеш процесса - только для разработки (DEBUG).
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache' if DEBUG else 'django.core.cache.backends.db.DatabaseCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'django_cache'),
+    }
+}
+if not DEBUG and CACHES['default']['BACKEND'].endswith('LocMemCache'):
+    raise ImproperlyConfigured('LocMemCache не разделяется между воркерами, укажите общий CACHE_BACKEND')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -154,6 +176,10 @@ MEDIA_ROOT = BASE_DIR / 'media'
 THUMBNAIL_DEBUG = DEBUG
 THUMBNAIL_QUALITY = 85
 THUMBNAIL_PRESERVE_EXTENSIONS = True
+# Потоков для фонового создания thumbnail после загрузки фото (0 - сразу после коммита в текущем потоке)
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', 2))
+# Время жизни кеша страницы «Причал», секунд (кеш сбрасывается и при изменении причалов, судов и фото)
+DOCK_PIER_CACHE_TIMEOUT = int(os.getenv('DOCK_PIER_CACHE_TIMEOUT', 300))
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -203,6 +229,9 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Заголовок Idempotency-Key для повторов создания бронирования с мобильных клиентов
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+
 # CSRF settings для API
 CSRF_TRUSTED_ORIGINS = [
     origin.strip() 
@@ -282,6 +311,37 @@ TBANK_NOTIFICATION_URL = os.getenv('TBANK_NOTIFICATION_URL', f'{BACKEND_URL}/api
 PAYMENT_SUCCESS_URL = os.getenv('PAYMENT_SUCCESS_URL', f'{FRONTEND_URL}/payment/success')
 PAYMENT_FAIL_URL = os.getenv('PAYMENT_FAIL_URL', f'{FRONTEND_URL}/payment/fail')
 
+# Init в Т-Банке в фоновом пуле потоков: ответ с ID платежа сразу, ссылка - через /payments/{id}/init_status/
+# Клиент может включить режим для запроса заголовком "Prefer: respond-async"
+PAYMENT_INIT_ASYNC = os.getenv('PAYMENT_INIT_ASYNC', 'False').lower() in ('true', '1', 'yes')
+PAYMENT_INIT_WORKERS = int(os.getenv('PAYMENT_INIT_WORKERS', 4))
+# Через сколько секунд платеж в INITIALIZING считается потерянным (перезапуск процесса) - reconcile_payments переводит его в INIT_FAILED
+PAYMENT_INIT_TIMEOUT = int(os.getenv('PAYMENT_INIT_TIMEOUT', 300))
+
+# Обработчики уведомлений Т-Банка (webhook): уведомления одного платежа всегда идут в один поток
+PAYMENT_WEBHOOK_WORKERS = int(os.getenv('PAYMENT_WEBHOOK_WORKERS', 2))
+
+# Сверка незавершенных платежей (reconcile_payments): не больше N запросов GetState в секунду
+PAYMENT_RECONCILE_RATE = float(os.getenv('PAYMENT_RECONCILE_RATE', 20))
+
+# check_status: статус из БД считается свежим N секунд, дольше - запрос GetState в Т-Банк
+PAYMENT_STATUS_MAX_AGE = int(os.getenv('PAYMENT_STATUS_MAX_AGE', 10))
+# Максимальное ожидание long-poll (?wait=) в check_status, секунд
+PAYMENT_STATUS_LONG_POLL_MAX = int(os.getenv('PAYMENT_STATUS_LONG_POLL_MAX', 25))
+
+# Срок хранения журнала ответов Т-Банка (PaymentEvent) и обработанных уведомлений, дней (prune_payment_events)
+PAYMENT_EVENT_RETENTION_DAYS = int(os.getenv('PAYMENT_EVENT_RETENTION_DAYS', 180))
+PAYMENT_NOTIFICATION_RETENTION_DAYS = int(os.getenv('PAYMENT_NOTIFICATION_RETENTION_DAYS', 30))
+
+# Сколько минут неоплаченная (RESERVED) бронь удерживает места на рейсе
+BOOKING_HOLD_MINUTES = int(os.getenv('BOOKING_HOLD_MINUTES', 15))
+
+# Через сколько месяцев после окончания завершенные/отмененные брони переносятся в архив
+BOOKING_ARCHIVE_MONTHS = int(os.getenv('BOOKING_ARCHIVE_MONTHS', 12))
+
+# Время хранения ответа по Idempotency-Key при создании бронирования (секунды)
+BOOKING_IDEMPOTENCY_TTL = int(os.getenv('BOOKING_IDEMPOTENCY_TTL', 24 * 60 * 60))
+
 # Telegram Bot Settings для уведомлений о бронированиях
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', '')
 TELEGRAM_CHANNEL_ID = os.getenv('TELEGRAM_CHANNEL_ID', '')
@@ -349,7 +409,7 @@ LOGGING = {
     'loggers': {
         'apps.payments': {
             'handlers': ['console', 'file'],
-            'level': 'DEBUG',
+            'level': os.getenv('PAYMENTS_LOG_LEVEL', 'INFO'),
             'propagate': False,
         },
         'apps.bookings': {
@@ -388,4 +448,11 @@ LOGGING = {
 
 CRONJOBS = [
     ('*/15 * * * *', 'django.core.management.call_command', ['send_guide_reminders']),
+    ('*/5 * * * *', 'django.core.management.call_command', ['expire_reserved_bookings']),
+    ('30 3 1 * *', 'django.core.management.call_command', ['archive_bookings']),
+    ('* * * * *', 'django.core.management.call_command', ['process_payment_notifications']),
+    ('*/10 * * * *', 'django.core.management.call_command', ['reconcile_payments']),
+    ('*/10 * * * *', 'django.core.management.call_command', ['retry_payment_refunds']),
+    ('15 4 * * *', 'django.core.management.call_command', ['prune_payment_events']),
+    ('0 * * * *', 'django.core.management.call_command', ['prune_idempotency_keys']),
 ]
\ No newline at end of file
@@ -5,16 +5,23 @@ import pytest
 from decimal import Decimal
 from datetime import datetime, timedelta
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from rest_framework.test import APIClient
 from rest_framework.authtoken.models import Token
 
-from apps.accounts.models import User, BoatOwnerVerification
-from apps.boats.models import Boat, BoatImage, BoatFeature, BoatPricing, BoatAvailability, SailingZone
+from apps.accounts.models import User
+from apps.boats.models import Boat, BoatImage, Feature, BoatPricing, BoatAvailability, SailingZone
 from apps.bookings.models import Booking
 
 User = get_user_model()
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Кеш (LocMemCache) общий для всех тестов процесса - очищаем перед каждым тестом"""
+    cache.clear()
+
+
 @pytest.fixture
 def api_client():
     """API клиент для тестирования"""
@@ -125,9 +132,9 @@ def boat_with_pricing(boat, db):
 @pytest.fixture
 def boat_with_features(boat, db):
     """Создает судно с особенностями"""
-    BoatFeature.objects.create(boat=boat, feature_type=BoatFeature.FeatureType.TOILET)
-    BoatFeature.objects.create(boat=boat, feature_type=BoatFeature.FeatureType.BLANKETS)
-    BoatFeature.objects.create(boat=boat, feature_type=BoatFeature.FeatureType.TEA_COFFEE)
+    for name in ('Туалет', 'Пледы', 'Чай/кофе'):
+        feature, _ = Feature.objects.get_or_create(name=name)
+        boat.features.add(feature)
     return boat
 
 